@@ -122,6 +122,16 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # orjson-backed JSON; both fall back to the stock classes without orjson
+    'DEFAULT_RENDERER_CLASSES': [
+        'unicflo_api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'unicflo_api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
@@ -325,7 +335,7 @@ UNFOLD = {
     "SITE_HEADER": "Unicflo",
     "SITE_URL": "/",
     "SITE_ICON": None,  # Replace with a URL path to your favicon
-    "DASHBOARD": "unicflo_api.admin_dashboard.AdminDashboard",  # Class-based dashboard
+    "DASHBOARD_CALLBACK": "unicflo_api.admin_dashboard.dashboard_callback",
     "COLORS": {
         "primary": {
             "50": "250 245 255",
@@ -502,43 +512,100 @@ JAZZMIN_UI_TWEAKS = {
     }
 }
 
-# Cache settings
+# Redis configuration
+REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+
+# Cache settings: in-process LRU in front of Redis, shared by all workers.
+# Falls back to the local tier alone while Redis is unreachable.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'unicflo_api.cache_backends.TieredRedisCache',
+        'LOCATION': os.getenv('REDIS_CACHE_URL', f'redis://{REDIS_HOST}:{REDIS_PORT}/1'),
+        'KEY_PREFIX': 'unicflo',
         'TIMEOUT': 300,  # 5 minutes
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,  # seconds a value may be served from process memory
+            'SOCKET_TIMEOUT': 0.5,
+            'SOCKET_CONNECT_TIMEOUT': 0.5,
+            'RETRY_AFTER': 10,  # seconds to skip Redis after a connection error
+            'LOCK_TIMEOUT': 10,  # stampede lock lifetime for get_or_set
+        },
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'TIMEOUT': 300,
         'OPTIONS': {
             'MAX_ENTRIES': 1000,
             'CULL_FREQUENCY': 3,
         }
-    }
+    },
 }
 
-# Redis configuration
-REDIS_HOST = 'redis'
-REDIS_PORT = 6379
-
-# Try to use Redis cache if django-redis is installed
-try:
-    import django_redis
-    CACHES['redis'] = {
-        'BACKEND': 'django_redis.cache.RedisCache',
-        'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
-        'OPTIONS': {
-            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
-            'SOCKET_CONNECT_TIMEOUT': 5,
-            'SOCKET_TIMEOUT': 5,
-            'RETRY_ON_TIMEOUT': True,
-            'MAX_CONNECTIONS': 1000,
-            'CONNECTION_POOL_KWARGS': {'max_connections': 100},
-            'COMPRESSOR': 'django_redis.compressors.zlib.ZlibCompressor',
-            'IGNORE_EXCEPTIONS': True,
-        },
-        'KEY_PREFIX': 'unicflo',
-        'TIMEOUT': 300,  # 5 minutes
-    }
-except ImportError:
-    pass  # Django-Redis not installed, using default cache only
+# Versioned HTTP caching for catalog reference endpoints (colors, sizes, categories, ...)
+CATALOG_CACHE = {
+    'CACHE_ALIAS': 'default',
+    'VERSION_TIMEOUT': 5,  # seconds before a worker re-reads the scope version
+    'BODY_TIMEOUT': 60 * 60,
+    'CACHE_CONTROL': {'public': True, 'max_age': 60},
+}
+
+# Buffered product interaction events (views, cart adds, wishlist toggles)
+INTERACTION_EVENTS = {
+    'ENABLED': True,
+    'BUFFER_SIZE': 10000,  # events kept in memory per process; the oldest are dropped beyond this
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 2.0,  # seconds between background flushes
+}
+
+# Time-decayed product popularity behind /products/trending/ (rankings rebuilt by update_popularity)
+POPULARITY = {
+    'HALF_LIFE_HOURS': 72,
+    'WEIGHTS': {'purchase': 10, 'cart_add': 3, 'wishlist_add': 2, 'like': 2, 'view': 1},
+    'MIN_SCORE': 0.01,  # decayed scores below this are deleted on compaction
+    'RANKING_SIZE': 100,
+    'CACHE_ALIAS': 'default',
+    'CACHE_TIMEOUT': 24 * 60 * 60,
+}
+
+# Materialized product stock and low-stock alerts for Telegram admins (see unicflo_api/inventory.py)
+INVENTORY = {
+    'LOW_STOCK_THRESHOLD': 5,
+    'ALERT_BATCH_SIZE': 50,  # alerts per admin message
+}
+
+# End-to-end API benchmarks (see unicflo_api/benchmarks.py and the run_benchmarks command)
+BENCHMARKS = {
+    'ITERATIONS': 50,  # timed requests per scenario
+    'WARMUP': 5,
+    'MEMORY_ITERATIONS': 5,
+    'SEED': 1,
+    'BUDGETS': {},  # {scenario: {'p50_ms' | 'p99_ms' | 'queries' | 'memory_kb': limit}} over the defaults
+}
+
+# Delivery of queued Telegram messages (see unicflo_api/outbox.py)
+OUTBOX = {
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': 30,  # seconds before the first retry, doubled per attempt
+    'CLAIM_TIMEOUT': 10 * 60,  # 'sending' rows older than this are reclaimed
+}
+
+# Periodic commands run by run_scheduler, its own service (entrypoint.sh scheduler; see unicflo_api/scheduler.py)
+# Entries are (command, interval, args[, first run offset]); without an offset a job first runs at a random
+# point in its first interval
+SCHEDULER = {
+    'JOBS': [
+        ('send_order_notifications', 15, []),
+        ('send_stock_alerts', 60, []),
+        ('send_cart_reminders', 15 * 60, []),
+        ('process_split_payments', 15 * 60, []),
+        ('update_popularity', 15 * 60, []),
+        ('rollup_branch_sla', 60 * 60, []),
+        ('compact_carts', 24 * 60 * 60, []),
+    ],
+    'TICK': 1,
+}
 
 # Celery settings
 CELERY_BROKER_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
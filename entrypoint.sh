@@ -15,6 +15,20 @@ while ! pg_isready -h db -p 5432 -U postgres; do
 done
 echo "PostgreSQL started"
 
+# The periodic jobs (queued Telegram notifications, rollups, compaction) run as
+# their own service: start a second container from this image with the
+# "scheduler" argument and a restart policy, so a crashed scheduler is restarted
+# and its logs are kept apart from the web server's. The web container applies
+# the migrations; the scheduler waits for them.
+if [ "$1" = "scheduler" ]; then
+    until python manage.py migrate --check > /dev/null 2>&1; do
+        echo "Waiting for migrations..."
+        sleep 5
+    done
+    echo "Starting scheduler..."
+    exec python manage.py run_scheduler
+fi
+
 # Apply database migrations
 echo "Applying database migrations..."
 python manage.py migrate
@@ -5,14 +5,68 @@ from django.contrib.admin.widgets import AdminFileWidget
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.urls import reverse
-from django.db.models import Count
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
 from .models import (
     User, Category, Product, ProductImage,
     Wishlist, Cart, CartItem, Order, OrderItem, Address, Subcategory,
     Brand, Color, Size, Material, Season, ShippingMethod,
-    ProductVariant, GenderCategory, PromoCode
+    ProductVariant, GenderCategory, PromoCode, UserProductInteraction, OrderStatusEvent
 )
 from django.utils import timezone
+from .order_workflow import TransitionError, transition, transition_order
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    On PostgreSQL, an unfiltered changelist of a big table takes its row count
+    from the planner statistics instead of a COUNT(*) over the whole table.
+    """
+    ESTIMATE_THRESHOLD = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[getattr(queryset, 'db', 'default')]
+        if connection.vendor == 'postgresql' and hasattr(queryset, 'query') and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.ESTIMATE_THRESHOLD:
+                return row[0]
+        return super().count
+
+
+class SelectRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """
+    Related-object filter that loads its choices with the related admin's
+    list_select_related, so choice labels built from further foreign keys
+    (e.g. Subcategory.__str__ reading its category) don't query per choice.
+    """
+
+    def field_choices(self, field, request, model_admin):
+        related_admin = model_admin.admin_site._registry.get(field.remote_field.model)
+        related = getattr(related_admin, 'list_select_related', ())
+        queryset = field.remote_field.model._default_manager.all()
+        if related:
+            queryset = queryset.select_related(*related) if related is not True else queryset.select_related()
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return [(obj.pk, str(obj)) for obj in queryset]
+
+
+class LargeTableAdminMixin:
+    """Changelist settings for tables too big to count on every page view"""
+    paginator = EstimatedCountPaginator
+    # Skips the second COUNT(*) of the unfiltered table when a filter is active
+    show_full_result_count = False
 
 
 class CustomUserAdmin(UserAdmin, ModelAdmin):
@@ -79,6 +133,23 @@ class ProductVariantInline(TabularInline):
     verbose_name_plural = "Product Variants"
 
 
+class OrderStatusEventInline(TabularInline):
+    model = OrderStatusEvent
+    extra = 0
+    fields = ('created_at', 'from_status', 'to_status', 'actor', 'note')
+    readonly_fields = fields
+    ordering = ('created_at',)
+    verbose_name = "Status Change"
+    verbose_name_plural = "Status History"
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('actor')
+
+
 class OrderItemInline(TabularInline):
     model = OrderItem
     extra = 0
@@ -110,6 +181,7 @@ class CategoryAdmin(ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name', 'description')
     list_filter = ('gender',)
+    list_select_related = ('gender',)
     ordering = ('name',)
     readonly_fields = ('created_at',)
     verbose_name = "Категория"
@@ -123,9 +195,15 @@ class CategoryAdmin(ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            _product_count=Count('subcategories__products')
+        )
+
     def product_count(self, obj):
-        return obj.subcategories.aggregate(total=Count('products'))['total']
+        return obj._product_count
     product_count.short_description = "Количество товаров"
+    product_count.admin_order_field = '_product_count'
 
 
 class BrandAdmin(ModelAdmin):
@@ -197,9 +275,18 @@ class ShippingMethodAdmin(ModelAdmin):
     actions = ['delete_selected']
 
 
-class ProductAdmin(ModelAdmin):
-    list_display = ('id', 'name', 'subcategory', 'brand', 'price', 'discount_price', 'is_featured', 'is_active', 'created_at')
-    list_filter = ('subcategory', 'brand', 'is_featured', 'is_active', 'gender', 'season')
+class ProductAdmin(LargeTableAdminMixin, ModelAdmin):
+    list_display = (
+        'id', 'name', 'subcategory', 'brand', 'price', 'discount_price', 'total_stock', 'is_featured', 'is_active',
+        'created_at'
+    )
+    list_filter = (
+        ('subcategory', SelectRelatedFieldListFilter), 'brand', 'in_stock', 'is_featured', 'is_active', 'gender',
+        'season'
+    )
+    # Subcategory.__str__ reads its category
+    list_select_related = ('subcategory__category', 'brand')
+    autocomplete_fields = ('subcategory', 'brand')
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name', 'description', 'brand__name')
     inlines = [ProductVariantInline, ProductImageInline]
@@ -233,7 +320,8 @@ class ProductAdmin(ModelAdmin):
 
     def preview_images(self, obj):
         html = []
-        for image in obj.images.filter(is_primary=True):
+        # Iterates images.all() so a prefetch is reused when there is one
+        for image in (image for image in obj.images.all() if image.is_primary):
             html.append(
                 format_html(
                     '<img src="{}" style="max-height: 100px; max-width: 100px; margin-right: 10px;" />',
@@ -244,9 +332,12 @@ class ProductAdmin(ModelAdmin):
     preview_images.short_description = "Primary Images"
 
 
-class ProductVariantAdmin(ModelAdmin):
-    list_display = ('product', 'color', 'size', 'stock')
-    list_filter = ('product', 'color', 'size')
+class ProductVariantAdmin(LargeTableAdminMixin, ModelAdmin):
+    list_display = ('product', 'color', 'size', 'stock', 'stock_level')
+    # No product filter: it would render every product; search by product name instead
+    list_filter = ('stock_level', 'color', 'size')
+    list_select_related = ('product', 'color', 'size')
+    autocomplete_fields = ('product',)
     search_fields = ('product__name', 'color__name', 'size__name')
     ordering = ('product', 'color', 'size')
     verbose_name = "Вариант товара"
@@ -267,35 +358,59 @@ class CartItemInline(TabularInline):
     total_price.short_description = "Итого"
 
 
-class CartAdmin(ModelAdmin):
+class CartAdmin(LargeTableAdminMixin, ModelAdmin):
     list_display = ('user', 'created_at', 'total_price', 'item_count')
+    list_select_related = ('user',)
     search_fields = ('user__username',)
+    autocomplete_fields = ('user',)
     inlines = [CartItemInline]
     verbose_name = "Корзина"
     verbose_name_plural = "Корзины"
     actions = ['delete_selected']
     
+    def get_queryset(self, request):
+        live = Q(items__is_deleted=False)
+        return super().get_queryset(request).annotate(
+            _item_count=Count('items', filter=live),
+            _total_price=Sum(
+                F('items__quantity') * Coalesce('items__product__discount_price', 'items__product__price'),
+                filter=live,
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+        )
+    
+    def total_price(self, obj):
+        return obj._total_price or 0
+    total_price.short_description = "Итого"
+    total_price.admin_order_field = '_total_price'
+    
     def item_count(self, obj):
-        return obj.items.count()
+        return obj._item_count
     item_count.short_description = "Количество товаров"
+    item_count.admin_order_field = '_item_count'
 
 
-class CartItemAdmin(ModelAdmin):
+class CartItemAdmin(LargeTableAdminMixin, ModelAdmin):
     list_display = ('cart', 'product', 'quantity', 'total_price')
-    list_filter = ('cart__user',)
-    search_fields = ('product__name',)
+    list_filter = ('is_deleted',)
+    # CartItem.__str__ (the row checkbox label) and Cart.__str__ read these
+    list_select_related = ('cart__user', 'product', 'variant__color', 'variant__size')
+    autocomplete_fields = ('cart', 'product')
+    search_fields = ('product__name', 'cart__user__username')
     verbose_name = "Товар в корзине"
     verbose_name_plural = "Товары в корзине"
     actions = ['delete_selected']
 
 
-class OrderAdmin(ModelAdmin):
+class OrderAdmin(LargeTableAdminMixin, ModelAdmin):
     list_display = ('id', 'user', 'phone_number', 'total_amount', 'final_amount', 'status_badge', 'created_at')
     list_filter = ('status', 'payment_method', 'created_at')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'tracking_number', 'phone_number', 'customer_name')
-    inlines = [OrderItemInline]
+    autocomplete_fields = ('user', 'pickup_branch')
+    inlines = [OrderItemInline, OrderStatusEventInline]
     readonly_fields = ('created_at', 'updated_at', 'order_summary')
-    actions = ['delete_selected']
+    actions = ['delete_selected', 'mark_processing', 'mark_ready_for_pickup', 'mark_delivered', 'mark_canceled']
     fieldsets = (
         ('Основная информация', {
             'fields': ('user', 'customer_name', 'phone_number', 'status', 'order_summary')
@@ -313,10 +428,47 @@ class OrderAdmin(ModelAdmin):
     verbose_name = "Заказ"
     verbose_name_plural = "Заказы"
     
+    def save_model(self, request, obj, form, change):
+        # Status changes of existing orders go through the order state machine
+        if not change or 'status' not in form.changed_data:
+            super().save_model(request, obj, form, change)
+            return
+        new_status, obj.status = obj.status, form.initial['status']
+        super().save_model(request, obj, form, change)
+        try:
+            transition_order(obj, new_status, actor=request.user)
+        except TransitionError as e:
+            self.message_user(request, str(e), level='ERROR')
+    
+    def _transition_selected(self, request, queryset, new_status):
+        changed, rejected = transition(queryset, new_status, actor=request.user)
+        self.message_user(request, f"Статус изменен у {len(changed)} заказов")
+        if rejected:
+            self.message_user(
+                request, f"Пропущено {len(rejected)} заказов: переход недопустим", level='WARNING'
+            )
+    
+    def mark_processing(self, request, queryset):
+        self._transition_selected(request, queryset, 'processing')
+    mark_processing.short_description = "Перевести в обработку"
+    
+    def mark_ready_for_pickup(self, request, queryset):
+        self._transition_selected(request, queryset, 'ready_for_pickup')
+    mark_ready_for_pickup.short_description = "Отметить как готовые к выдаче"
+    
+    def mark_delivered(self, request, queryset):
+        self._transition_selected(request, queryset, 'delivered')
+    mark_delivered.short_description = "Отметить как доставленные"
+    
+    def mark_canceled(self, request, queryset):
+        self._transition_selected(request, queryset, 'canceled')
+    mark_canceled.short_description = "Отменить заказы"
+    
     def status_badge(self, obj):
         status_colors = {
             'pending': '#ffc107',      # желтый
             'processing': '#17a2b8',   # синий
+            'ready_for_pickup': '#6f42c1',  # фиолетовый
             'shipped': '#007bff',      # голубой
             'delivered': '#28a745',    # зеленый
             'canceled': '#dc3545',     # красный
@@ -325,6 +477,7 @@ class OrderAdmin(ModelAdmin):
         status_names = {
             'pending': 'Ожидает',
             'processing': 'Обработка',
+            'ready_for_pickup': 'Готов к выдаче',
             'shipped': 'Отправлен',
             'delivered': 'Доставлен',
             'canceled': 'Отменен',
@@ -433,7 +586,8 @@ class AddressAdmin(admin.ModelAdmin):
         ('Location', {
             'fields': [
                 'street', 'district', 'city', 'region',
-                'country', 'postal_code', 'location_link'
+                'country', 'postal_code', 'location_link',
+                'latitude', 'longitude'
             ]
         }),
         ('Contact Information', {
@@ -462,22 +616,55 @@ class AddressAdmin(admin.ModelAdmin):
         return readonly_fields
 
 
+class WishlistItemInline(TabularInline):
+    model = UserProductInteraction
+    fk_name = 'wishlist'
+    fields = ('product', 'created_at')
+    readonly_fields = ('created_at',)
+    autocomplete_fields = ('product',)
+    extra = 0
+    verbose_name = "Товар"
+    verbose_name_plural = "Товары"
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).filter(kind='wishlist').select_related('product')
+
+
 class WishlistAdmin(ModelAdmin):
     list_display = ('user', 'created_at', 'product_count')
     search_fields = ('user__username',)
-    filter_horizontal = ('products',)
+    inlines = [WishlistItemInline]
     verbose_name = "Список желаний"
     verbose_name_plural = "Списки желаний"
     actions = ['delete_selected']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user').annotate(_product_count=Count('products'))
+
     def product_count(self, obj):
-        return obj.products.count()
+        return obj._product_count
     product_count.short_description = "Количество товаров"
+    product_count.admin_order_field = '_product_count'
+
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not UserProductInteraction:
+            return super().save_formset(request, form, formset, change)
+        # Go through the wishlist API so likes stay in sync
+        wishlist = form.instance
+        instances = formset.save(commit=False)
+        for inline_form in formset.initial_forms:
+            # Deleted rows and rows switched to another product both drop the product they held
+            if inline_form in formset.deleted_forms or 'product' in inline_form.changed_data:
+                wishlist.remove_product(Product.objects.get(pk=inline_form.initial['product']))
+        for obj in instances:
+            wishlist.add_product(obj.product)
 
 
 class SubcategoryAdmin(ModelAdmin):
     list_display = ('name', 'category', 'gender', 'created_at')
-    list_filter = ('category', 'gender')
+    list_filter = (('category', SelectRelatedFieldListFilter), 'gender')
+    # Subcategory and Category labels read the parent category and its gender
+    list_select_related = ('category__gender', 'gender')
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name', 'description', 'category__name')
     ordering = ('category', 'name')
@@ -572,6 +759,9 @@ class PromoCodeAdmin(ModelAdmin):
         return qs
 
 
+# Stock admin index with the dashboard widgets (see admin_dashboard.py)
+admin.site.index_template = 'admin/unicflo_index.html'
+
 # Register all models
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Category, CategoryAdmin)
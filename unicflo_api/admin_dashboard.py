@@ -1,128 +1,149 @@
+"""
+Admin dashboard data.
+
+get_dashboard_data() computes every dashboard widget with a handful of
+queries: one conditional aggregate for the sales periods, one grouped count
+of order statuses, one aggregate and one short list over the low-stock slice
+of ProductVariant (served by the partial variant_low_stock_level index), one
+aggregate for customers and the precomputed pickup SLA rows. Periods are
+created_at / date_joined ranges from the local start of day, so the created_at
+and date_joined indexes apply (a __date lookup would wrap the column in a
+cast). The result is cached for a minute, so reloading the admin index does
+not rerun the aggregates.
+
+The data is shown on the stock admin index (admin/unicflo_index.html through
+the admin_dashboard template tag) and handed to Unfold through
+dashboard_callback when Unfold is enabled.
+"""
+
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
 from django.urls import reverse
-from django.db.models import Sum, Count, Avg
 from django.utils import timezone
-from datetime import timedelta
-from unfold.dashboards import Dashboard
-from unfold.dashboards.modules import LinkList, ModelList, Group, ChartJs, Stats
-from .models import User, Product, Order, OrderItem, Category, ProductReview
-
-# Instead of building a dashboard function, we'll create a dashboard class
-class AdminDashboard(Dashboard):
-    name = "e-commerce-dashboard"
-    title = "E-commerce Dashboard"
-
-    def init_with_context(self, context):
-        """Initialize the dashboard with components"""
-        # Get time ranges for statistics
-        today = timezone.now().date()
-        yesterday = today - timedelta(days=1)
-        last_week = today - timedelta(days=7)
-        last_month = today - timedelta(days=30)
-        
-        try:
-            # Sales statistics
-            recent_orders = Order.objects.filter(created_at__date__gte=last_month)
-            today_sales = recent_orders.filter(created_at__date=today).aggregate(Sum('final_amount'))['final_amount__sum'] or 0
-            yesterday_sales = recent_orders.filter(created_at__date=yesterday).aggregate(Sum('final_amount'))['final_amount__sum'] or 0
-            weekly_sales = recent_orders.filter(created_at__date__gte=last_week).aggregate(Sum('final_amount'))['final_amount__sum'] or 0
-            monthly_sales = recent_orders.aggregate(Sum('final_amount'))['final_amount__sum'] or 0
-
-            # Orders statistics
-            pending_orders = Order.objects.filter(status='pending').count()
-            processing_orders = Order.objects.filter(status='processing').count()
-            shipped_orders = Order.objects.filter(status='shipped').count()
-            delivered_orders = Order.objects.filter(status='delivered').count()
-            
-            # Product statistics
-            low_stock_products = Product.objects.filter(stock__lte=5).count()
-            out_of_stock = Product.objects.filter(stock=0).count()
-            
-            # Customer statistics
-            total_customers = User.objects.count()
-            new_customers = User.objects.filter(created_at__date__gte=last_month).count()
-            
-            # Add Stats widgets
-            self.append(
-                Stats(
-                    title="Sales Overview",
-                    entries=[
-                        {"title": "Today's Sales", "value": f"${today_sales}", "icon": "attach_money"},
-                        {"title": "Yesterday's Sales", "value": f"${yesterday_sales}", "icon": "attach_money"},
-                        {"title": "Weekly Sales", "value": f"${weekly_sales}", "icon": "attach_money"},
-                        {"title": "Monthly Sales", "value": f"${monthly_sales}", "icon": "attach_money"},
-                    ],
-                )
-            )
-            
-            self.append(
-                Stats(
-                    title="Order Status",
-                    entries=[
-                        {"title": "Pending Orders", "value": pending_orders, "icon": "pending"},
-                        {"title": "Processing Orders", "value": processing_orders, "icon": "loop"},
-                        {"title": "Shipped Orders", "value": shipped_orders, "icon": "local_shipping"},
-                        {"title": "Delivered Orders", "value": delivered_orders, "icon": "check_circle"},
-                    ],
-                )
-            )
-            
-            self.append(
-                Stats(
-                    title="Inventory Summary",
-                    entries=[
-                        {"title": "Low Stock Products", "value": low_stock_products, "icon": "warning"},
-                        {"title": "Out of Stock Products", "value": out_of_stock, "icon": "error"},
-                        {"title": "Total Customers", "value": total_customers, "icon": "people"},
-                        {"title": "New Customers (30 days)", "value": new_customers, "icon": "person_add"},
-                    ],
-                )
-            )
-            
-            # Add quick links
-            self.append(
-                LinkList(
-                    title="Quick Actions",
-                    entries=[
-                        {"title": "Add New Product", "url": reverse("admin:unicflo_api_product_add")},
-                        {"title": "Add New Category", "url": reverse("admin:unicflo_api_category_add")},
-                        {"title": "View All Orders", "url": reverse("admin:unicflo_api_order_changelist")},
-                        {"title": "Add New Coupon", "url": reverse("admin:unicflo_api_coupon_add")},
-                    ],
-                )
-            )
-            
-            # Add model list for recent products and orders
-            self.append(
-                Group(
-                    title="Recent Items",
-                    module_list=[
-                        ModelList(
-                            title="Recent Products",
-                            models=["unicflo_api.product"],
-                            limit=5,
-                        ),
-                        ModelList(
-                            title="Recent Orders",
-                            models=["unicflo_api.order"],
-                            limit=5,
-                        ),
-                    ],
-                )
-            )
-            
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error generating dashboard data: {str(e)}")
-            
-            # Add a simple link list in case of error
-            self.append(
-                LinkList(
-                    title="Navigation",
-                    entries=[
-                        {"title": "Products", "url": reverse("admin:unicflo_api_product_changelist")},
-                        {"title": "Orders", "url": reverse("admin:unicflo_api_order_changelist")},
-                        {"title": "Users", "url": reverse("admin:unicflo_api_user_changelist")},
-                    ],
-                )
-            )  
\ No newline at end of file
+
+from .fulfillment_sla import branch_sla_summary, format_duration
+from .inventory import inventory_setting
+from .models import Order, ProductVariant, User
+
+DASHBOARD_TIMEOUT = 60
+LOW_STOCK_ALERT_LIMIT = 10
+
+
+def _money(value):
+    return f"${value or 0}"
+
+
+def compute_dashboard():
+    now = timezone.localtime()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    yesterday = today - timedelta(days=1)
+    last_week = today - timedelta(days=7)
+    last_month = today - timedelta(days=30)
+
+    sales = Order.objects.filter(created_at__gte=last_month).aggregate(
+        today=Sum('final_amount', filter=Q(created_at__gte=today)),
+        yesterday=Sum('final_amount', filter=Q(created_at__gte=yesterday, created_at__lt=today)),
+        week=Sum('final_amount', filter=Q(created_at__gte=last_week)),
+        month=Sum('final_amount'),
+    )
+    statuses = dict(Order.objects.order_by().values_list('status').annotate(count=Count('id')))
+
+    threshold = inventory_setting('LOW_STOCK_THRESHOLD')
+    # The synced stock level follows the configured threshold and is what variant_low_stock_level covers
+    low_stock = ProductVariant.objects.filter(stock_level__in=['low', 'out'])
+    inventory = low_stock.aggregate(
+        low=Count('id', filter=Q(stock_level='low')),
+        out=Count('id', filter=Q(stock_level='out')),
+    )
+    alerts = [
+        {
+            'title': str(variant),
+            'stock': variant.stock,
+            'url': reverse('admin:unicflo_api_productvariant_change', args=[variant.pk]),
+        }
+        for variant in low_stock.select_related('product', 'color', 'size').order_by('stock', 'product__name')[
+            :LOW_STOCK_ALERT_LIMIT
+        ]
+    ]
+    customers = User.objects.aggregate(
+        total=Count('id'),
+        new=Count('id', filter=Q(date_joined__gte=last_month)),
+    )
+
+    stats = [
+        {
+            'title': "Sales Overview",
+            'entries': [
+                {'title': "Today's Sales", 'value': _money(sales['today']), 'icon': "attach_money"},
+                {'title': "Yesterday's Sales", 'value': _money(sales['yesterday']), 'icon': "attach_money"},
+                {'title': "Weekly Sales", 'value': _money(sales['week']), 'icon': "attach_money"},
+                {'title': "Monthly Sales", 'value': _money(sales['month']), 'icon': "attach_money"},
+            ],
+        },
+        {
+            'title': "Order Status",
+            'entries': [
+                {'title': "Pending Orders", 'value': statuses.get('pending', 0), 'icon': "pending"},
+                {'title': "Processing Orders", 'value': statuses.get('processing', 0), 'icon': "loop"},
+                {'title': "Ready for Pickup", 'value': statuses.get('ready_for_pickup', 0), 'icon': "store"},
+                {'title': "Shipped Orders", 'value': statuses.get('shipped', 0), 'icon': "local_shipping"},
+                {'title': "Delivered Orders", 'value': statuses.get('delivered', 0), 'icon': "check_circle"},
+            ],
+        },
+    ]
+
+    # Precomputed by the rollup_branch_sla command; slowest branches first
+    sla = branch_sla_summary(days=30)[:4]
+    if sla:
+        stats.append({
+            'title': "Pickup SLA (30 days)",
+            'entries': [
+                {
+                    'title': branch['branch_name'],
+                    'value': (
+                        f"{format_duration(branch['avg_pending_to_ready'])} to ready, "
+                        f"{format_duration(branch['avg_ready_to_delivered'])} to pickup"
+                    ),
+                    'icon': "schedule",
+                }
+                for branch in sla
+            ],
+        })
+
+    stats.append({
+        'title': "Inventory Summary",
+        'entries': [
+            {'title': "Low Stock Variants", 'value': inventory['low'], 'icon': "warning"},
+            {'title': "Out of Stock Variants", 'value': inventory['out'], 'icon': "error"},
+            {'title': "Total Customers", 'value': customers['total'], 'icon': "people"},
+            {'title': "New Customers (30 days)", 'value': customers['new'], 'icon': "person_add"},
+        ],
+    })
+
+    changelist = reverse('admin:unicflo_api_productvariant_changelist')
+    return {
+        'generated_at': now,
+        'stats': stats,
+        'low_stock': alerts,
+        'low_stock_threshold': threshold,
+        'links': [
+            {'title': "Add New Product", 'url': reverse('admin:unicflo_api_product_add')},
+            {'title': "Add New Category", 'url': reverse('admin:unicflo_api_category_add')},
+            {'title': "View All Orders", 'url': reverse('admin:unicflo_api_order_changelist')},
+            {'title': "Low Stock Variants", 'url': f"{changelist}?stock_level__in=low,out&o=4"},
+        ],
+    }
+
+
+def get_dashboard_data():
+    """Dashboard widgets, recomputed at most once a minute"""
+    minute = timezone.now().strftime('%Y%m%d%H%M')
+    return cache.get_or_set(f'admin_dashboard:{minute}', compute_dashboard, DASHBOARD_TIMEOUT)
+
+
+def dashboard_callback(request, context):
+    """Unfold DASHBOARD_CALLBACK"""
+    context.update({'dashboard': get_dashboard_data()})
+    return context
@@ -0,0 +1,377 @@
+"""
+End-to-end API benchmarks with budgets.
+
+run_benchmarks() drives the hot endpoints through Django's test client in
+process, against a deterministic dataset seeded by seed_dataset() (the
+FakeDataGenerator with a pinned seed and time window, plus a pickup branch, a
+promo code and one Telegram user per scenario). For every scenario it records
+latency percentiles, the number of queries per request (counted with a
+connection execute_wrapper, so DEBUG-style query logging doesn't skew the
+timings) and the peak memory allocated while serving a request (traced with
+tracemalloc in a separate, untimed pass, as tracing slows everything down).
+
+Scenarios that write prepare their state before each request, outside the
+timed section: order creation gets a fresh cart, purchases draw on variants
+with effectively unlimited stock. A request answered with an unexpected status
+fails the run, as its timings would be meaningless. The interaction event
+flusher is paused for the whole run and the buffer is written between
+scenarios instead, so no background thread writes to the benchmark database
+while it is seeded or measured.
+
+Results are plain JSON (see BenchmarkResults.as_dict) so runs can be diffed
+across commits. Each scenario can have budgets for p50_ms, p99_ms, queries
+(the most any request made) and memory_kb; the BENCHMARKS setting overrides
+the defaults per scenario, and the run_benchmarks command can layer a JSON
+file on top and exits non-zero when a budget is exceeded.
+"""
+
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from .events import flusher_paused
+from .fake_data import FakeDataGenerator
+from .inventory import sync_product_stock
+from .models import Address, Cart, CartItem, Product, ProductVariant, PromoCode, User
+
+DEFAULTS = {
+    'ITERATIONS': 50,
+    'WARMUP': 5,
+    'MEMORY_ITERATIONS': 5,
+    'SEED': 1,
+    # Per scenario, as last measured: exact on queries (a new query per request
+    # fails), with headroom on time and memory. Every scenario's query count is
+    # independent of the dataset size. order_create still inserts its cart lines
+    # one by one, so the OrderItem signals run, which costs a few queries per line
+    # (the scenario orders three); everything else is constant per request.
+    'BUDGETS': {
+        'product_list': {'p99_ms': 500, 'queries': 8, 'memory_kb': 1280},
+        'product_detail': {'p99_ms': 350, 'queries': 7, 'memory_kb': 640},
+        'cart': {'p99_ms': 300, 'queries': 12, 'memory_kb': 384},
+        'cart_add': {'p99_ms': 100, 'queries': 18, 'memory_kb': 192},
+        'order_create': {'p99_ms': 400, 'queries': 26, 'memory_kb': 768},
+        'direct_purchase': {'p99_ms': 250, 'queries': 26, 'memory_kb': 1024},
+        'wishlist_add': {'p99_ms': 500, 'queries': 17, 'memory_kb': 1920},
+        'promo_apply': {'p99_ms': 120, 'queries': 16, 'memory_kb': 192},
+    },
+}
+
+METRICS = ['p50_ms', 'p99_ms', 'queries', 'memory_kb']
+
+# Dataset sizes; changing them changes every result, so they're not settings
+DATASET = {'users': 500, 'products': 400, 'orders': 1000, 'carts': 100}
+DATASET_END = date(2025, 6, 30)
+DATASET_DAYS = 180
+BENCH_TELEGRAM_BASE = 9_000_000_000
+PROMO_CODE = 'BENCH10'
+UNLIMITED_STOCK = 10 ** 6
+
+
+def benchmark_setting(name):
+    return getattr(settings, 'BENCHMARKS', {}).get(name, DEFAULTS[name])
+
+
+def budgets(overrides=None):
+    """Per-scenario budgets: the defaults, then the BENCHMARKS setting, then ``overrides``"""
+    merged = {name: dict(values) for name, values in DEFAULTS['BUDGETS'].items()}
+    for layer in (getattr(settings, 'BENCHMARKS', {}).get('BUDGETS', {}), overrides or {}):
+        for name, values in layer.items():
+            merged.setdefault(name, {}).update(values)
+    return merged
+
+
+def seed_dataset(seed):
+    """Seed the current database and return what the scenarios need"""
+    branch = Address.objects.create(
+        name='Benchmark branch', branch_type='pickup', street='Amir Temur 1', district='Yunusabad',
+        city='Tashkent', region='Tashkent', postal_code='100000', phone='+998901234567',
+        working_hours='09:00-21:00',
+    )
+    generator = FakeDataGenerator(seed=seed, workers=1, end=DATASET_END, days=DATASET_DAYS)
+    generator.ensure_reference_data()
+    for kind, count in DATASET.items():
+        getattr(generator, f'generate_{kind}')(count)
+    generator.finish()
+
+    now = timezone.now()
+    PromoCode.objects.create(
+        code=PROMO_CODE, discount_type='percentage', discount_value=Decimal('10'),
+        start_date=now - timedelta(days=1), end_date=now + timedelta(days=365), per_user_limit=UNLIMITED_STOCK,
+    )
+
+    # Writing scenarios buy from these, so they never run out
+    products = list(Product.objects.filter(is_active=True).order_by('id')[:20])
+    variants = list(ProductVariant.objects.filter(product__in=products).order_by('product_id', 'id'))
+    ProductVariant.objects.filter(id__in=[variant.id for variant in variants]).update(stock=UNLIMITED_STOCK)
+    sync_product_stock([product.id for product in products])
+    first_variants = {}
+    for variant in variants:
+        first_variants.setdefault(variant.product_id, variant)
+
+    users = {}
+    for offset, name in enumerate(SCENARIOS):
+        users[name] = User.objects.create(
+            username=f'bench_{name}', telegram_id=str(BENCH_TELEGRAM_BASE + offset), is_telegram_user=True,
+        )
+    items = [(variant.product_id, variant.id) for variant in first_variants.values()]
+    for name in ('cart', 'promo_apply'):
+        fill_cart(users[name], items[:5])
+
+    return {
+        'branch_id': branch.id,
+        'users': users,
+        'items': items,
+        'slugs': list(Product.objects.filter(is_active=True).order_by('id').values_list('slug', flat=True)[:50]),
+    }
+
+
+def fill_cart(user, items):
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product_id, variant_id=variant_id, quantity=1)
+        for product_id, variant_id in items
+    ])
+    return cart
+
+
+class Scenario:
+    """
+    One endpoint under test. ``prepare(dataset, iteration)`` runs untimed before
+    every request and returns the path and payload to send.
+    """
+
+    def __init__(self, method, prepare, expected=(200,)):
+        self.method = method
+        self.prepare = prepare
+        self.expected = expected
+
+
+def _product_list(dataset, iteration):
+    return f'/products/?page={iteration % 5 + 1}', None
+
+
+def _product_detail(dataset, iteration):
+    return f"/products/{dataset['slugs'][iteration % len(dataset['slugs'])]}/", None
+
+
+def _cart(dataset, iteration):
+    return '/cart/', None
+
+
+def _cart_add(dataset, iteration):
+    product_id, variant_id = dataset['items'][iteration % len(dataset['items'])]
+    return '/cart/add/', {'product_id': product_id, 'variant_id': variant_id, 'quantity': 1}
+
+
+def _order_create(dataset, iteration):
+    # Placing an order deactivates the cart it was placed from
+    start = iteration % len(dataset['items'])
+    cart = fill_cart(dataset['users']['order_create'], (dataset['items'] * 2)[start:start + 3])
+    return '/orders/', {
+        'cart_id': cart.id, 'pickup_branch_id': dataset['branch_id'], 'customer_name': 'Benchmark Customer',
+        'phone_number': '+998901234567', 'payment_method': 'cash_on_pickup',
+    }
+
+
+def _direct_purchase(dataset, iteration):
+    product_id, variant_id = dataset['items'][iteration % len(dataset['items'])]
+    return '/direct-purchase/', {
+        'product_id': product_id, 'variant_id': variant_id, 'quantity': 1,
+        'pickup_branch_id': dataset['branch_id'], 'payment_method': 'cash_on_pickup',
+        'customer_name': 'Benchmark Customer', 'phone_number': '+998901234567',
+    }
+
+
+def _wishlist_add(dataset, iteration):
+    # Toggles: the second pass over the products removes them again
+    product_id, _ = dataset['items'][iteration % len(dataset['items'])]
+    return '/wishlist/add/', {'product_id': product_id}
+
+
+def _promo_apply(dataset, iteration):
+    return '/promo-codes/apply/', {'code': PROMO_CODE}
+
+
+SCENARIOS = {
+    'product_list': Scenario('get', _product_list),
+    'product_detail': Scenario('get', _product_detail),
+    'cart': Scenario('get', _cart),
+    # 201 for a new cart line, 200 when the quantity of an existing one grows
+    'cart_add': Scenario('post', _cart_add, expected=(200, 201)),
+    'order_create': Scenario('post', _order_create, expected=(201,)),
+    'direct_purchase': Scenario('post', _direct_purchase, expected=(201,)),
+    'wishlist_add': Scenario('post', _wishlist_add),
+    'promo_apply': Scenario('post', _promo_apply),
+}
+
+
+class QueryCounter:
+    """Counts queries on a connection through execute_wrapper"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries():
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        yield counter
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, -(-len(ordered) * pct // 100) - 1))]
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def _send(client, name, scenario, dataset, iteration):
+    path, payload = scenario.prepare(dataset, iteration)
+    kwargs = {'HTTP_X_TELEGRAM_ID': dataset['users'][name].telegram_id}
+    if payload is not None:
+        kwargs.update(data=payload, content_type='application/json')
+    started = time.perf_counter()
+    response = getattr(client, scenario.method)(path, **kwargs)
+    elapsed = time.perf_counter() - started
+    if response.status_code not in scenario.expected:
+        raise BenchmarkError(
+            f'{name}: {scenario.method.upper()} {path} answered {response.status_code}, '
+            f"expected {' or '.join(map(str, scenario.expected))}: {response.content[:500]!r}"
+        )
+    return path, elapsed
+
+
+def measure(name, dataset, iterations, warmup, memory_iterations, client=None):
+    """Latency, query and memory figures for one scenario"""
+    scenario = SCENARIOS[name]
+    client = client or Client()
+    for iteration in range(warmup):
+        _send(client, name, scenario, dataset, iteration)
+
+    timings, queries = [], []
+    for iteration in range(warmup, warmup + iterations):
+        with count_queries() as counter:
+            path, elapsed = _send(client, name, scenario, dataset, iteration)
+        timings.append(elapsed * 1000)
+        queries.append(counter.count)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for iteration in range(warmup + iterations, warmup + iterations + memory_iterations):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            _send(client, name, scenario, dataset, iteration)
+            peaks.append((tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'method': scenario.method.upper(),
+        'path': path,
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': max(queries),
+        'queries_median': percentile(queries, 50),
+        'memory_kb': round(max(peaks), 1) if peaks else None,
+    }
+
+
+def check_budgets(results, budgets):
+    """Human-readable descriptions of every exceeded budget"""
+    violations = []
+    for name, result in results.items():
+        for metric, limit in budgets.get(name, {}).items():
+            value = result.get(metric)
+            if value is not None and value > limit:
+                violations.append(f'{name}: {metric} {value} exceeds budget {limit}')
+    return violations
+
+
+def compare(results, baseline):
+    """{scenario: {metric: (baseline value, current value)}} for the scenarios both runs measured"""
+    return {
+        name: {metric: (baseline[name].get(metric), result.get(metric)) for metric in METRICS}
+        for name, result in results.items() if name in baseline
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class BenchmarkResults:
+    def __init__(self, results, budgets, options):
+        self.results = results
+        self.budgets = budgets
+        self.options = options
+        self.violations = check_budgets(results, budgets)
+
+    def as_dict(self):
+        return {
+            'commit': _commit(),
+            'created_at': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'machine': platform.machine(),
+            },
+            'options': self.options,
+            'dataset': DATASET,
+            'results': self.results,
+            'budgets': {name: self.budgets.get(name, {}) for name in self.results},
+            'violations': self.violations,
+        }
+
+
+def run_benchmarks(names=None, iterations=None, warmup=None, memory_iterations=None, seed=None,
+                   budget_overrides=None, progress=None):
+    """
+    Seed the (empty, throwaway) current database and measure the scenarios;
+    ``progress(name, result)`` is called after each one.
+    """
+    options = {
+        'iterations': iterations or benchmark_setting('ITERATIONS'),
+        'warmup': benchmark_setting('WARMUP') if warmup is None else warmup,
+        'memory_iterations': benchmark_setting('MEMORY_ITERATIONS') if memory_iterations is None else memory_iterations,
+        'seed': benchmark_setting('SEED') if seed is None else seed,
+    }
+    names = names or list(SCENARIOS)
+    results = {}
+    with flusher_paused() as events:
+        dataset = seed_dataset(options['seed'])
+        for name in names:
+            results[name] = measure(
+                name, dataset, options['iterations'], options['warmup'], options['memory_iterations']
+            )
+            events.flush()
+            if progress:
+                progress(name, results[name])
+    return BenchmarkResults(results, budgets(budget_overrides), options)
@@ -0,0 +1,142 @@
+"""
+Process-local directory of active pickup branches.
+
+Branches change rarely but are read on every order form, order validation and
+branch list request. Each worker keeps one immutable BranchDirectory snapshot:
+the active store/pickup branches by id, their summaries for order forms, the
+branch list response already encoded as JSON, a k-d tree over the branches
+with coordinates for nearest-branch queries (see geo.py) and their parsed
+working hours for open-now filtering. The snapshot is tagged with the
+'branches' catalog version, which writes to store and pickup addresses bump
+(see catalog_cache.py and signals.py); a worker notices a bump within the catalog VERSION_TIMEOUT
+and rebuilds its snapshot with a single query.
+"""
+
+import copy
+import re
+import threading
+
+from django.utils import timezone
+
+from .catalog_cache import get_catalog_version
+from .geo import KDTree
+from .models import Address
+from .renderers import ORJSONRenderer
+
+BRANCH_TYPES = ['store', 'pickup']
+SUMMARY_FIELDS = ['id', 'name', 'street', 'district', 'city', 'working_hours', 'location_link']
+
+_HOURS_RANGE = re.compile(r'(\d{1,2})[:.](\d{2})\s*[-–—]\s*(\d{1,2})[:.](\d{2})')
+ALWAYS_OPEN = [(0, 24 * 60)]
+
+
+def parse_working_hours(text, is_24_hours=False):
+    """
+    Opening ranges as (start, end) minutes of the day, e.g. '09:00-18:00' or
+    '09:00-13:00, 14:00-20:00'; an end before the start runs past midnight.
+    Returns None when the text holds no recognisable range.
+    """
+    if is_24_hours:
+        return ALWAYS_OPEN
+    ranges = [
+        (int(h1) % 24 * 60 + int(m1), int(h2) * 60 + int(m2))
+        for h1, m1, h2, m2 in _HOURS_RANGE.findall(text or '')
+    ]
+    return ranges or None
+
+
+def is_open_at(ranges, minute):
+    """Whether parsed working hours include a minute of the day; None when unknown"""
+    if ranges is None:
+        return None
+    for start, end in ranges:
+        if start < end:
+            if start <= minute < end:
+                return True
+        elif start > end:
+            if minute >= start or minute < end:
+                return True
+        else:
+            # Same opening and closing time: open around the clock
+            return True
+    return False
+
+
+class BranchDirectory:
+    """Immutable snapshot of the active branches at one catalog version"""
+
+    def __init__(self, version, branches):
+        from .serializers import AddressSerializer
+
+        self.version = version
+        self._by_id = {branch.id: branch for branch in branches}
+        self.data = AddressSerializer(branches, many=True).data
+        self.json = ORJSONRenderer().render(self.data)
+        self.summaries = [
+            {field: getattr(branch, field) for field in SUMMARY_FIELDS}
+            for branch in branches
+        ]
+        self._data_by_id = {item['id']: item for item in self.data}
+        self._hours = {
+            branch.id: parse_working_hours(branch.working_hours, branch.is_24_hours)
+            for branch in branches
+        }
+        self._tree = KDTree([
+            (float(branch.latitude), float(branch.longitude), branch.id)
+            for branch in branches
+            if branch.latitude is not None and branch.longitude is not None
+        ])
+
+    def __contains__(self, branch_id):
+        return branch_id in self._by_id
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, branch_id):
+        """A private copy of the branch, or None when it is not an active branch"""
+        branch = self._by_id.get(branch_id)
+        # Callers assign it to orders; the shared instance must stay untouched
+        return copy.copy(branch) if branch is not None else None
+
+    def is_open(self, branch_id, at=None):
+        """Whether the branch is open at ``at`` (default: now, local time); None when unknown"""
+        at = timezone.localtime(at)
+        return is_open_at(self._hours.get(branch_id), at.hour * 60 + at.minute)
+
+    def nearest(self, lat, lon, limit=5, open_now=False):
+        """
+        Up to ``limit`` branches closest to the point as serialized branch data
+        with 'distance_km' and 'is_open_now'; ``open_now`` keeps only branches
+        known to be open.
+        """
+        now = timezone.localtime()
+        minute = now.hour * 60 + now.minute
+        predicate = (lambda branch_id: is_open_at(self._hours[branch_id], minute)) if open_now else None
+        return [
+            {
+                **self._data_by_id[branch_id],
+                'distance_km': round(distance, 3),
+                'is_open_now': is_open_at(self._hours[branch_id], minute),
+            }
+            for distance, branch_id in self._tree.nearest(lat, lon, limit, predicate)
+        ]
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def get_branch_directory():
+    global _directory
+    version = get_catalog_version('branches')
+    directory = _directory
+    if directory is None or directory.version != version:
+        with _directory_lock:
+            if _directory is None or _directory.version != version:
+                branches = list(Address.objects.filter(
+                    branch_type__in=BRANCH_TYPES, is_active=True
+                ).order_by('name'))
+                _directory = BranchDirectory(version, branches)
+            directory = _directory
+    return directory
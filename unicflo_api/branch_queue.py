@@ -0,0 +1,88 @@
+"""
+Per-branch pickup queues for branch staff.
+
+Queue sizes (orders per branch in each QUEUE_STATUSES status) are kept as
+cache counters, one key per branch and status. order_workflow.transition() and
+order creation adjust them after commit with atomic incr/decr, so the queue
+screens, which staff refresh constantly, read a handful of cache keys instead
+of counting orders. A missing counter is recomputed for its branch with one
+grouped query over the (pickup_branch, status, created_at) index, which also
+serves the per-status order lists. Counters expire after COUNTER_TIMEOUT so any
+drift (status changes that bypass the state machine, deleted orders, an
+increment racing a recount) heals on its own.
+"""
+
+import logging
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+QUEUE_STATUSES = ['pending', 'processing', 'ready_for_pickup']
+COUNTER_TIMEOUT = 10 * 60
+
+
+def _counter_key(branch_id, status):
+    return f'branch_queue:{branch_id}:{status}'
+
+
+def adjust_counters(moves):
+    """Apply (branch_id, from_status, to_status) moves; from_status is '' for new orders"""
+    deltas = Counter()
+    for branch_id, from_status, to_status in moves:
+        if branch_id is None:
+            continue
+        if from_status in QUEUE_STATUSES:
+            deltas[_counter_key(branch_id, from_status)] -= 1
+        if to_status in QUEUE_STATUSES:
+            deltas[_counter_key(branch_id, to_status)] += 1
+
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            if delta > 0:
+                cache.incr(key, delta)
+            else:
+                cache.decr(key, -delta)
+        except ValueError:
+            # Not cached: the next read recounts the branch from the database
+            pass
+
+
+def queue_counts(branch_ids):
+    """Return {branch_id: {status: count}} for QUEUE_STATUSES, recounting uncached branches"""
+    branch_ids = list(branch_ids)
+    keys = {
+        _counter_key(branch_id, status): (branch_id, status)
+        for branch_id in branch_ids for status in QUEUE_STATUSES
+    }
+    cached = cache.get_many(list(keys))
+    counts = {branch_id: {} for branch_id in branch_ids}
+    for key, value in cached.items():
+        branch_id, status = keys[key]
+        counts[branch_id][status] = value
+
+    missing = [branch_id for branch_id in branch_ids if len(counts[branch_id]) < len(QUEUE_STATUSES)]
+    if missing:
+        for branch_id in missing:
+            counts[branch_id] = dict.fromkeys(QUEUE_STATUSES, 0)
+        rows = Order.objects.filter(
+            pickup_branch_id__in=missing, status__in=QUEUE_STATUSES
+        ).order_by().values_list('pickup_branch_id', 'status').annotate(count=Count('id'))
+        for branch_id, status, count in rows:
+            counts[branch_id][status] = count
+        cache.set_many({
+            _counter_key(branch_id, status): counts[branch_id][status]
+            for branch_id in missing for status in QUEUE_STATUSES
+        }, COUNTER_TIMEOUT)
+    return counts
+
+
+def queue_orders(branch_id, status):
+    """Orders waiting in one branch queue, oldest first"""
+    return Order.objects.filter(pickup_branch_id=branch_id, status=status).order_by('created_at', 'id')
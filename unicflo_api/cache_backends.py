@@ -0,0 +1,542 @@
+"""
+Two-level cache backend: a bounded in-process LRU in front of Redis.
+
+Reads are served from the local tier when possible and fall through to Redis
+otherwise; writes go to both. When Redis is unreachable the backend keeps
+working as a process-local cache and retries Redis after RETRY_AFTER seconds.
+``get_or_set`` computes missing values under a per-key lock (threads in the
+process and, through Redis, other workers) so an expensive key is rebuilt
+once instead of by every request that missed it. ``incr``/``decr`` run as
+Redis INCRBY (integers are stored unpickled for that) so concurrent counters
+in different workers never lose updates, and never recreate a missing or
+expired key without its TTL.
+
+Example configuration::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'unicflo_api.cache_backends.TieredRedisCache',
+            'LOCATION': 'redis://redis:6379/1',
+            'KEY_PREFIX': 'unicflo',
+            'OPTIONS': {
+                'L1_MAX_ENTRIES': 1000,
+                'L1_TIMEOUT': 5,
+            },
+        },
+    }
+"""
+
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.utils.module_loading import import_string
+from redis.exceptions import RedisError, ResponseError, WatchError
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _dumps(value):
+    # Plain ints are stored as digits so Redis INCRBY can update them in place.
+    if type(value) is int:
+        return str(value).encode()
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _loads(payload):
+    try:
+        return int(payload)
+    except ValueError:
+        return pickle.loads(payload)
+
+
+class RedisUnavailable(Exception):
+    """Raised internally when the Redis tier cannot serve a request"""
+
+
+class LocalLRU:
+    """Thread-safe bounded LRU mapping with per-entry expiry"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            payload, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return payload
+
+    def set(self, key, payload, ttl):
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (payload, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CacheStats:
+    """Hit/miss counters and Redis round-trip latency for one cache"""
+
+    COUNTERS = ('l1_hits', 'l2_hits', 'misses', 'sets', 'deletes', 'errors', 'lock_waits', 'computes')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = dict.fromkeys(self.COUNTERS, 0)
+            self._latency_total = 0.0
+            self._latency_max = 0.0
+            self._latency_count = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def observe(self, seconds):
+        with self._lock:
+            self._latency_total += seconds
+            self._latency_count += 1
+            self._latency_max = max(self._latency_max, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self._counters)
+            lookups = data['l1_hits'] + data['l2_hits'] + data['misses']
+            data['hit_ratio'] = round((data['l1_hits'] + data['l2_hits']) / lookups, 4) if lookups else 0.0
+            data['redis_calls'] = self._latency_count
+            data['redis_avg_ms'] = round(self._latency_total / self._latency_count * 1000, 3) if self._latency_count else 0.0
+            data['redis_max_ms'] = round(self._latency_max * 1000, 3)
+            return data
+
+
+class _SharedState:
+    """Per-process state shared by every thread's instance of the same cache"""
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, max_entries):
+        self.local = LocalLRU(max_entries)
+        self.stats = CacheStats()
+        self.client = None
+        self.client_lock = threading.Lock()
+        self.down_until = 0.0
+        self.flight_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    def flight_lock(self, key):
+        return self.flight_locks[hash(key) % self.LOCK_STRIPES]
+
+
+# Django instantiates cache backends per thread; keep tiers per process.
+_shared_states = {}
+_shared_states_lock = threading.Lock()
+
+
+class TieredRedisCache(BaseCache):
+    RELEASE_LOCK_RETRIES = 3
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._server = server if isinstance(server, str) else server[0]
+        self._client_class = options.get('CLIENT_CLASS', 'redis.Redis')
+        self._client_kwargs = {
+            'socket_timeout': options.get('SOCKET_TIMEOUT', 0.5),
+            'socket_connect_timeout': options.get('SOCKET_CONNECT_TIMEOUT', 0.5),
+            **options.get('CLIENT_KWARGS', {}),
+        }
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.retry_after = options.get('RETRY_AFTER', 10)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 10)
+        self.lock_poll_interval = options.get('LOCK_POLL_INTERVAL', 0.05)
+
+        state_key = (self._server, self.key_prefix)
+        with _shared_states_lock:
+            if state_key not in _shared_states:
+                _shared_states[state_key] = _SharedState(options.get('L1_MAX_ENTRIES', 1000))
+            self._state = _shared_states[state_key]
+
+    @property
+    def stats(self):
+        return self._state.stats
+
+    def get_stats(self):
+        """Hit/miss/latency counters plus the current tier status"""
+        data = self._state.stats.snapshot()
+        data['l1_entries'] = len(self._state.local)
+        data['redis_available'] = self._state.down_until <= time.monotonic()
+        return data
+
+    # Redis tier
+
+    def _get_client(self):
+        state = self._state
+        if state.client is None:
+            with state.client_lock:
+                if state.client is None:
+                    client_class = import_string(self._client_class)
+                    state.client = client_class.from_url(self._server, **self._client_kwargs)
+        return state.client
+
+    def _redis(self, method, *args, **kwargs):
+        state = self._state
+        if state.down_until > time.monotonic():
+            raise RedisUnavailable()
+        started = time.perf_counter()
+        try:
+            return getattr(self._get_client(), method)(*args, **kwargs)
+        except ResponseError:
+            # The command was rejected (e.g. INCRBY on a pickled value); Redis itself is fine.
+            raise
+        except RedisError as e:
+            state.down_until = time.monotonic() + self.retry_after
+            state.stats.incr('errors')
+            logger.warning(f"Redis cache unavailable, using local tier for {self.retry_after}s: {str(e)}")
+            raise RedisUnavailable() from e
+        finally:
+            state.stats.observe(time.perf_counter() - started)
+
+    def _ttl(self, timeout):
+        """Timeout in seconds for Redis, None for no expiry"""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return timeout
+
+    def _local_ttl(self, ttl, redis_ok):
+        # Without Redis the local tier is the only copy, so keep the full TTL.
+        if not redis_ok:
+            return ttl
+        if ttl is None:
+            return self.l1_timeout
+        return min(ttl, self.l1_timeout)
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        state = self._state
+
+        payload = state.local.get(key)
+        if payload is not _MISSING:
+            state.stats.incr('l1_hits')
+            return _loads(payload)
+
+        try:
+            payload = self._redis('get', key)
+        except RedisUnavailable:
+            payload = None
+        if payload is None:
+            state.stats.incr('misses')
+            return default
+
+        state.stats.incr('l2_hits')
+        state.local.set(key, payload, self.l1_timeout)
+        return _loads(payload)
+
+    def get_many(self, keys, version=None):
+        state = self._state
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        result = {}
+        pending = []
+        for full_key, key in key_map.items():
+            payload = state.local.get(full_key)
+            if payload is _MISSING:
+                pending.append(full_key)
+            else:
+                state.stats.incr('l1_hits')
+                result[key] = _loads(payload)
+
+        if pending:
+            try:
+                payloads = self._redis('mget', pending)
+            except RedisUnavailable:
+                payloads = [None] * len(pending)
+            for full_key, payload in zip(pending, payloads):
+                if payload is None:
+                    state.stats.incr('misses')
+                    continue
+                state.stats.incr('l2_hits')
+                state.local.set(full_key, payload, self.l1_timeout)
+                result[key_map[full_key]] = _loads(payload)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        ttl = self._ttl(timeout)
+        if ttl is not None and ttl <= 0:
+            self._delete_key(key)
+            return
+        payload = _dumps(value)
+        self._state.stats.incr('sets')
+        try:
+            self._redis('set', key, payload, px=None if ttl is None else int(ttl * 1000))
+            redis_ok = True
+        except RedisUnavailable:
+            redis_ok = False
+        self._state.local.set(key, payload, self._local_ttl(ttl, redis_ok))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        ttl = self._ttl(timeout)
+        if ttl is not None and ttl <= 0:
+            for key in data:
+                self.delete(key, version=version)
+            return []
+        payloads = {
+            self.make_and_validate_key(key, version=version): _dumps(value)
+            for key, value in data.items()
+        }
+        self._state.stats.incr('sets', len(payloads))
+        try:
+            pipe = self._get_client().pipeline(transaction=False)
+            for full_key, payload in payloads.items():
+                pipe.set(full_key, payload, px=None if ttl is None else int(ttl * 1000))
+            self._redis_pipeline(pipe)
+            redis_ok = True
+        except RedisUnavailable:
+            redis_ok = False
+        for full_key, payload in payloads.items():
+            self._state.local.set(full_key, payload, self._local_ttl(ttl, redis_ok))
+        return []
+
+    def _redis_pipeline(self, pipe):
+        state = self._state
+        if state.down_until > time.monotonic():
+            raise RedisUnavailable()
+        started = time.perf_counter()
+        try:
+            return pipe.execute()
+        except RedisError as e:
+            state.down_until = time.monotonic() + self.retry_after
+            state.stats.incr('errors')
+            logger.warning(f"Redis cache unavailable, using local tier for {self.retry_after}s: {str(e)}")
+            raise RedisUnavailable() from e
+        finally:
+            state.stats.observe(time.perf_counter() - started)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_and_validate_key(key, version=version)
+        ttl = self._ttl(timeout)
+        payload = _dumps(value)
+        try:
+            added = self._redis('set', full_key, payload, nx=True, px=None if ttl is None else int(ttl * 1000))
+        except RedisUnavailable:
+            if self._state.local.get(full_key) is not _MISSING:
+                return False
+            self._state.local.set(full_key, payload, self._local_ttl(ttl, False))
+            return True
+        if added:
+            self._state.stats.incr('sets')
+            self._state.local.set(full_key, payload, self._local_ttl(ttl, True))
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        ttl = self._ttl(timeout)
+        try:
+            if ttl is None:
+                touched = self._redis('persist', key) or self._redis('exists', key)
+            else:
+                touched = self._redis('pexpire', key, int(ttl * 1000))
+        except RedisUnavailable:
+            payload = self._state.local.get(key)
+            if payload is _MISSING:
+                return False
+            self._state.local.set(key, payload, self._local_ttl(ttl, False))
+            return True
+        return bool(touched)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._delete_key(key)
+
+    def _delete_key(self, key):
+        self._state.stats.incr('deletes')
+        deleted = self._state.local.delete(key)
+        try:
+            deleted = bool(self._redis('delete', key)) or deleted
+        except RedisUnavailable:
+            pass
+        return deleted
+
+    def incr(self, key, delta=1, version=None):
+        """Atomic in Redis; the local copy is dropped so the next read sees the new value"""
+        full_key = self.make_and_validate_key(key, version=version)
+        state = self._state
+        try:
+            value = self._redis_incr(full_key, delta)
+        except ResponseError as e:
+            raise TypeError(f"Value of '{key}' is not an integer") from e
+        except RedisUnavailable:
+            # The local tier is the only copy while Redis is down.
+            with state.flight_lock(full_key):
+                payload = state.local.get(full_key)
+                if payload is _MISSING:
+                    raise ValueError(f"Key '{key}' not found")
+                value = _loads(payload) + delta
+                state.local.set(full_key, _dumps(value), self._local_ttl(self.default_timeout, False))
+            return value
+        state.local.delete(full_key)
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        return value
+
+    def _redis_incr(self, key, delta):
+        """
+        INCRBY that never creates the key; returns None when it is missing.
+
+        WATCH makes the existence check and the increment one step: a key that
+        expires (or changes) in between aborts the transaction instead of being
+        recreated by INCRBY without its TTL.
+        """
+        state = self._state
+        if state.down_until > time.monotonic():
+            raise RedisUnavailable()
+        started = time.perf_counter()
+        try:
+            with self._get_client().pipeline() as pipe:
+                while True:
+                    try:
+                        pipe.watch(key)
+                        if not pipe.exists(key):
+                            pipe.unwatch()
+                            return None
+                        pipe.multi()
+                        pipe.incrby(key, delta)
+                        return pipe.execute()[0]
+                    except WatchError:
+                        # Another client got its write in first, so retrying always makes progress.
+                        continue
+        except ResponseError:
+            raise
+        except RedisError as e:
+            state.down_until = time.monotonic() + self.retry_after
+            state.stats.incr('errors')
+            logger.warning(f"Redis cache unavailable, using local tier for {self.retry_after}s: {str(e)}")
+            raise RedisUnavailable() from e
+        finally:
+            state.stats.observe(time.perf_counter() - started)
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def clear(self):
+        self._state.local.clear()
+        try:
+            if self.key_prefix:
+                cursor = 0
+                while True:
+                    cursor, keys = self._redis('scan', cursor, match=f'{self.key_prefix}:*', count=500)
+                    if keys:
+                        self._redis('delete', *keys)
+                    if not cursor:
+                        break
+            else:
+                self._redis('flushdb')
+        except RedisUnavailable:
+            pass
+
+    # Stampede protection
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.get(key, _MISSING, version=version)
+        if value is not _MISSING:
+            return value
+        if not callable(default):
+            self.add(key, default, timeout=timeout, version=version)
+            return self.get(key, default, version=version)
+
+        full_key = self.make_and_validate_key(key, version=version)
+        with self._state.flight_lock(full_key):
+            # Another thread of this process may have filled the key while we waited.
+            value = self.get(key, _MISSING, version=version)
+            if value is not _MISSING:
+                return value
+
+            lock_key = f'{full_key}:lock'
+            token = self._acquire_lock(lock_key)
+            if token is None:
+                value = self._wait_for(key, lock_key, version)
+                if value is not _MISSING:
+                    return value
+                token = self._acquire_lock(lock_key)
+
+            try:
+                self._state.stats.incr('computes')
+                value = default()
+                self.set(key, value, timeout=timeout, version=version)
+            finally:
+                if token:
+                    self._release_lock(lock_key, token)
+            return value
+
+    def _acquire_lock(self, lock_key):
+        """Token when acquired, '' when Redis is down (local lock only), None when held elsewhere"""
+        token = uuid.uuid4().hex
+        try:
+            acquired = self._redis('set', lock_key, token, nx=True, px=int(self.lock_timeout * 1000))
+        except RedisUnavailable:
+            return ''
+        return token if acquired else None
+
+    def _release_lock(self, lock_key, token):
+        try:
+            client = self._get_client()
+            for _ in range(self.RELEASE_LOCK_RETRIES):
+                with client.pipeline() as pipe:
+                    try:
+                        pipe.watch(lock_key)
+                        current = pipe.get(lock_key)
+                        if current is None or current.decode() != token:
+                            pipe.unwatch()
+                            return
+                        pipe.multi()
+                        pipe.delete(lock_key)
+                        pipe.execute()
+                        return
+                    except WatchError:
+                        continue
+        except RedisError as e:
+            logger.warning(f"Failed to release cache lock {lock_key}: {str(e)}")
+
+    def _wait_for(self, key, lock_key, version):
+        """Poll for the value another worker is computing until its lock disappears"""
+        self._state.stats.incr('lock_waits')
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll_interval)
+            value = self.get(key, _MISSING, version=version)
+            if value is not _MISSING:
+                return value
+            try:
+                if not self._redis('exists', lock_key):
+                    return self.get(key, _MISSING, version=version)
+            except RedisUnavailable:
+                return _MISSING
+        return _MISSING
@@ -0,0 +1,111 @@
+"""
+Abandoned cart reminders.
+
+The pipeline has two steps, both safe to run repeatedly from a scheduler:
+
+* enqueue_reminders() walks active, non-empty carts idle for longer than the
+  threshold in keyset-paginated batches over the (updated_at, id) partial index,
+  renders one message per cart from prefetched items and stores them as
+  CartReminder rows. The idempotency key is built from the cart and its last
+  update, so a cart gets at most one reminder per idle period however often the
+  job runs.
+* send_reminders() drains pending reminders through the rate-limited outbox
+  sender (see outbox.py).
+
+Neither step holds more than one batch in memory.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef, Prefetch, Q
+from django.utils import timezone
+
+from .models import Cart, CartItem, CartReminder
+from .outbox import enqueue, send_pending
+
+MAX_LISTED_ITEMS = 5
+
+
+def _escape(text):
+    for char in ('_', '*', '`', '['):
+        text = text.replace(char, f'\\{char}')
+    return text
+
+
+def abandoned_carts(idle_hours, max_idle_days, batch_size):
+    """Yield batches of abandoned carts with their live items prefetched"""
+    now = timezone.now()
+    carts = Cart.objects.filter(
+        is_active=True,
+        updated_at__lt=now - timedelta(hours=idle_hours),
+        updated_at__gte=now - timedelta(days=max_idle_days),
+        user__telegram_id__isnull=False,
+    ).filter(
+        Exists(CartItem.objects.filter(cart=OuterRef('pk'), is_deleted=False))
+    ).select_related('user').prefetch_related(
+        Prefetch(
+            'items',
+            queryset=CartItem.objects.filter(is_deleted=False).select_related('product').order_by('id'),
+            to_attr='live_items'
+        )
+    ).order_by('updated_at', 'id')
+
+    last = None
+    while True:
+        page = carts
+        if last is not None:
+            page = carts.filter(Q(updated_at__gt=last[0]) | Q(updated_at=last[0], id__gt=last[1]))
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last = (batch[-1].updated_at, batch[-1].id)
+
+
+def render_reminder(cart):
+    """Reminder text for a cart whose live items are prefetched into ``live_items``"""
+    items = cart.live_items
+    total = sum(item.total_price for item in items)
+    lines = [
+        "🛒 *Вы забыли товары в корзине*",
+        "",
+    ]
+    for item in items[:MAX_LISTED_ITEMS]:
+        price = item.product.discount_price or item.product.price
+        lines.append(f"• {item.quantity}x {_escape(item.product.name)} ({price:,} сум)")
+    if len(items) > MAX_LISTED_ITEMS:
+        lines.append(f"…и ещё {len(items) - MAX_LISTED_ITEMS} товар(ов)")
+    lines += [
+        "",
+        f"💰 Сумма: {total:,} сум",
+        "",
+        "Оформите заказ, пока товары есть в наличии!",
+    ]
+    return "\n".join(lines)
+
+
+def idempotency_key(cart):
+    return f"cart-reminder:{cart.id}:{int(cart.updated_at.timestamp())}"
+
+
+def enqueue_reminders(idle_hours=24, max_idle_days=7, batch_size=500):
+    """Queue reminders for abandoned carts; returns (carts seen, reminders queued)"""
+    seen = queued = 0
+    for batch in abandoned_carts(idle_hours, max_idle_days, batch_size):
+        reminders = [
+            CartReminder(
+                cart=cart,
+                chat_id=cart.user.telegram_id,
+                idempotency_key=idempotency_key(cart),
+                message=render_reminder(cart),
+            )
+            for cart in batch
+        ]
+        queued += enqueue(CartReminder, reminders)
+        seen += len(batch)
+    return seen, queued
+
+
+def send_reminders(rate=20, batch_size=100, limit=None):
+    """Deliver pending reminders; returns (sent, failed)"""
+    return send_pending(CartReminder, rate=rate, batch_size=batch_size, limit=limit)
@@ -0,0 +1,147 @@
+"""
+Versioned HTTP caching for catalog reference endpoints.
+
+Every catalog scope (colors, sizes, categories, ...) owns a version counter
+stored in CatalogVersion and mirrored in the cache backend. Any write to a
+model the scope depends on bumps the counter, which changes both the ETag and
+the key of the cached response body, so stale entries are never read again.
+"""
+
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from .models import CatalogVersion
+
+logger = logging.getLogger(__name__)
+
+# Catalog scope -> models whose writes invalidate it. Categories and brands
+# expose products_count, so product writes invalidate them as well.
+CATALOG_SCOPES = {
+    'colors': ['Color'],
+    'sizes': ['Size'],
+    'materials': ['Material'],
+    'seasons': ['Season'],
+    'shipping_methods': ['ShippingMethod'],
+    'categories': ['Category', 'Subcategory', 'GenderCategory', 'Product'],
+    'brands': ['Brand', 'Product'],
+    'branches': ['Address'],  # store and pickup addresses only, see signals.invalidate_catalog
+}
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default',
+    'VERSION_TIMEOUT': 5,
+    'BODY_TIMEOUT': 60 * 60,
+    'CACHE_CONTROL': {'public': True, 'max_age': 60},
+}
+
+
+def catalog_setting(name):
+    return getattr(settings, 'CATALOG_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def _cache():
+    return caches[catalog_setting('CACHE_ALIAS')]
+
+
+def _version_key(scope):
+    return f'catalog:version:{scope}'
+
+
+def scopes_for_model(model_name):
+    """Return the catalog scopes invalidated by writes to the given model"""
+    return [scope for scope, models in CATALOG_SCOPES.items() if model_name in models]
+
+
+def get_catalog_version(scope):
+    """
+    Current version of a catalog scope.
+
+    The value is served from the cache and only re-read from the database
+    after VERSION_TIMEOUT, so per-process caches converge quickly even when
+    another worker performed the bump.
+    """
+    cache = _cache()
+    version = cache.get(_version_key(scope))
+    if version is None:
+        version = CatalogVersion.objects.filter(scope=scope).values_list('version', flat=True).first() or 1
+        cache.set(_version_key(scope), version, catalog_setting('VERSION_TIMEOUT'))
+    return version
+
+
+def bump_catalog_version(*scopes):
+    """Increment the version of the given scopes once the current transaction commits"""
+    def _bump():
+        cache = _cache()
+        for scope in scopes:
+            updated = CatalogVersion.objects.filter(scope=scope).update(version=F('version') + 1)
+            if not updated:
+                _, created = CatalogVersion.objects.get_or_create(scope=scope, defaults={'version': 2})
+                if not created:
+                    CatalogVersion.objects.filter(scope=scope).update(version=F('version') + 1)
+            cache.delete(_version_key(scope))
+            logger.debug(f"Catalog scope {scope} invalidated")
+
+    transaction.on_commit(_bump)
+
+
+def _request_fingerprint(request):
+    """Hash of everything besides the catalog version that shapes the response body"""
+    raw = '|'.join([
+        request.get_host(),
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+    ])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class CatalogCacheMixin:
+    """
+    Conditional GET and body caching for read-mostly catalog views.
+
+    Set ``catalog_scope`` to one of CATALOG_SCOPES. GET/HEAD requests get a
+    strong ETag derived from the scope version; a matching If-None-Match
+    returns 304 before authentication or any queryset runs, and rendered JSON
+    bodies are cached per version in the configured cache backend.
+    """
+    catalog_scope = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.catalog_scope is None or request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        fingerprint = _request_fingerprint(request)
+        version = get_catalog_version(self.catalog_scope)
+        etag = quote_etag(f'{self.catalog_scope}-{version}-{fingerprint[:16]}')
+
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            return self._add_catalog_headers(HttpResponseNotModified(), etag)
+
+        cache = _cache()
+        body_key = f'catalog:body:{self.catalog_scope}:{version}:{fingerprint}'
+        cached = cache.get(body_key)
+        if cached is not None:
+            content, content_type = cached
+            return self._add_catalog_headers(HttpResponse(content, content_type=content_type), etag)
+
+        response = super().dispatch(request, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        if response.status_code == 200 and renderer is not None and renderer.format == 'json':
+            response.render()
+            cache.set(body_key, (response.content, response['Content-Type']), catalog_setting('BODY_TIMEOUT'))
+            self._add_catalog_headers(response, etag)
+        return response
+
+    def _add_catalog_headers(self, response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, **catalog_setting('CACHE_CONTROL'))
+        patch_vary_headers(response, ['Accept'])
+        return response
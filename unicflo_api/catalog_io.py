@@ -0,0 +1,441 @@
+"""
+Bulk catalog import and export.
+
+A catalog file holds one record per product, as JSON lines or CSV rows:
+
+    {"slug": "air-max-90", "name": "Air Max 90", "description": "...",
+     "price": "1299000.00", "discount_price": null,
+     "subcategory": "sneakers", "brand": "nike", "gender": "men", "season": "Summer",
+     "is_featured": false, "is_active": true,
+     "materials": ["Leather"], "shipping_methods": ["Pickup"],
+     "variants": [{"color": "Red", "size": "42", "stock": 5}],
+     "images": [{"image": "product_images/air-max.jpg", "color": "Red", "is_primary": true, "alt_text": ""}]}
+
+Foreign keys are natural keys: slugs for subcategories, brands and genders,
+names for everything else. In CSV the four list columns hold JSON.
+
+Both directions stream. export_records() reads products with iterator() and
+prefetches the related rows of each chunk; import_catalog() reads records
+from a generator and writes them batch by batch, each batch in its own
+transaction. A batch costs a fixed number of queries whatever its size: the
+existing products are looked up by slug, new ones are bulk-created and changed
+ones bulk-updated (only the fields that changed, as bulk_update grows with
+rows times fields), and variants, images and M2M links are written the same
+way. Reference tables are loaded into lookup dicts once per run.
+Materials missing from the database are created on the fly; other unknown
+references reject the record. Importing is an upsert by slug: variants are
+matched on (color, size) and images on their path. Nothing is deleted.
+
+Bulk writes send no signals, so each batch resyncs stock totals and levels
+itself (see inventory.py) and the catalog versions are bumped once at the end
+(see catalog_cache.py).
+"""
+
+import csv
+import json
+import logging
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .catalog_cache import bump_catalog_version, scopes_for_model
+from .inventory import sync_variants
+from .models import (
+    Brand, Color, GenderCategory, Material, Product, ProductImage, ProductVariant, Season,
+    ShippingMethod, Size, Subcategory,
+)
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ['jsonl', 'csv']
+
+PRODUCT_FIELDS = [
+    'slug', 'name', 'description', 'price', 'discount_price',
+    'subcategory', 'brand', 'gender', 'season', 'is_featured', 'is_active',
+]
+LIST_FIELDS = ['materials', 'shipping_methods', 'variants', 'images']
+CSV_COLUMNS = PRODUCT_FIELDS + LIST_FIELDS
+
+# Record key -> (model, natural key field) of the product's foreign keys
+FOREIGN_KEYS = {
+    'subcategory': (Subcategory, 'slug'),
+    'brand': (Brand, 'slug'),
+    'gender': (GenderCategory, 'slug'),
+    'season': (Season, 'name'),
+}
+UPDATE_FIELDS = [
+    'name', 'description', 'price', 'discount_price', 'subcategory', 'brand', 'gender', 'season',
+    'is_featured', 'is_active',
+]
+UPDATE_ATTNAMES = [Product._meta.get_field(name).attname for name in UPDATE_FIELDS]
+
+
+class RecordError(ValueError):
+    pass
+
+
+class MalformedRecord(dict):
+    """Stands in for a line that could not be decoded, so the importer rejects it and carries on"""
+
+    def __init__(self, line, error):
+        super().__init__()
+        self.line = line
+        self.error = error
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def format_for_path(path):
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+# Reading and writing files
+
+def read_records(stream, fmt):
+    """Yield records from an open text stream; undecodable ones come as MalformedRecord"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            try:
+                for field in LIST_FIELDS:
+                    row[field] = json.loads(row[field]) if row.get(field) else []
+            except json.JSONDecodeError as e:
+                yield MalformedRecord(reader.line_num, f"invalid JSON in {field}: {e}")
+                continue
+            yield row
+    else:
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield MalformedRecord(number, f"invalid JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield MalformedRecord(number, "expected a JSON object")
+                continue
+            yield record
+
+
+def write_records(stream, records, fmt):
+    """Write records to an open text stream; returns the number written"""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        for record in records:
+            row = dict(record)
+            for field in LIST_FIELDS:
+                row[field] = json.dumps(row[field], ensure_ascii=False)
+            writer.writerow(row)
+            count += 1
+    else:
+        for record in records:
+            stream.write(json.dumps(record, ensure_ascii=False, default=str))
+            stream.write('\n')
+            count += 1
+    return count
+
+
+# Export
+
+def export_queryset():
+    return Product.objects.select_related('subcategory', 'brand', 'gender', 'season').prefetch_related(
+        Prefetch('variants', queryset=ProductVariant.objects.select_related('color', 'size').order_by('id')),
+        Prefetch('images', queryset=ProductImage.objects.select_related('color').order_by('id')),
+        Prefetch('materials', queryset=Material.objects.order_by('id')),
+        Prefetch('shipping_methods', queryset=ShippingMethod.objects.order_by('id')),
+    ).order_by('id')
+
+
+def product_record(product):
+    return {
+        'slug': product.slug,
+        'name': product.name,
+        'description': product.description,
+        'price': str(product.price),
+        'discount_price': str(product.discount_price) if product.discount_price is not None else None,
+        'subcategory': product.subcategory.slug,
+        'brand': product.brand.slug if product.brand else None,
+        'gender': product.gender.slug if product.gender else None,
+        'season': product.season.name if product.season else None,
+        'is_featured': product.is_featured,
+        'is_active': product.is_active,
+        'materials': [material.name for material in product.materials.all()],
+        'shipping_methods': [method.name for method in product.shipping_methods.all()],
+        'variants': [
+            {'color': variant.color.name, 'size': variant.size.name, 'stock': variant.stock}
+            for variant in product.variants.all()
+        ],
+        'images': [
+            {
+                'image': image.image.name,
+                'color': image.color.name,
+                'is_primary': image.is_primary,
+                'alt_text': image.alt_text,
+            }
+            for image in product.images.all()
+        ],
+    }
+
+
+def export_records(queryset=None, chunk_size=1000):
+    """Yield catalog records; each chunk of products is fetched with its prefetches"""
+    queryset = export_queryset() if queryset is None else queryset
+    for product in queryset.iterator(chunk_size=chunk_size):
+        yield product_record(product)
+
+
+# Import
+
+class Lookup:
+    """Natural key -> id of one reference table, loaded once per import"""
+
+    def __init__(self, model, field, create=False):
+        self.model = model
+        self.field = field
+        self.create = create
+        # The oldest row wins when a natural key is not unique
+        self._ids = dict(model.objects.order_by('-id').values_list(field, 'id'))
+
+    def get(self, key, record_key):
+        if key in (None, ''):
+            return None
+        try:
+            return self._ids[key]
+        except KeyError:
+            raise RecordError(f"unknown {record_key} {key!r}")
+
+    def get_many(self, keys, record_key):
+        """Ids of the given keys, creating missing rows when the lookup allows it"""
+        missing = [key for key in dict.fromkeys(keys) if key not in self._ids]
+        if missing:
+            if not self.create:
+                raise RecordError(f"unknown {record_key} {missing[0]!r}")
+            for row in self.model.objects.bulk_create([self.model(**{self.field: key}) for key in missing]):
+                self._ids[getattr(row, self.field)] = row.id
+        return [self._ids[key] for key in keys]
+
+
+def _decimal(value, field, required=False):
+    if value in (None, ''):
+        if required:
+            raise RecordError(f"{field} is required")
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise RecordError(f"invalid {field} {value!r}")
+
+
+def _bool(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes')
+
+
+class CatalogImporter:
+    """Upserts catalog records in batches; counters accumulate over the run"""
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.lookups = {key: Lookup(model, field) for key, (model, field) in FOREIGN_KEYS.items()}
+        self.colors = Lookup(Color, 'name')
+        self.sizes = Lookup(Size, 'name')
+        self.materials = Lookup(Material, 'name', create=True)
+        self.shipping_methods = Lookup(ShippingMethod, 'name')
+        self.created = self.updated = self.unchanged = self.rejected = 0
+        self.variants = self.images = 0
+        self.errors = []
+
+    def run(self, records, progress=None):
+        """Import an iterable of records; ``progress(importer)`` is called after every batch"""
+        for batch in batched(records, self.batch_size):
+            with transaction.atomic():
+                self.import_batch(batch)
+            if progress:
+                progress(self)
+        if self.created or self.updated or self.variants:
+            scopes = set()
+            for name in ('Product', 'ProductVariant', 'Material'):
+                scopes.update(scopes_for_model(name))
+            if scopes:
+                bump_catalog_version(*scopes)
+        return self
+
+    @property
+    def processed(self):
+        return self.created + self.updated + self.unchanged + self.rejected
+
+    def parse(self, record):
+        """Product instance (without pk) and its related rows as ids, or RecordError"""
+        name = (record.get('name') or '').strip()
+        if not name:
+            raise RecordError("name is required")
+        slug = record.get('slug') or slugify(name)
+        product = Product(
+            slug=slug,
+            name=name,
+            description=record.get('description') or '',
+            price=_decimal(record.get('price'), 'price', required=True),
+            discount_price=_decimal(record.get('discount_price'), 'discount_price'),
+            is_featured=_bool(record.get('is_featured'), False),
+            is_active=_bool(record.get('is_active'), True),
+        )
+        for key, lookup in self.lookups.items():
+            setattr(product, f'{key}_id', lookup.get(record.get(key), key))
+        if product.subcategory_id is None:
+            raise RecordError("subcategory is required")
+
+        variants = {}
+        for variant in record.get('variants') or []:
+            color_id = self.colors.get(variant.get('color'), 'color')
+            size_id = self.sizes.get(variant.get('size'), 'size')
+            if color_id is None or size_id is None:
+                raise RecordError("variants need a color and a size")
+            variants[(color_id, size_id)] = max(int(variant.get('stock') or 0), 0)
+        images = []
+        for image in record.get('images') or []:
+            color_id = self.colors.get(image.get('color'), 'color')
+            if not image.get('image') or color_id is None:
+                raise RecordError("images need a path and a color")
+            images.append((image['image'], color_id, _bool(image.get('is_primary'), False), image.get('alt_text') or ''))
+        shipping = self.shipping_methods.get_many(record.get('shipping_methods') or [], 'shipping method')
+        materials = self.materials.get_many(record.get('materials') or [], 'material')
+        return product, variants, images, materials, shipping
+
+    def import_batch(self, records):
+        parsed = {}
+        for record in records:
+            if isinstance(record, MalformedRecord):
+                self.reject(record, record.error)
+                continue
+            try:
+                product, *related = self.parse(record)
+            except (RecordError, TypeError, ValueError, AttributeError) as e:
+                self.reject(record, e)
+                continue
+            # A slug repeated within the batch: the last record wins
+            parsed[product.slug] = (product, *related)
+        if not parsed:
+            return
+
+        existing = {
+            slug: (product_id, values)
+            for slug, product_id, *values in Product.objects.filter(slug__in=list(parsed)).values_list(
+                'slug', 'id', *UPDATE_ATTNAMES
+            )
+        }
+        new = [product for slug, (product, *_) in parsed.items() if slug not in existing]
+        # bulk_update writes a CASE per row and field: only send rows and fields that changed
+        changed, changed_fields = [], set()
+        for slug, (product_id, values) in existing.items():
+            product = parsed[slug][0]
+            product.pk = product_id
+            fields = {
+                name for name, attname, value in zip(UPDATE_FIELDS, UPDATE_ATTNAMES, values)
+                if getattr(product, attname) != value
+            }
+            if fields:
+                changed.append(product)
+                changed_fields |= fields
+        Product.objects.bulk_create(new, batch_size=self.batch_size)
+        if changed:
+            # bulk_update leaves auto_now fields alone
+            now = timezone.now()
+            for product in changed:
+                product.updated_at = now
+            Product.objects.bulk_update(changed, sorted(changed_fields | {'updated_at'}), batch_size=self.batch_size)
+        self.created += len(new)
+        self.updated += len(changed)
+        self.unchanged += len(existing) - len(changed)
+
+        product_ids = [product.id for product, *_ in parsed.values()]
+        self.write_variants(parsed.values(), product_ids)
+        self.write_images(parsed.values(), product_ids)
+        self.write_links(parsed.values())
+
+    def write_variants(self, parsed, product_ids):
+        current = {
+            (product_id, color_id, size_id): (variant_id, stock)
+            for variant_id, product_id, color_id, size_id, stock in ProductVariant.objects.filter(
+                product_id__in=product_ids
+            ).values_list('id', 'product_id', 'color_id', 'size_id', 'stock')
+        }
+        new, changed = [], []
+        for product, variants, *_ in parsed:
+            for (color_id, size_id), stock in variants.items():
+                variant = ProductVariant(product_id=product.id, color_id=color_id, size_id=size_id, stock=stock)
+                variant_id, current_stock = current.get((product.id, color_id, size_id), (None, None))
+                if variant_id is None:
+                    new.append(variant)
+                elif stock != current_stock:
+                    variant.pk = variant_id
+                    changed.append(variant)
+        ProductVariant.objects.bulk_create(new, batch_size=self.batch_size)
+        ProductVariant.objects.bulk_update(changed, ['stock'], batch_size=self.batch_size)
+        self.variants += len(new) + len(changed)
+        if new or changed:
+            # Imported stock is the starting point, not a drop worth alerting about
+            sync_variants([variant.id for variant in new + changed], alert=False)
+
+    def write_images(self, parsed, product_ids):
+        current = set(ProductImage.objects.filter(product_id__in=product_ids).values_list('product_id', 'image'))
+        new = [
+            ProductImage(product_id=product.id, image=path, color_id=color_id, is_primary=is_primary, alt_text=alt_text)
+            for product, _, images, *_ in parsed
+            for path, color_id, is_primary, alt_text in images
+            if (product.id, path) not in current
+        ]
+        ProductImage.objects.bulk_create(new, batch_size=self.batch_size)
+        self.images += len(new)
+
+    def write_links(self, parsed):
+        material_through = Product.materials.through
+        shipping_through = Product.shipping_methods.through
+        material_links, shipping_links = [], []
+        for product, _, _, materials, shipping in parsed:
+            material_links += [material_through(product_id=product.id, material_id=pk) for pk in materials]
+            shipping_links += [shipping_through(product_id=product.id, shippingmethod_id=pk) for pk in shipping]
+        material_through.objects.bulk_create(material_links, batch_size=self.batch_size, ignore_conflicts=True)
+        shipping_through.objects.bulk_create(shipping_links, batch_size=self.batch_size, ignore_conflicts=True)
+
+    def reject(self, record, error):
+        self.rejected += 1
+        if len(self.errors) < 20:
+            if isinstance(record, MalformedRecord):
+                label = f"line {record.line}"
+            else:
+                label = record.get('slug') or record.get('name') or '?'
+            self.errors.append(f"{label}: {error}")
+
+
+def import_catalog(records, batch_size=1000, progress=None):
+    """Upsert catalog records; returns the CatalogImporter with its counters"""
+    return CatalogImporter(batch_size=batch_size).run(records, progress=progress)
+
+
+class RateMeter:
+    """Rows per second since creation"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def rate(self, rows):
+        return rows / self.elapsed if self.elapsed else 0.0
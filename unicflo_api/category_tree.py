@@ -0,0 +1,90 @@
+"""
+Materialized genders -> categories -> subcategories tree.
+
+The tree is built with three queries, rendered once to JSON bytes and kept in
+process memory together with the 'categories' catalog version it was built
+from. Requests only compare that version (served from the cache, see
+catalog_cache.get_catalog_version) and reuse the encoded blob while it is
+unchanged, so a warm tree is served without touching the database.
+"""
+
+import logging
+import threading
+
+from django.db.models import Count, Q
+from rest_framework.renderers import JSONRenderer
+
+from .catalog_cache import get_catalog_version
+from .models import GenderCategory, Category, Subcategory
+
+logger = logging.getLogger(__name__)
+
+TREE_SCOPE = 'categories'
+
+_lock = threading.Lock()
+# (version, content) swapped as one tuple so readers never see a torn pair
+_tree = (None, None)
+
+
+def _image_url(image):
+    return image.url if image else None
+
+
+def build_category_tree():
+    """Return the category tree as plain Python data"""
+    subcategories = {}
+    for sub in Subcategory.objects.filter(is_active=True).annotate(
+        products_count=Count('products', filter=Q(products__is_active=True))
+    ).order_by('name'):
+        subcategories.setdefault(sub.category_id, []).append({
+            'id': sub.id,
+            'name': sub.name,
+            'slug': sub.slug,
+            'image': _image_url(sub.image),
+            'products_count': sub.products_count,
+        })
+
+    categories = {}
+    for category in Category.objects.order_by('name'):
+        children = subcategories.get(category.id, [])
+        categories.setdefault(category.gender_id, []).append({
+            'id': category.id,
+            'name': category.name,
+            'slug': category.slug,
+            'image': _image_url(category.image),
+            'products_count': sum(child['products_count'] for child in children),
+            'subcategories': children,
+        })
+
+    genders = []
+    for gender in GenderCategory.objects.order_by('name'):
+        children = categories.get(gender.id, [])
+        genders.append({
+            'id': gender.id,
+            'name': gender.name,
+            'slug': gender.slug,
+            'products_count': sum(child['products_count'] for child in children),
+            'categories': children,
+        })
+
+    return {
+        'genders': genders,
+        'categories_without_gender': categories.get(None, []),
+    }
+
+
+def get_category_tree():
+    """Return (version, encoded JSON bytes), rebuilding only when the catalog version moved"""
+    global _tree
+    version = get_catalog_version(TREE_SCOPE)
+    current = _tree
+    if current[0] == version:
+        return current
+
+    with _lock:
+        if _tree[0] != version:
+            data = build_category_tree()
+            data['version'] = version
+            _tree = (version, JSONRenderer().render(data))
+            logger.debug(f"Category tree rebuilt for version {version}")
+        return _tree
@@ -0,0 +1,208 @@
+"""
+Buffered ingestion of behavioural product events (views, cart adds, wishlist
+toggles, purchases).
+
+Request handlers only append a tuple to a bounded in-process ring buffer. A
+daemon flusher thread drains it every FLUSH_INTERVAL seconds, or as soon as a
+full batch is waiting. Each batch is bulk-inserted as UserProductInteraction
+rows, which the recommendation jobs read, and folded into the popularity
+scores. When the buffer is full the oldest event is dropped and counted, so a
+slow database costs events, never memory or request latency. Whatever is still
+buffered at interpreter exit is flushed by an atexit hook. flusher_paused()
+stops the thread for code that owns the database for a while (benchmarks on a
+throwaway database) and flushes on its own schedule instead.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from .models import UserProductInteraction
+from .popularity import add_events
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BUFFER_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 2.0,
+}
+
+
+def events_setting(name):
+    return getattr(settings, 'INTERACTION_EVENTS', {}).get(name, DEFAULTS[name])
+
+
+class EventBuffer:
+    """Bounded FIFO of pending events with a background flusher"""
+
+    def __init__(self, capacity, batch_size, flush_interval):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._pauses = 0
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._reported_drops = 0
+
+    def record(self, user_id, product_id, kind, quantity=1):
+        event = (user_id, product_id, kind, quantity, timezone.now())
+        with self._lock:
+            if len(self._events) >= self.capacity:
+                self._events.popleft()
+                self.dropped += 1
+            self._events.append(event)
+            self.recorded += 1
+            batch_ready = len(self._events) >= self.batch_size
+        self._ensure_flusher()
+        if batch_ready:
+            self._wakeup.set()
+
+    def _drain(self):
+        with self._lock:
+            count = min(self.batch_size, len(self._events))
+            return [self._events.popleft() for _ in range(count)]
+
+    def flush(self):
+        """Write every buffered event now and return the number of rows written"""
+        written = 0
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            try:
+                UserProductInteraction.bulk_ingest([
+                    UserProductInteraction(
+                        user_id=user_id, product_id=product_id, kind=kind,
+                        quantity=quantity, created_at=created_at
+                    )
+                    for user_id, product_id, kind, quantity, created_at in batch
+                ], batch_size=self.batch_size)
+                add_events([
+                    (product_id, kind, quantity, created_at)
+                    for _, product_id, kind, quantity, created_at in batch
+                ])
+            except DatabaseError:
+                # The batch is lost rather than retried: a failing database must not grow the buffer
+                logger.exception(f"Failed to write {len(batch)} interaction events")
+                with self._lock:
+                    self.failed += len(batch)
+                break
+            written += len(batch)
+            with self._lock:
+                self.flushed += len(batch)
+
+        if self.dropped > self._reported_drops:
+            logger.warning(f"Interaction event buffer full: {self.dropped - self._reported_drops} events dropped")
+            self._reported_drops = self.dropped
+        return written
+
+    def discard(self):
+        """Drop every buffered event and return how many there were"""
+        with self._lock:
+            count = len(self._events)
+            self._events.clear()
+        return count
+
+    def _run(self):
+        while not self._pauses:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._pauses:
+                break
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def pause(self):
+        """Stop the flusher thread (waiting for a flush in progress); events stay buffered"""
+        with self._lock:
+            self._pauses += 1
+            thread = self._thread
+        self._wakeup.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def resume(self):
+        with self._lock:
+            self._pauses = max(self._pauses - 1, 0)
+
+    def _ensure_flusher(self):
+        # A forked worker inherits the buffer but not the thread, hence the pid check
+        if self._pauses or (self._pid == os.getpid() and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._pauses or (self._pid == os.getpid() and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name='interaction-events-flusher', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'buffered': len(self._events),
+                'recorded': self.recorded,
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'failed': self.failed,
+            }
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_event_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = EventBuffer(
+                    capacity=events_setting('BUFFER_SIZE'),
+                    batch_size=events_setting('BATCH_SIZE'),
+                    flush_interval=events_setting('FLUSH_INTERVAL'),
+                )
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+@contextmanager
+def flusher_paused():
+    """No background writes inside the block; call flush() on the yielded buffer to write"""
+    buffer = get_event_buffer()
+    buffer.pause()
+    try:
+        yield buffer
+    finally:
+        buffer.resume()
+
+
+def record_event(user, product, kind, quantity=1):
+    """Queue a behavioural event; anonymous users are not tracked"""
+    if user is None or not user.is_authenticated:
+        return
+    record_user_event(user.pk, product, kind, quantity)
+
+
+def record_user_event(user_id, product, kind, quantity=1):
+    """record_event for callers that only hold the user's id"""
+    if not events_setting('ENABLED'):
+        return
+    get_event_buffer().record(user_id, getattr(product, 'pk', product), kind, quantity)
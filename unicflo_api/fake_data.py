@@ -0,0 +1,675 @@
+"""
+Bulk fake data for load testing and benchmark datasets.
+
+FakeDataGenerator seeds users, products with variants, orders with items and
+active carts at millions-of-rows scale:
+
+* Rows are produced in fixed chunks of CHUNK_SIZE by plain functions that never
+  touch the database, so they can run in forked worker processes while the
+  main process writes the previous chunks. Every chunk draws from its own
+  random.Random seeded with (seed, kind, chunk index), which makes the output
+  depend only on the seed, the counts and the time window, not on the number
+  of workers. The window is given by its last day and never read from the
+  clock, so a run can be repeated later.
+* The main process writes each chunk with bulk_create in one transaction.
+  Users share one precomputed password hash; usernames, slugs and telegram ids
+  are deduplicated against in-memory sets loaded once, not with an exists()
+  query per row. Names come from small Faker pools built once per run.
+* Distributions aim to look like a shop: product popularity and customer
+  activity are Zipfian, order times follow month, weekday and hour-of-day
+  weights, order statuses and their status events follow the order's age,
+  and prices are log-normal.
+
+Bulk writes send no signals, so what they would have written is written here:
+stock totals and levels, the opening status events of orders, purchase
+interactions and the branch queue counters; the catalog versions are bumped
+once per run. Timestamps are historical, so the auto_now fields of the
+written models are switched off while a chunk is saved.
+"""
+
+import math
+import multiprocessing
+import random
+from array import array
+from bisect import bisect
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .branch_queue import adjust_counters
+from .catalog_cache import bump_catalog_version, scopes_for_model
+from .inventory import stock_level
+from .models import (
+    Address, Brand, Cart, CartItem, Category, Color, GenderCategory, Material, Order, OrderItem,
+    OrderStatusEvent, Product, ProductVariant, Season, ShippingMethod, Size, Subcategory, User,
+    UserProductInteraction,
+)
+
+CHUNK_SIZE = 1000  # rows per generated chunk; fixed so the output doesn't depend on it
+PASSWORD = 'testpass123'
+TELEGRAM_ID_BASE = 7_000_000_000
+
+PRODUCT_ZIPF = 1.1
+CUSTOMER_ZIPF = 0.7
+# Jan..Dec, Mon..Sun, 0..23h
+MONTH_WEIGHTS = [0.8, 0.7, 1.0, 0.9, 0.9, 0.8, 0.7, 0.9, 1.1, 1.0, 1.4, 1.6]
+WEEKDAY_WEIGHTS = [1.0, 0.95, 0.95, 1.0, 1.1, 1.3, 1.2]
+HOUR_WEIGHTS = [
+    0.3, 0.15, 0.1, 0.05, 0.05, 0.1, 0.3, 0.6, 0.9, 1.1, 1.2, 1.3,
+    1.4, 1.3, 1.2, 1.2, 1.3, 1.5, 1.8, 2.1, 2.3, 2.0, 1.4, 0.8,
+]
+
+GENDERS = [('Мужчины', 'men'), ('Женщины', 'women'), ('Унисекс', 'unisex')]
+CATEGORIES = {
+    ('Одежда', 'clothing'): [
+        ('Футболки', 't-shirts'), ('Джинсы', 'jeans'), ('Куртки', 'jackets'), ('Рубашки', 'shirts'),
+        ('Платья', 'dresses'),
+    ],
+    ('Обувь', 'shoes'): [('Кроссовки', 'sneakers'), ('Ботинки', 'boots'), ('Туфли', 'loafers')],
+    ('Аксессуары', 'accessories'): [('Сумки', 'bags'), ('Ремни', 'belts'), ('Часы', 'watches')],
+}
+BRANDS = ['Nike', 'Adidas', 'Puma', 'Reebok', 'New Balance', 'Zara', 'H&M', 'Uniqlo', 'Mango', "Levi's"]
+COLORS = [
+    ('Black', '#000000'), ('White', '#FFFFFF'), ('Red', '#FF0000'), ('Blue', '#0000FF'),
+    ('Green', '#00FF00'), ('Beige', '#F5F5DC'), ('Gray', '#808080'),
+]
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+MATERIALS = ['Cotton', 'Leather', 'Polyester', 'Wool', 'Denim', 'Silk']
+SEASONS = ['Spring', 'Summer', 'Autumn', 'Winter']
+STYLES = ['Classic', 'Sport', 'Urban', 'Premium', 'Essential', 'Comfort', 'Vintage', 'Slim', 'Oversize', 'Basic']
+PHONE_CODES = ['90', '91', '93', '94', '97', '99', '88', '33']
+
+PAYMENT_METHODS = ['cash_on_pickup', 'card', 'split', 'cash_on_delivery']
+PAYMENT_WEIGHTS = [45, 40, 10, 5]
+ITEM_COUNT_WEIGHTS = [50, 25, 13, 7, 5]  # orders with 1..5 distinct items
+QUANTITY_WEIGHTS = [80, 15, 5]  # 1..3 units per item
+# (max age in days, {final status: weight}) for the order's age at the end of the window
+STATUS_BY_AGE = [
+    (1, {'pending': 50, 'processing': 30, 'ready_for_pickup': 15, 'canceled': 5}),
+    (7, {'pending': 5, 'processing': 15, 'ready_for_pickup': 30, 'delivered': 40, 'canceled': 10}),
+    (None, {'delivered': 85, 'canceled': 10, 'returned': 5}),
+]
+# Status path to each final status, and the delay range (hours) before each step
+STATUS_PATHS = {
+    'pending': [],
+    'processing': ['processing'],
+    'ready_for_pickup': ['processing', 'ready_for_pickup'],
+    'delivered': ['processing', 'ready_for_pickup', 'delivered'],
+    'returned': ['processing', 'ready_for_pickup', 'delivered', 'returned'],
+    'canceled': ['canceled'],
+}
+STEP_HOURS = {
+    'processing': (0.1, 2), 'ready_for_pickup': (1, 24), 'delivered': (2, 72),
+    'returned': (24, 14 * 24), 'canceled': (0.1, 48),
+}
+CART_DAYS = 14  # active carts were last touched within this many days
+
+
+def _cents(value):
+    return Decimal(value).scaleb(-2)
+
+
+def zipf_cum_weights(n, exponent):
+    """Cumulative weights of ranks 1..n under Zipf's law, for random.choices / bisect"""
+    return array('d', accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+class SeasonalClock:
+    """Timestamps in the ``days`` days up to the end of ``end``, weighted by month, weekday and hour"""
+
+    def __init__(self, end, days=365):
+        self.tz = timezone.get_current_timezone()
+        self.latest = datetime.combine(end, time.max, tzinfo=self.tz)
+        self.start = datetime.combine(end - timedelta(days=days - 1), time.min, tzinfo=self.tz)
+        self.days = [end - timedelta(days=offset) for offset in range(days)][::-1]
+        self.day_weights = list(accumulate(
+            MONTH_WEIGHTS[day.month - 1] * WEEKDAY_WEIGHTS[day.weekday()] for day in self.days
+        ))
+        self.hour_weights = list(accumulate(HOUR_WEIGHTS))
+
+    def sample(self, rng):
+        day = rng.choices(self.days, cum_weights=self.day_weights)[0]
+        hour = rng.choices(range(24), cum_weights=self.hour_weights)[0]
+        return datetime(day.year, day.month, day.day, hour, rng.randrange(60), rng.randrange(60), tzinfo=self.tz)
+
+    def uniform(self, rng, lead_days=0):
+        """Uniform over the window extended ``lead_days`` into the past"""
+        start = self.start - timedelta(days=lead_days)
+        return start + (self.latest - start) * rng.random()
+
+
+class NamePools:
+    """Small Faker-made pools that generated rows draw from; Faker itself is too slow per row"""
+
+    def __init__(self, seed, size=500):
+        from faker import Faker
+
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        self.first_names = {
+            'm': [fake.first_name_male() for _ in range(size)],
+            'f': [fake.first_name_female() for _ in range(size)],
+        }
+        self.last_names = {
+            'm': [fake.last_name_male() for _ in range(size)],
+            'f': [fake.last_name_female() for _ in range(size)],
+        }
+        self.user_names = [fake.user_name() for _ in range(size * 4)]
+        self.descriptions = [fake.text(max_nb_chars=300) for _ in range(size // 5)]
+
+    def person(self, rng):
+        sex = rng.choice('mf')
+        return rng.choice(self.first_names[sex]), rng.choice(self.last_names[sex])
+
+
+def phone_number(rng):
+    return f"+998{rng.choice(PHONE_CODES)}{rng.randrange(10 ** 7):07d}"
+
+
+class UniqueNamer:
+    """Hands out unique values, suffixing '-2', '-3', ... to taken ones"""
+
+    def __init__(self, taken=()):
+        self.taken = set(taken)
+        self.next_suffix = {}
+
+    def claim(self, base):
+        value = base
+        if value in self.taken:
+            suffix = self.next_suffix.get(base, 2)
+            while f'{base}-{suffix}' in self.taken:
+                suffix += 1
+            self.next_suffix[base] = suffix + 1
+            value = f'{base}-{suffix}'
+        self.taken.add(value)
+        return value
+
+
+@contextmanager
+def historical_timestamps(*models):
+    """Let bulk writes keep the created_at / updated_at values set on the instances"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+# Chunk producers. They run in worker processes and only read the context the
+# pool was started with.
+
+_context = None
+
+
+def _init_worker(context):
+    global _context
+    _context = context
+
+
+def _rng(kind, index):
+    return random.Random(f"{_context['seed']}:{kind}:{index}")
+
+
+def _zipf_pick(rng, ranked, cum_weights):
+    """An item of ``ranked`` (most popular first) drawn with Zipfian weights"""
+    return ranked[bisect(cum_weights, rng.random() * cum_weights[-1], hi=len(cum_weights) - 1)]
+
+
+def user_chunk(chunk):
+    index, start, stop = chunk
+    rng, pools, clock = _rng('users', index), _context['pools'], _context['clock']
+    rows = []
+    for number in range(start, stop):
+        first_name, last_name = pools.person(rng)
+        is_telegram = rng.random() < 0.8
+        rows.append({
+            'username': rng.choice(pools.user_names),
+            'first_name': first_name,
+            'last_name': last_name,
+            'is_telegram_user': is_telegram,
+            'telegram_id': str(TELEGRAM_ID_BASE + _context['seed'] * 10 ** 8 + number) if is_telegram else None,
+            'date_joined': clock.uniform(rng, lead_days=365),
+        })
+    return rows
+
+
+def product_chunk(chunk):
+    index, start, stop = chunk
+    rng, pools, clock, ref = _rng('products', index), _context['pools'], _context['clock'], _context['reference']
+    rows = []
+    for number in range(start, stop):
+        subcategory_id, gender_id, subcategory_name, subcategory_slug = rng.choice(ref['subcategories'])
+        brand_id, brand_name, brand_slug = rng.choice(ref['brands'])
+        style = rng.choice(STYLES)
+        code = f'{number:x}'
+        price = max(10_000, min(50_000_000, round(math.exp(rng.gauss(math.log(250_000), 0.8)), -3)))
+        discount = round(price * rng.choice([0.7, 0.8, 0.9]), -3) if rng.random() < 0.3 else None
+        variants = []
+        for color_id in rng.sample(ref['colors'], rng.randint(1, 3)):
+            for size_id in rng.sample(ref['sizes'], rng.randint(2, 4)):
+                roll = rng.random()
+                stock = 0 if roll < 0.1 else rng.randint(1, 5) if roll < 0.25 else rng.randint(6, 100)
+                variants.append((color_id, size_id, stock))
+        rows.append({
+            'name': f'{brand_name} {subcategory_name} {style} {code.upper()}',
+            'slug': f'{brand_slug}-{subcategory_slug}-{style.lower()}-{code}',
+            'description': rng.choice(pools.descriptions),
+            'price': price * 100,
+            'discount_price': discount * 100 if discount else None,
+            'subcategory_id': subcategory_id,
+            'gender_id': gender_id,
+            'brand_id': brand_id,
+            'season_id': rng.choice(ref['seasons']),
+            'is_featured': rng.random() < 0.05,
+            'created_at': clock.uniform(rng, lead_days=365),
+            'materials': rng.sample(ref['materials'], rng.randint(1, 3)),
+            'shipping_methods': rng.sample(ref['shipping_methods'], min(len(ref['shipping_methods']), rng.randint(1, 2))),
+            'variants': variants,
+        })
+    return rows
+
+
+def _pick_variant(rng, catalog):
+    """(product id, variant id, unit price in cents) of a Zipf-popular product"""
+    product = _zipf_pick(rng, catalog['ranked'], catalog['cum_weights'])
+    offset = catalog['offsets'][product] + rng.randrange(catalog['counts'][product])
+    return catalog['product_ids'][product], catalog['variant_ids'][offset], catalog['prices'][product]
+
+
+def _status_timeline(rng, created_at, status, latest):
+    events = [('', 'pending', created_at)]
+    at = created_at
+    for step in STATUS_PATHS[status]:
+        low, high = STEP_HOURS[step]
+        at = min(at + timedelta(hours=rng.uniform(low, high)), latest)
+        events.append((events[-1][1], step, at))
+    return events
+
+
+def order_chunk(chunk):
+    index, start, stop = chunk
+    rng, pools, clock = _rng('orders', index), _context['pools'], _context['clock']
+    catalog, customers = _context['catalog'], _context['customers']
+    branches = _context['branches']
+    rows = []
+    for _ in range(start, stop):
+        created_at = clock.sample(rng)
+        # Nobody orders before signing up: redraw the customer (long-standing ones
+        # end up ordering more), and as a last resort move the order
+        for _ in range(10):
+            customer = _zipf_pick(rng, customers['ranked'], customers['cum_weights'])
+            joined = customers['joined'][customer]
+            if joined <= created_at.timestamp():
+                break
+        else:
+            created_at = datetime.fromtimestamp(joined + (clock.latest.timestamp() - joined) * rng.random(), clock.tz)
+        age = (clock.latest - created_at).days
+        weights = next(weights for max_age, weights in STATUS_BY_AGE if max_age is None or age < max_age)
+        status = rng.choices(list(weights), list(weights.values()))[0]
+
+        items = {}
+        for _ in range(rng.choices(range(1, 6), ITEM_COUNT_WEIGHTS)[0]):
+            product_id, variant_id, price = _pick_variant(rng, catalog)
+            quantity = rng.choices(range(1, 4), QUANTITY_WEIGHTS)[0]
+            _, _, held = items.get(variant_id, (None, None, 0))
+            items[variant_id] = (product_id, price, held + quantity)
+
+        first_name, last_name = pools.person(rng)
+        rows.append({
+            'user_id': customers['ids'][customer],
+            'created_at': created_at,
+            'status': status,
+            'events': _status_timeline(rng, created_at, status, clock.latest),
+            'payment_method': rng.choices(PAYMENT_METHODS, PAYMENT_WEIGHTS)[0],
+            'pickup_branch_id': rng.choice(branches) if branches else None,
+            'customer_name': f'{first_name} {last_name}',
+            'phone_number': phone_number(rng),
+            'items': [
+                (product_id, variant_id, quantity, price)
+                for variant_id, (product_id, price, quantity) in items.items()
+            ],
+        })
+    return rows
+
+
+def cart_chunk(chunk):
+    index, start, stop = chunk
+    rng, clock = _rng('carts', index), _context['clock']
+    catalog, customers = _context['catalog'], _context['customers']
+    count, stride, offset = len(customers['ids']), _context['cart_stride'], _context['cart_offset']
+    rows = []
+    for number in range(start, stop):
+        # A bijection over the customers, so no customer gets two active carts
+        customer = (number * stride + offset) % count
+        updated_at = clock.latest - timedelta(days=CART_DAYS) * rng.random()
+        items = {}
+        for _ in range(rng.randint(1, 4)):
+            product_id, variant_id, _ = _pick_variant(rng, catalog)
+            items[variant_id] = (product_id, rng.choices(range(1, 4), QUANTITY_WEIGHTS)[0])
+        rows.append({
+            'user_id': customers['ids'][customer],
+            'created_at': updated_at - timedelta(hours=rng.uniform(0, 72)),
+            'updated_at': updated_at,
+            'items': [(product_id, variant_id, quantity) for variant_id, (product_id, quantity) in items.items()],
+        })
+    return rows
+
+
+def _get_or_create(model, defaults=None, **lookup):
+    # Reference tables without unique names may hold duplicates; take the first
+    return model.objects.filter(**lookup).first() or model.objects.create(**lookup, **(defaults or {}))
+
+
+class FakeDataGenerator:
+    """
+    Writes fake rows in chunks; counters accumulate over the run. ``end`` is
+    the last day of the time window (a date, required so runs are repeatable).
+    ``workers`` > 1 produces chunks in forked processes while the main process
+    writes; ``progress(kind, done, total)`` is called after every chunk.
+    """
+
+    def __init__(self, end, seed=0, workers=1, days=365, progress=None):
+        self.seed = seed
+        self.workers = workers
+        self.clock = SeasonalClock(end, days)
+        self.progress = progress
+        self.pools = NamePools(seed)
+        self.reference = None
+        self.counts = {}
+
+    def _context(self, **extra):
+        return {'seed': self.seed, 'clock': self.clock, 'pools': self.pools, 'reference': self.reference, **extra}
+
+    def produce(self, producer, total, context):
+        """Yield the chunks of ``total`` rows in order, with at most a few chunks in flight"""
+        chunks = [(index, start, min(start + CHUNK_SIZE, total)) for index, start in enumerate(range(0, total, CHUNK_SIZE))]
+        if self.workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            _init_worker(context)
+            yield from map(producer, chunks)
+            return
+        # Forked workers inherit the context instead of unpickling it
+        with multiprocessing.get_context('fork').Pool(self.workers, _init_worker, (context,)) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(producer, (chunk,)))
+                if len(pending) >= self.workers * 2:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+    def _run(self, kind, producer, total, context, write):
+        done = 0
+        for rows in self.produce(producer, total, context):
+            with transaction.atomic():
+                write(rows)
+            done += len(rows)
+            if self.progress:
+                self.progress(kind, done, total)
+        self.counts[kind] = self.counts.get(kind, 0) + done
+
+    def ensure_reference_data(self):
+        """Create the genders, categories, brands and other reference rows that don't exist yet"""
+        genders = {slug: _get_or_create(GenderCategory, slug=slug, defaults={'name': name}) for name, slug in GENDERS}
+        subcategories = []
+        for (category_name, category_slug), children in CATEGORIES.items():
+            for gender_slug, gender in genders.items():
+                category = _get_or_create(
+                    Category, slug=f'{category_slug}-{gender_slug}', defaults={'name': category_name, 'gender': gender}
+                )
+                for name, slug in children:
+                    subcategory = _get_or_create(
+                        Subcategory, slug=f'{slug}-{gender_slug}',
+                        defaults={'name': name, 'category': category, 'gender': gender},
+                    )
+                    subcategories.append((subcategory.id, gender.id, name, slug))
+        brands = []
+        for name in BRANDS:
+            slug = name.lower().replace(' ', '-').replace('&', 'and').replace("'", '')
+            brand = _get_or_create(Brand, slug=slug, defaults={'name': name})
+            brands.append((brand.id, brand.name, slug))
+        shipping_methods = list(ShippingMethod.objects.filter(is_active=True).values_list('id', flat=True))
+        if not shipping_methods:
+            shipping_methods = [ShippingMethod.objects.create(name='Самовывоз', min_days=0, max_days=1, price=0).id]
+        self.reference = {
+            'subcategories': subcategories,
+            'brands': brands,
+            'colors': [_get_or_create(Color, name=name, defaults={'hex_code': code}).id for name, code in COLORS],
+            'sizes': [_get_or_create(Size, name=name).id for name in SIZES],
+            'materials': [_get_or_create(Material, name=name).id for name in MATERIALS],
+            'seasons': [_get_or_create(Season, name=name).id for name in SEASONS],
+            'shipping_methods': shipping_methods,
+        }
+        return self.reference
+
+    def generate_users(self, total):
+        password = make_password(PASSWORD)
+        usernames = UniqueNamer(User.objects.values_list('username', flat=True).iterator())
+        telegram_ids = set(User.objects.filter(telegram_id__isnull=False).values_list('telegram_id', flat=True))
+
+        def write(rows):
+            users = []
+            for row in rows:
+                username = usernames.claim(row['username'])
+                telegram_id = row['telegram_id'] if row['telegram_id'] not in telegram_ids else None
+                telegram_ids.add(telegram_id)
+                users.append(User(
+                    username=username,
+                    email=f'{username}@example.com',
+                    password=password,
+                    first_name=row['first_name'],
+                    last_name=row['last_name'],
+                    is_telegram_user=row['is_telegram_user'],
+                    telegram_id=telegram_id,
+                    telegram_username=username if telegram_id else None,
+                    date_joined=row['date_joined'],
+                ))
+            User.objects.bulk_create(users)
+
+        self._run('users', user_chunk, total, self._context(), write)
+
+    def generate_products(self, total):
+        if self.reference is None:
+            self.ensure_reference_data()
+        slugs = UniqueNamer(Product.objects.values_list('slug', flat=True).iterator())
+        materials = Product.materials.through
+        shipping_methods = Product.shipping_methods.through
+
+        def write(rows):
+            products = []
+            for row in rows:
+                stocks = [stock for _, _, stock in row['variants']]
+                products.append(Product(
+                    name=row['name'],
+                    slug=slugs.claim(row['slug']),
+                    description=row['description'],
+                    price=_cents(row['price']),
+                    discount_price=_cents(row['discount_price']) if row['discount_price'] else None,
+                    subcategory_id=row['subcategory_id'],
+                    gender_id=row['gender_id'],
+                    brand_id=row['brand_id'],
+                    season_id=row['season_id'],
+                    is_featured=row['is_featured'],
+                    total_stock=sum(stocks),
+                    in_stock=any(stocks),
+                    created_at=row['created_at'],
+                    updated_at=row['created_at'],
+                ))
+            with historical_timestamps(Product, ProductVariant):
+                Product.objects.bulk_create(products)
+                ProductVariant.objects.bulk_create([
+                    ProductVariant(
+                        product=product, color_id=color_id, size_id=size_id, stock=stock, stock_level=stock_level(stock),
+                        created_at=product.created_at, updated_at=product.created_at,
+                    )
+                    for product, row in zip(products, rows)
+                    for color_id, size_id, stock in row['variants']
+                ])
+            materials.objects.bulk_create([
+                materials(product_id=product.id, material_id=material_id)
+                for product, row in zip(products, rows) for material_id in row['materials']
+            ])
+            shipping_methods.objects.bulk_create([
+                shipping_methods(product_id=product.id, shippingmethod_id=method_id)
+                for product, row in zip(products, rows) for method_id in row['shipping_methods']
+            ])
+
+        self._run('products', product_chunk, total, self._context(), write)
+
+    def load_catalog(self):
+        """Active products with their variants as flat arrays, ranked by a seeded popularity order"""
+        product_ids, prices, offsets, counts, variant_ids = array('q'), array('q'), array('q'), array('l'), array('q')
+        rows = ProductVariant.objects.filter(product__is_active=True).order_by('product_id', 'id').values_list(
+            'product_id', 'id', 'product__price', 'product__discount_price'
+        )
+        for product_id, variant_id, price, discount_price in rows.iterator(chunk_size=10000):
+            if not product_ids or product_ids[-1] != product_id:
+                product_ids.append(product_id)
+                prices.append(int((discount_price or price) * 100))
+                offsets.append(len(variant_ids))
+                counts.append(0)
+            variant_ids.append(variant_id)
+            counts[-1] += 1
+        ranked = array('q', range(len(product_ids)))
+        random.Random(f'{self.seed}:popularity').shuffle(ranked)
+        return {
+            'product_ids': product_ids, 'prices': prices, 'offsets': offsets, 'counts': counts,
+            'variant_ids': variant_ids, 'ranked': ranked,
+            'cum_weights': zipf_cum_weights(len(product_ids), PRODUCT_ZIPF),
+        }
+
+    def load_customers(self):
+        ids, joined = array('q'), array('d')
+        rows = User.objects.filter(is_staff=False).order_by('id').values_list('id', 'date_joined')
+        for user_id, date_joined in rows.iterator(chunk_size=10000):
+            ids.append(user_id)
+            joined.append(date_joined.timestamp())
+        ranked = array('q', range(len(ids)))
+        random.Random(f'{self.seed}:customers').shuffle(ranked)
+        return {'ids': ids, 'joined': joined, 'ranked': ranked, 'cum_weights': zipf_cum_weights(len(ids), CUSTOMER_ZIPF)}
+
+    def _shopping_context(self, **extra):
+        catalog, customers = self.load_catalog(), self.load_customers()
+        if not catalog['product_ids'] or not customers['ids']:
+            return None
+        return self._context(catalog=catalog, customers=customers, **extra)
+
+    def generate_orders(self, total):
+        branches = list(Address.objects.filter(
+            branch_type__in=['store', 'pickup'], is_active=True
+        ).order_by('id').values_list('id', flat=True))
+        context = self._shopping_context(branches=branches)
+        if context is None:
+            self.counts['orders'] = self.counts.get('orders', 0)
+            return
+
+        def write(rows):
+            orders = []
+            for row in rows:
+                total_amount = _cents(sum(quantity * price for _, _, quantity, price in row['items']))
+                status, events = row['status'], row['events']
+                paid = status in ('delivered', 'returned')
+                order = Order(
+                    user_id=row['user_id'],
+                    total_amount=total_amount,
+                    final_amount=total_amount,
+                    status=status,
+                    pickup_branch_id=row['pickup_branch_id'],
+                    customer_name=row['customer_name'],
+                    phone_number=row['phone_number'],
+                    payment_method=row['payment_method'],
+                    payment_status='delivered' if paid else 'pending',
+                    created_at=row['created_at'],
+                    updated_at=events[-1][2],
+                )
+                if order.payment_method == 'split':
+                    order.is_split_payment = True
+                    order.first_payment_amount = (total_amount / 2).quantize(Decimal('0.01'))
+                    order.second_payment_amount = total_amount - order.first_payment_amount
+                    order.first_payment_date = row['created_at']
+                    order.second_payment_due_date = row['created_at'] + timedelta(days=30)
+                    if paid and order.second_payment_due_date <= self.clock.latest:
+                        order.second_payment_status = 'delivered'
+                orders.append(order)
+
+            with historical_timestamps(Order, OrderItem):
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order, product_id=product_id, variant_id=variant_id, quantity=quantity,
+                        price=_cents(price), created_at=order.created_at,
+                    )
+                    for order, row in zip(orders, rows)
+                    for product_id, variant_id, quantity, price in row['items']
+                ])
+            OrderStatusEvent.objects.bulk_create([
+                OrderStatusEvent(order=order, from_status=from_status, to_status=to_status, created_at=at)
+                for order, row in zip(orders, rows)
+                for from_status, to_status, at in row['events']
+            ])
+            # What the OrderItem post_save signal records for recommendations
+            UserProductInteraction.objects.bulk_create([
+                UserProductInteraction(
+                    user_id=order.user_id, product_id=product_id, kind='purchase', quantity=quantity,
+                    created_at=order.created_at,
+                )
+                for order, row in zip(orders, rows)
+                for product_id, _, quantity, _ in row['items']
+            ])
+            moves = [(order.pickup_branch_id, '', order.status) for order in orders]
+            transaction.on_commit(lambda: adjust_counters(moves))
+
+        self._run('orders', order_chunk, total, context, write)
+
+    def generate_carts(self, total):
+        busy = set(Cart.objects.filter(is_active=True).values_list('user_id', flat=True))
+        customers = User.objects.filter(is_staff=False).count()
+        total = min(total, customers - len(busy))
+        rng = random.Random(f'{self.seed}:carts')
+        stride = rng.randrange(1, max(customers, 2))
+        while customers and math.gcd(stride, customers) != 1:
+            stride += 1
+        context = self._shopping_context(cart_stride=stride, cart_offset=rng.randrange(max(customers, 1)))
+        if context is None or total <= 0:
+            self.counts['carts'] = self.counts.get('carts', 0)
+            return
+
+        def write(rows):
+            # Customers that already had an active cart before this run keep theirs
+            rows = [row for row in rows if row['user_id'] not in busy]
+            carts = [
+                Cart(user_id=row['user_id'], created_at=row['created_at'], updated_at=row['updated_at'])
+                for row in rows
+            ]
+            with historical_timestamps(Cart, CartItem):
+                Cart.objects.bulk_create(carts)
+                CartItem.objects.bulk_create([
+                    CartItem(
+                        cart=cart, product_id=product_id, variant_id=variant_id, quantity=quantity,
+                        created_at=row['created_at'], updated_at=row['updated_at'],
+                    )
+                    for cart, row in zip(carts, rows)
+                    for product_id, variant_id, quantity in row['items']
+                ])
+
+        self._run('carts', cart_chunk, total, context, write)
+
+    def finish(self):
+        """Bump the catalog versions the written products and reference rows affect"""
+        scopes = set()
+        for name in ('Product', 'ProductVariant', 'Category', 'Subcategory', 'GenderCategory', 'Brand',
+                     'Color', 'Size', 'Material', 'Season', 'ShippingMethod'):
+            scopes.update(scopes_for_model(name))
+        bump_catalog_version(*scopes)
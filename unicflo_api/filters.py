@@ -88,9 +88,8 @@ class ProductFilter(filters.FilterSet):
         return queryset
 
     def filter_in_stock(self, queryset, name, value):
-        if value:
-            return queryset.filter(variants__stock__gt=0)
-        return queryset.filter(variants__stock=0)
+        # Materialized from variant stock (see inventory.py); no join on variants
+        return queryset.filter(in_stock=value)
 
     def filter_search(self, queryset, name, value):
         if value:
@@ -0,0 +1,124 @@
+"""
+Pickup fulfillment SLA per branch.
+
+Every order's status history lives in OrderStatusEvent (see order_workflow.py).
+rollup_branch_sla() turns the recent part of it into one BranchFulfillmentStats
+row per branch and day: how many orders became ready for pickup that day and
+their average time from creation (pending) to ready, and how many were picked
+up that day and their average time from ready to delivered. Only orders with a
+ready/delivered event inside the window are read, through the
+(to_status, created_at) index, and the window's rows are replaced in one
+transaction, so the job can be rerun at will. Dashboards and the bot read the
+precomputed rows through branch_sla_summary().
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import BranchFulfillmentStats, Order, OrderStatusEvent
+
+logger = logging.getLogger(__name__)
+
+
+def _window_start(days):
+    start = timezone.localdate() - timedelta(days=days - 1)
+    return start, timezone.make_aware(datetime.combine(start, time.min))
+
+
+def rollup_branch_sla(days=7):
+    """Recompute the daily stats of the last ``days`` days; returns the number of rows written"""
+    start, start_at = _window_start(days)
+    touched = OrderStatusEvent.objects.filter(
+        to_status__in=['ready_for_pickup', 'delivered'], created_at__gte=start_at
+    ).values('order_id')
+    orders = Order.objects.filter(id__in=touched, pickup_branch__isnull=False).annotate(
+        ready_at=Min('status_events__created_at', filter=Q(status_events__to_status='ready_for_pickup')),
+        delivered_at=Min('status_events__created_at', filter=Q(status_events__to_status='delivered')),
+    ).values_list('pickup_branch_id', 'created_at', 'ready_at', 'delivered_at')
+
+    # (branch, day) -> [ready count, pending->ready total, delivered count, ready->delivered total]
+    buckets = defaultdict(lambda: [0, timedelta(), 0, timedelta()])
+    for branch_id, created_at, ready_at, delivered_at in orders.iterator(chunk_size=2000):
+        if ready_at is None:
+            continue
+        if ready_at >= start_at:
+            bucket = buckets[(branch_id, timezone.localdate(ready_at))]
+            bucket[0] += 1
+            bucket[1] += ready_at - created_at
+        if delivered_at is not None and delivered_at >= start_at:
+            bucket = buckets[(branch_id, timezone.localdate(delivered_at))]
+            bucket[2] += 1
+            bucket[3] += delivered_at - ready_at
+
+    rows = [
+        BranchFulfillmentStats(
+            branch_id=branch_id,
+            date=day,
+            ready_count=ready_count,
+            avg_pending_to_ready=ready_total / ready_count if ready_count else None,
+            delivered_count=delivered_count,
+            avg_ready_to_delivered=delivered_total / delivered_count if delivered_count else None,
+        )
+        for (branch_id, day), (ready_count, ready_total, delivered_count, delivered_total) in buckets.items()
+    ]
+    with transaction.atomic():
+        BranchFulfillmentStats.objects.filter(date__gte=start).delete()
+        BranchFulfillmentStats.objects.bulk_create(rows, batch_size=1000)
+    logger.info(f"Rolled up fulfillment SLA since {start}: {len(rows)} branch days")
+    return len(rows)
+
+
+def _weighted_average(pairs):
+    count = sum(n for n, _ in pairs)
+    if not count:
+        return None
+    return sum((average * n for n, average in pairs), timedelta()) / count
+
+
+def branch_sla_summary(days=30):
+    """
+    Per-branch SLA over the last ``days`` days, slowest pickup preparation first:
+    [{'branch_id', 'branch_name', 'ready_count', 'avg_pending_to_ready',
+      'delivered_count', 'avg_ready_to_delivered'}]
+    """
+    start, _ = _window_start(days)
+    per_branch = defaultdict(lambda: {'name': '', 'ready': [], 'delivered': []})
+    rows = BranchFulfillmentStats.objects.filter(date__gte=start).values_list(
+        'branch_id', 'branch__name', 'ready_count', 'avg_pending_to_ready',
+        'delivered_count', 'avg_ready_to_delivered'
+    )
+    for branch_id, name, ready_count, to_ready, delivered_count, to_delivered in rows:
+        branch = per_branch[branch_id]
+        branch['name'] = name
+        if ready_count:
+            branch['ready'].append((ready_count, to_ready))
+        if delivered_count:
+            branch['delivered'].append((delivered_count, to_delivered))
+
+    summary = [
+        {
+            'branch_id': branch_id,
+            'branch_name': branch['name'],
+            'ready_count': sum(n for n, _ in branch['ready']),
+            'avg_pending_to_ready': _weighted_average(branch['ready']),
+            'delivered_count': sum(n for n, _ in branch['delivered']),
+            'avg_ready_to_delivered': _weighted_average(branch['delivered']),
+        }
+        for branch_id, branch in per_branch.items()
+    ]
+    summary.sort(key=lambda row: row['avg_pending_to_ready'] or timedelta(), reverse=True)
+    return summary
+
+
+def format_duration(duration):
+    """Compact h/m rendering of an SLA duration, '—' when there is no data"""
+    if duration is None:
+        return '—'
+    minutes = int(duration.total_seconds() // 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m"
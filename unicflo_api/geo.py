@@ -0,0 +1,81 @@
+"""
+In-memory nearest-neighbour search over geographic points.
+
+Points are mapped to unit vectors on the sphere and stored in a 3-d k-d tree.
+The straight-line (chord) distance between unit vectors grows monotonically
+with the great-circle distance, so a plain Euclidean k-d tree search returns
+exact great-circle neighbours, with no projection error near the poles or the
+antimeridian, and no PostGIS.
+"""
+
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_unit_vector(lat, lon):
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+class KDTree:
+    """Static k-d tree of (lat, lon, item) points"""
+
+    def __init__(self, points):
+        entries = [(to_unit_vector(lat, lon), item) for lat, lon, item in points]
+        self.size = len(entries)
+        self._root = self._build(entries, 0)
+
+    def _build(self, entries, depth):
+        if not entries:
+            return None
+        axis = depth % 3
+        entries.sort(key=lambda entry: entry[0][axis])
+        middle = len(entries) // 2
+        vector, item = entries[middle]
+        # Node: (vector, item, axis, left, right)
+        return (
+            vector, item, axis,
+            self._build(entries[:middle], depth + 1),
+            self._build(entries[middle + 1:], depth + 1),
+        )
+
+    def nearest(self, lat, lon, k=1, predicate=None):
+        """
+        Up to ``k`` (distance_km, item) pairs nearest to the point, closest
+        first. Items rejected by ``predicate`` are skipped.
+        """
+        if k <= 0 or self._root is None:
+            return []
+        target = to_unit_vector(lat, lon)
+        best = []  # max-heap of (-squared chord, tiebreak, item)
+        counter = 0
+        # Each entry carries a lower bound of the squared distance to its subtree
+        stack = [(self._root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if node is None or (len(best) == k and bound >= -best[0][0]):
+                continue
+            vector, item, axis, left, right = node
+            distance = sum((a - b) ** 2 for a, b in zip(target, vector))
+            if predicate is None or predicate(item):
+                counter += 1
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, counter, item))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, counter, item))
+            offset = target[axis] - vector[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            # The far side lies beyond the splitting plane; the near side is visited first
+            stack.append((far, max(bound, offset * offset)))
+            stack.append((near, bound))
+
+        return [
+            (chord_to_km(math.sqrt(-negative)), item)
+            for negative, _, item in sorted(best, key=lambda entry: (-entry[0], entry[1]))
+        ]
@@ -0,0 +1,173 @@
+"""
+Inventory monitoring.
+
+Stock lives on ProductVariant. Two things are derived from it and kept in sync
+on every variant write:
+
+* Product.total_stock and Product.in_stock, the materialized sum of the
+  product's variant stock, so listings filter and sort on an indexed column
+  instead of joining and aggregating variants per request.
+* ProductVariant.stock_level ('ok', 'low' or 'out', by the LOW_STOCK_THRESHOLD
+  setting). sync_variants() compares each variant's stock with its stored
+  level; a drop to a worse level records a StockAlert, a recovery only moves
+  the level back, so every variant alerts once per episode however often it
+  is saved.
+
+Variant saves and deletes are synced by signals (see signals.py); code that
+changes stock with queryset updates calls sync_variants() itself, and
+resync_inventory() repairs anything that bypassed both.
+
+Pending alerts are folded into one Markdown message per batch and queued as
+StockAlertNotification rows for every Telegram admin, then delivered through
+the rate-limited outbox sender (see outbox.py) by the send_stock_alerts
+command.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from telegram.helpers import escape_markdown
+
+from .models import LOW_STOCK_THRESHOLD, Product, ProductVariant, StockAlert, StockAlertNotification, User
+from .outbox import enqueue, send_pending
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'LOW_STOCK_THRESHOLD': LOW_STOCK_THRESHOLD,
+    'ALERT_BATCH_SIZE': 50,  # alerts per admin message
+}
+
+LEVEL_RANK = {'ok': 0, 'low': 1, 'out': 2}
+
+
+def inventory_setting(name):
+    return getattr(settings, 'INVENTORY', {}).get(name, DEFAULTS[name])
+
+
+def stock_level(stock):
+    if stock <= 0:
+        return 'out'
+    if stock <= inventory_setting('LOW_STOCK_THRESHOLD'):
+        return 'low'
+    return 'ok'
+
+
+def sync_product_stock(product_ids):
+    """Recompute total_stock / in_stock of the given products with one UPDATE"""
+    totals = ProductVariant.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        total=Sum('stock')
+    ).values('total')
+    return Product.objects.filter(id__in=set(product_ids)).update(
+        total_stock=Coalesce(Subquery(totals), 0),
+        in_stock=Exists(ProductVariant.objects.filter(product=OuterRef('pk'), stock__gt=0)),
+    )
+
+
+def sync_variants(variant_ids, alert=True):
+    """
+    Move variants to the level of their current stock, record alerts for those
+    that got worse (unless ``alert`` is false) and resync their products'
+    totals; returns the number of alerts recorded.
+    """
+    rows = list(
+        ProductVariant.objects.filter(id__in=list(variant_ids)).values_list('id', 'product_id', 'stock', 'stock_level')
+    )
+    moves = defaultdict(list)
+    alerts = []
+    for variant_id, _, stock, old_level in rows:
+        level = stock_level(stock)
+        if level == old_level:
+            continue
+        moves[level].append(variant_id)
+        if alert and LEVEL_RANK[level] > LEVEL_RANK[old_level]:
+            alerts.append(StockAlert(variant_id=variant_id, level=level, stock=stock))
+
+    # At most one UPDATE per level; queryset updates don't re-enter the signals
+    for level, ids in moves.items():
+        ProductVariant.objects.filter(id__in=ids).update(stock_level=level)
+    if alerts:
+        StockAlert.objects.bulk_create(alerts)
+    sync_product_stock({product_id for _, product_id, _, _ in rows})
+    return len(alerts)
+
+
+def resync_inventory(batch_size=1000, alert=True):
+    """Resync every variant and product in id-ordered batches; returns (variants seen, alerts recorded)"""
+    seen = alerts = 0
+    last_id = 0
+    while True:
+        ids = list(
+            ProductVariant.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            alerts += sync_variants(ids, alert=alert)
+        seen += len(ids)
+        last_id = ids[-1]
+    # Products without variants are missed by the variant batches
+    Product.objects.filter(~Exists(ProductVariant.objects.filter(product=OuterRef('pk')))).exclude(
+        total_stock=0, in_stock=False
+    ).update(total_stock=0, in_stock=False)
+    return seen, alerts
+
+
+def render_stock_alerts(alerts):
+    """Admin message for a batch of alerts; a variant alerted twice is listed once, at its latest level"""
+    latest = {alert.variant_id: alert for alert in alerts}
+    out = [alert for alert in latest.values() if alert.level == 'out']
+    low = [alert for alert in latest.values() if alert.level == 'low']
+
+    def describe(alert):
+        variant = alert.variant
+        return escape_markdown(f"{variant.product.name} — {variant.color.name}, {variant.size.name}")
+
+    lines = ["📦 *Остатки на складе*"]
+    if out:
+        lines += ["", "❌ *Нет в наличии:*"]
+        lines += [f"• {describe(alert)}" for alert in out]
+    if low:
+        lines += ["", f"⚠️ *Заканчиваются (≤ {inventory_setting('LOW_STOCK_THRESHOLD')} шт.):*"]
+        lines += [f"• {describe(alert)}: {alert.stock} шт." for alert in low]
+    return "\n".join(lines)
+
+
+def enqueue_stock_alerts(batch_size=None):
+    """Queue pending alerts as one message per batch for every Telegram admin; returns (alerts, messages queued)"""
+    batch_size = batch_size or inventory_setting('ALERT_BATCH_SIZE')
+    chat_ids = list(User.get_telegram_admins().values_list('telegram_id', flat=True))
+    if not chat_ids:
+        # Leave the alerts pending until there is someone to send them to
+        logger.warning("No Telegram admins to notify about stock alerts")
+        return 0, 0
+
+    seen = queued = 0
+    while True:
+        batch = list(
+            StockAlert.objects.filter(notified_at__isnull=True)
+            .select_related('variant__product', 'variant__color', 'variant__size')
+            .order_by('id')[:batch_size]
+        )
+        if not batch:
+            break
+        message = render_stock_alerts(batch)
+        key = f'stock-alerts:{batch[0].id}-{batch[-1].id}'
+        with transaction.atomic():
+            queued += enqueue(StockAlertNotification, [
+                StockAlertNotification(chat_id=chat_id, idempotency_key=f'{key}:{chat_id}', message=message)
+                for chat_id in chat_ids
+            ])
+            StockAlert.objects.filter(id__in=[alert.id for alert in batch]).update(notified_at=timezone.now())
+        seen += len(batch)
+    return seen, queued
+
+
+def send_stock_alerts(rate=20, batch_size=100, limit=None):
+    """Deliver pending stock alert messages; returns (sent, failed)"""
+    return send_pending(StockAlertNotification, rate=rate, batch_size=batch_size, limit=limit)
@@ -0,0 +1,67 @@
+import json
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from unicflo_api.models import Product, Order, UserProductInteraction
+from unicflo_api.renderers import ORJSONRenderer, orjson
+from unicflo_api.serializers import ProductSerializer, OrderSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare JSON render times of the stock and orjson renderers for a page of products or orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=['products', 'orders'], default='products')
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson is not installed; ORJSONRenderer would fall back to the stock renderer')
+
+        data = self.build_page(options['model'], options['page_size'])
+        renderers = [('JSONRenderer', JSONRenderer()), ('ORJSONRenderer', ORJSONRenderer())]
+
+        outputs = {name: renderer.render(data) for name, renderer in renderers}
+        if json.loads(outputs['JSONRenderer']) != json.loads(outputs['ORJSONRenderer']):
+            raise CommandError('Renderer outputs differ')
+
+        self.stdout.write(
+            f"Rendering {len(data['results'])} {options['model']} "
+            f"({len(outputs['JSONRenderer'])} bytes) x {options['iterations']}"
+        )
+        timings = {}
+        for name, renderer in renderers:
+            started = time.perf_counter()
+            for _ in range(options['iterations']):
+                renderer.render(data)
+            timings[name] = (time.perf_counter() - started) / options['iterations']
+            self.stdout.write(f'{name:<16} {timings[name] * 1000:8.3f} ms/page')
+
+        speedup = timings['JSONRenderer'] / timings['ORJSONRenderer']
+        self.stdout.write(self.style.SUCCESS(f'orjson speedup: {speedup:.1f}x'))
+
+    def build_page(self, model, page_size):
+        """Serialize one page the way the list views do, repeating rows if the table is small"""
+        if model == 'products':
+            queryset = Product.objects.select_related('brand', 'subcategory', 'gender').prefetch_related(
+                'images', 'variants', 'materials', 'shipping_methods', UserProductInteraction.like_prefetch()
+            )
+            serializer_class = ProductSerializer
+        else:
+            queryset = Order.objects.select_related('user').prefetch_related('items__product', 'items__variant')
+            serializer_class = OrderSerializer
+
+        rows = list(queryset[:page_size])
+        if not rows:
+            raise CommandError(f'No {model} found; generate data first with generate_test_data')
+        rows = (rows * (page_size // len(rows) + 1))[:page_size]
+
+        request = APIRequestFactory().get('/')
+        request.user = AnonymousUser()
+        results = serializer_class(rows, many=True, context={'request': request}).data
+        return {'count': len(results), 'next': None, 'previous': None, 'results': results}
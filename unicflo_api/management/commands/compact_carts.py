@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from unicflo_api.models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = 'Hard-delete old soft-deleted cart items and abandoned inactive carts in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Minimum age in days of the rows to delete')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be deleted')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        items = CartItem.objects.filter(is_deleted=True).filter(
+            Q(deleted_at__lt=cutoff) | Q(deleted_at__isnull=True, updated_at__lt=cutoff)
+        )
+        # Carts referenced by an order are kept as the order's history
+        carts = Cart.objects.filter(is_active=False, updated_at__lt=cutoff, order__isnull=True)
+
+        if options['dry_run']:
+            self.stdout.write(f'Would delete {items.count()} cart items and {carts.count()} carts older than {cutoff:%Y-%m-%d}')
+            return
+
+        deleted_items = self.delete_in_batches(items, options['batch_size'])
+        deleted_carts = self.delete_in_batches(carts, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted_items} soft-deleted cart items and {deleted_carts} inactive carts'
+        ))
+
+    def delete_in_batches(self, queryset, batch_size):
+        """Delete the matching rows batch by batch, each in its own short transaction"""
+        total = 0
+        while True:
+            ids = list(queryset.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            with transaction.atomic():
+                queryset.model.objects.filter(id__in=ids).delete()
+            total += len(ids)
+            self.stdout.write(f'Deleted {total} {queryset.model._meta.verbose_name_plural.lower()}...')
@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from unicflo_api.catalog_io import FORMATS, RateMeter, export_records, format_for_path, write_records
+
+
+class Command(BaseCommand):
+    help = 'Stream products with their variants, images, materials and shipping methods to JSONL or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or '-' for stdout")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension (JSONL otherwise)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Products fetched per query')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or format_for_path(path)
+        meter = RateMeter()
+        records = export_records(chunk_size=options['chunk_size'])
+        if path == '-':
+            count = write_records(sys.stdout, records, fmt)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                count = write_records(stream, records, fmt)
+        # Keep stdout clean for the data when streaming to it
+        out = self.stderr if path == '-' else self.stdout
+        out.write(self.style.SUCCESS(
+            f'Exported {count} products in {meter.elapsed:.1f}s ({meter.rate(count):.0f} rows/s)'
+        ))
@@ -1,8 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.db.models import Count, Q
-from unicflo_api.models import Product, ProductRecommendation
-from django.utils import timezone
-from datetime import timedelta
+from unicflo_api.models import Product, ProductRecommendation, UserProductInteraction
+from unicflo_api.popularity import get_trending_ids
 
 class Command(BaseCommand):
     help = 'Generate product recommendations'
@@ -11,7 +10,7 @@ class Command(BaseCommand):
         self.stdout.write('Starting to generate recommendations...')
         
         # Get all active products
-        products = Product.objects.filter(is_active=True)
+        products = Product.objects.filter(is_active=True).select_related('subcategory')
         total_products = products.count()
         
         self.stdout.write(f'Found {total_products} active products')
@@ -41,16 +40,12 @@ class Command(BaseCommand):
                 )
                 recommendations_created += 1
             
-            # 2. Trending products in same category
-            thirty_days_ago = timezone.now() - timedelta(days=30)
-            trending_products = Product.objects.filter(
-                subcategory=product.subcategory,
-                orderitem__order__created_at__gte=thirty_days_ago
-            ).exclude(
-                id=product.id
-            ).annotate(
-                order_count=Count('orderitem')
-            ).order_by('-order_count')[:10]
+            # 2. Trending products in same category, from the precomputed popularity rankings
+            trending_ids = [
+                product_id for product_id in get_trending_ids(f'category:{product.subcategory.category_id}')
+                if product_id != product.id
+            ][:10]
+            trending_products = Product.objects.filter(id__in=trending_ids)
             
             for trending in trending_products:
                 ProductRecommendation.objects.create(
@@ -61,8 +56,8 @@ class Command(BaseCommand):
                 )
                 recommendations_created += 1
             
-                # 3. Products from same gender category
-                gender_products = Product.objects.filter(
+            # 3. Products from same gender category
+            gender_products = Product.objects.filter(
                 gender=product.gender
             ).exclude(
                 id=product.id
@@ -79,6 +74,18 @@ class Command(BaseCommand):
                 )
                 recommendations_created += 1
             
+            # 4. Co-interactions from the interaction store: users who bought/viewed
+            # this product also bought/viewed these
+            for kind, recommendation_type in (('purchase', 'bought_also_bought'), ('view', 'viewed_also_viewed')):
+                for row in self.co_interactions(product, kind):
+                    ProductRecommendation.objects.create(
+                        product=product,
+                        recommended_product_id=row['product_id'],
+                        recommendation_type=recommendation_type,
+                        score=row['users']
+                    )
+                    recommendations_created += 1
+
             # Progress update
             if product.id % 10 == 0:
                 self.stdout.write(f'Processed {product.id} products...')
@@ -87,4 +94,17 @@ class Command(BaseCommand):
             self.style.SUCCESS(
                 f'Successfully generated {recommendations_created} recommendations for {total_products} products'
             )
-        ) 
\ No newline at end of file
+        )
+
+    def co_interactions(self, product, kind, limit=10):
+        """Products most often sharing an interaction of the given kind with this one, by distinct users"""
+        users = UserProductInteraction.objects.filter(product=product, kind=kind).values('user_id')
+        return UserProductInteraction.objects.filter(
+            kind=kind,
+            user_id__in=users,
+            product__is_active=True
+        ).exclude(
+            product=product
+        ).values('product_id').annotate(
+            users=Count('user_id', distinct=True)
+        ).order_by('-users')[:limit]
@@ -5,6 +5,7 @@ from unicflo_api.models import (
     Color, Size, Material, Season, Product,
     ProductVariant, ProductImage
 )
+from unicflo_api.inventory import sync_product_stock
 
 class Command(BaseCommand):
     help = 'Generate test data for the e-commerce platform'
@@ -118,6 +119,8 @@ class Command(BaseCommand):
             },
         ]
 
+        colors, sizes = list(Color.objects.all()), list(Size.objects.all())
+        variants = []
         for product_data in products_data:
             for gender in GenderCategory.objects.all():
                 for subcategory in Subcategory.objects.filter(gender=gender):
@@ -138,13 +141,14 @@ class Command(BaseCommand):
                     product.materials.add(*Material.objects.all()[:2])
                     
                     # Create variants
-                    for color in Color.objects.all():
-                        for size in Size.objects.all():
-                            ProductVariant.objects.create(
-                                product=product,
-                                color=color,
-                                size=size,
-                                stock=100
-                            )
+                    variants.extend(
+                        ProductVariant(product=product, color=color, size=size, stock=100)
+                        for color in colors
+                        for size in sizes
+                    )
+
+        # One insert instead of a save (and a stock resync) per variant
+        ProductVariant.objects.bulk_create(variants)
+        sync_product_stock(Product.objects.values_list('id', flat=True))
 
         self.stdout.write(self.style.SUCCESS('Successfully generated test data')) 
\ No newline at end of file
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from unicflo_api.catalog_io import FORMATS, RateMeter, format_for_path, import_catalog, read_records
+
+
+class Command(BaseCommand):
+    help = 'Upsert products with their variants, images, materials and shipping methods from JSONL or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension (JSONL otherwise)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products written per transaction')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or format_for_path(path)
+        meter = RateMeter()
+
+        def progress(importer):
+            self.stdout.write(
+                f'{importer.processed} rows ({meter.rate(importer.processed):.0f} rows/s)', ending='\r'
+            )
+
+        if path == '-':
+            importer = import_catalog(read_records(sys.stdin, fmt), batch_size=options['batch_size'], progress=progress)
+        else:
+            with open(path, encoding='utf-8', newline='') as stream:
+                importer = import_catalog(
+                    read_records(stream, fmt), batch_size=options['batch_size'], progress=progress
+                )
+
+        for error in importer.errors:
+            self.stderr.write(f'Rejected {error}')
+        if importer.rejected > len(importer.errors):
+            self.stderr.write(f'... and {importer.rejected - len(importer.errors)} more rejected rows')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.created} new, {importer.updated} updated and {importer.unchanged} unchanged products '
+            f'({importer.variants} variants written, {importer.images} new images, {importer.rejected} rejected) '
+            f'in {meter.elapsed:.1f}s ({meter.rate(importer.processed):.0f} rows/s)'
+        ))
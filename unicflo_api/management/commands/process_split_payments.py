@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from unicflo_api.split_payments import process_overdue_split_payments
+
+
+class Command(BaseCommand):
+    help = 'Cancel split-payment orders with an overdue first payment and flag overdue second payments (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Only list the orders that would change')
+
+    def handle(self, *args, **options):
+        result = process_overdue_split_payments(dry_run=options['dry_run'], batch_size=options['batch_size'])
+        first, second = result['first_payment_overdue'], result['second_payment_overdue']
+
+        if options['dry_run']:
+            self.stdout.write(f'Would cancel {len(first)} orders with an overdue first payment: {first[:50]}')
+            self.stdout.write(f'Would flag {len(second)} orders with an overdue second payment: {second[:50]}')
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Canceled {len(first)} orders with an overdue first payment, '
+            f'flagged {len(second)} overdue second payments'
+        ))
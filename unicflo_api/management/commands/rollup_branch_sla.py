@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from unicflo_api.fulfillment_sla import rollup_branch_sla
+
+
+class Command(BaseCommand):
+    help = 'Precompute per-branch pickup SLA metrics from the order status history (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Number of recent days to recompute')
+
+    def handle(self, *args, **options):
+        rows = rollup_branch_sla(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {rows} branch fulfillment rows for the last {options['days']} days"
+        ))
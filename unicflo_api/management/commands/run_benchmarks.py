@@ -0,0 +1,91 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from unicflo_api.benchmarks import METRICS, SCENARIOS, BenchmarkError, compare, run_benchmarks
+from unicflo_api.events import flusher_paused
+
+# An isolated cache: results must not depend on (or touch) a shared Redis
+BENCHMARK_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmarks'},
+    'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmarks-local'},
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot API endpoints on a seeded throwaway database and check them against budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark-results.json', help="JSON results file, or '-' for stdout")
+        parser.add_argument('--only', action='append', choices=list(SCENARIOS), help='Scenario to run (repeatable)')
+        parser.add_argument('--iterations', type=int, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, help='Untimed requests per scenario before measuring')
+        parser.add_argument('--memory-iterations', type=int, help='Requests traced for peak memory per scenario')
+        parser.add_argument('--seed', type=int, help='Dataset seed')
+        parser.add_argument('--budgets', help='JSON file of {scenario: {metric: limit}} overriding the configured budgets')
+        parser.add_argument('--baseline', help='Earlier results file to compare against')
+        parser.add_argument('--no-budgets', action='store_true', help='Report budget violations without failing')
+
+    def handle(self, *args, **options):
+        overrides = self.load_json(options['budgets'])
+        baseline = self.load_json(options['baseline'])
+
+        def progress(name, result):
+            self.stderr.write(
+                f"{name:<16} p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  "
+                f"{result['queries']:3d} queries  {result['memory_kb']} KB"
+            )
+
+        setup_test_environment()
+        # The event flusher stays stopped until the throwaway database is gone
+        with flusher_paused() as events:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                with override_settings(CACHES=BENCHMARK_CACHES):
+                    report = run_benchmarks(
+                        names=options['only'], iterations=options['iterations'], warmup=options['warmup'],
+                        memory_iterations=options['memory_iterations'], seed=options['seed'],
+                        budget_overrides=overrides, progress=progress,
+                    )
+            except BenchmarkError as e:
+                raise CommandError(str(e))
+            finally:
+                # Events of a failed run belong to the database being dropped
+                events.discard()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        data = json.dumps(report.as_dict(), indent=2)
+        if options['output'] == '-':
+            self.stdout.write(data)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                stream.write(data + '\n')
+            self.stderr.write(f"Results written to {options['output']}")
+
+        if baseline:
+            for name, metrics in compare(report.results, baseline.get('results', {})).items():
+                changes = []
+                for metric in METRICS:
+                    before, after = metrics[metric]
+                    if before and after is not None:
+                        changes.append(f'{metric} {before} -> {after} ({(after - before) / before:+.0%})')
+                self.stderr.write(f"{name:<16} {', '.join(changes)}")
+
+        for violation in report.violations:
+            self.stderr.write(self.style.ERROR(violation))
+        if report.violations and not options['no_budgets']:
+            raise CommandError(f'{len(report.violations)} benchmark budget(s) exceeded')
+        self.stderr.write(self.style.SUCCESS(f'{len(report.results)} scenarios within budget'
+                                             if not report.violations else 'Budgets exceeded (not enforced)'))
+
+    def load_json(self, path):
+        if not path:
+            return None
+        try:
+            with open(path, encoding='utf-8') as stream:
+                return json.load(stream)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read {path}: {e}')
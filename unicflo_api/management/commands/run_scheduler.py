@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from unicflo_api.scheduler import load_jobs, run_due, run_forever
+
+
+class Command(BaseCommand):
+    help = 'Run the periodic commands from settings.SCHEDULER (notification senders, rollups, compaction)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', default=[], help='Run only this command (repeatable)')
+        parser.add_argument('--once', action='store_true', help='Run every job once and exit')
+
+    def handle(self, *args, **options):
+        jobs = load_jobs(only=options['only'])
+        if not jobs:
+            raise CommandError('No scheduled jobs match')
+        if options['once']:
+            ran = run_due(jobs, now=float('inf'), stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f"Ran {len(ran)} scheduled jobs"))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            'Scheduler started: ' + ', '.join(f'{job.command} every {job.interval:g}s (first in {job.next_run - time.monotonic():.0f}s)' for job in jobs)
+        ))
+        run_forever(jobs, stdout=self.stdout)
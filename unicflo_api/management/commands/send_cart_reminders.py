@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from unicflo_api.cart_reminders import enqueue_reminders, send_reminders
+
+
+class Command(BaseCommand):
+    help = 'Queue reminders for abandoned carts and send pending reminders via Telegram (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-hours', type=int, default=24, help='Hours since the last cart change')
+        parser.add_argument('--max-idle-days', type=int, default=7, help='Carts idle for longer are not reminded')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--rate', type=float, default=20, help='Maximum messages per second')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum messages to send in this run')
+        parser.add_argument('--enqueue-only', action='store_true', help='Queue reminders without sending them')
+
+    def handle(self, *args, **options):
+        seen, queued = enqueue_reminders(
+            idle_hours=options['idle_hours'],
+            max_idle_days=options['max_idle_days'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(f'Found {seen} abandoned carts, queued {queued} new reminders')
+        if options['enqueue_only']:
+            return
+
+        sent, failed = send_reminders(rate=options['rate'], batch_size=options['batch_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} cart reminders ({failed} failed)'))
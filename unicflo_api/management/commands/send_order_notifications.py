@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from unicflo_api.models import OrderNotification
+from unicflo_api.outbox import send_pending
+
+
+class Command(BaseCommand):
+    help = 'Send queued order notifications via Telegram (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--rate', type=float, default=20, help='Maximum messages per second')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum messages to send in this run')
+
+    def handle(self, *args, **options):
+        sent, failed = send_pending(
+            OrderNotification, rate=options['rate'], batch_size=options['batch_size'], limit=options['limit']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} order notifications ({failed} failed)'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from unicflo_api.inventory import enqueue_stock_alerts, resync_inventory, send_stock_alerts
+
+
+class Command(BaseCommand):
+    help = 'Batch pending low-stock alerts into Telegram messages for admins and send them (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Alerts per message')
+        parser.add_argument('--rate', type=float, default=20, help='Maximum messages per second')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum messages to send in this run')
+        parser.add_argument('--resync', action='store_true', help='Resync all stock totals and levels first')
+        parser.add_argument('--enqueue-only', action='store_true', help='Queue messages without sending them')
+
+    def handle(self, *args, **options):
+        if options['resync']:
+            seen, alerts = resync_inventory()
+            self.stdout.write(f'Resynced {seen} variants, {alerts} new alerts')
+
+        alerts, queued = enqueue_stock_alerts(batch_size=options['batch_size'])
+        self.stdout.write(f'Batched {alerts} stock alerts into {queued} messages')
+        if options['enqueue_only']:
+            return
+
+        sent, failed = send_stock_alerts(rate=options['rate'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} stock alert messages ({failed} failed)'))
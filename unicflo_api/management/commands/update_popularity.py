@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from unicflo_api.popularity import compact_scores, refresh_rankings
+
+
+class Command(BaseCommand):
+    help = 'Compact the time-decayed popularity scores and republish the trending rankings (run periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-compaction', action='store_true', help='Only rebuild the rankings')
+
+    def handle(self, *args, **options):
+        if not options['skip_compaction']:
+            kept, deleted = compact_scores()
+            self.stdout.write(f'Compacted popularity scores: {kept} kept, {deleted} expired')
+
+        rankings = refresh_rankings()
+        self.stdout.write(self.style.SUCCESS(
+            f"Published {len(rankings)} trending rankings ({len(rankings['global'])} products globally)"
+        ))
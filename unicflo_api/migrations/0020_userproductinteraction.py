@@ -0,0 +1,100 @@
+# Generated by Django 4.2.20 on 2025-06-04 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def merge_likes_and_wishlists(apps, schema_editor):
+    """Copy Product.likes and Wishlist.products rows into the interaction store"""
+    Product = apps.get_model('unicflo_api', 'Product')
+    Wishlist = apps.get_model('unicflo_api', 'Wishlist')
+    UserProductInteraction = apps.get_model('unicflo_api', 'UserProductInteraction')
+
+    # Deduplicate here: the partial unique constraints are only created once
+    # the migration's deferred SQL runs, after this function.
+    likes = set(Product.likes.through.objects.values_list('user_id', 'product_id'))
+    wishlist_items = set(Wishlist.products.through.objects.values_list('wishlist_id', 'product_id', 'wishlist__user_id'))
+    # Wishlisted products have always counted as liked
+    likes.update((user_id, product_id) for _, product_id, user_id in wishlist_items)
+
+    interactions = [
+        UserProductInteraction(user_id=user_id, product_id=product_id, kind='like')
+        for user_id, product_id in likes
+    ]
+    interactions.extend(
+        UserProductInteraction(user_id=user_id, product_id=product_id, kind='wishlist', wishlist_id=wishlist_id)
+        for wishlist_id, product_id, user_id in wishlist_items
+    )
+    UserProductInteraction.objects.bulk_create(interactions, batch_size=1000)
+
+
+def split_likes_and_wishlists(apps, schema_editor):
+    Product = apps.get_model('unicflo_api', 'Product')
+    Wishlist = apps.get_model('unicflo_api', 'Wishlist')
+    UserProductInteraction = apps.get_model('unicflo_api', 'UserProductInteraction')
+
+    Product.likes.through.objects.bulk_create([
+        Product.likes.through(user_id=user_id, product_id=product_id)
+        for user_id, product_id in UserProductInteraction.objects.filter(kind='like').values_list('user_id', 'product_id')
+    ], batch_size=1000, ignore_conflicts=True)
+    Wishlist.products.through.objects.bulk_create([
+        Wishlist.products.through(wishlist_id=wishlist_id, product_id=product_id)
+        for wishlist_id, product_id in UserProductInteraction.objects.filter(kind='wishlist').values_list('wishlist_id', 'product_id')
+    ], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0019_catalogversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProductInteraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('like', 'Like'), ('wishlist', 'Wishlist'), ('view', 'View'), ('cart_add', 'Cart Add'), ('purchase', 'Purchase')], max_length=20)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interactions', to='unicflo_api.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_interactions', to=settings.AUTH_USER_MODEL)),
+                ('wishlist', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='interactions', to='unicflo_api.wishlist')),
+            ],
+            options={
+                'verbose_name': 'User Product Interaction',
+                'verbose_name_plural': 'User Product Interactions',
+                'indexes': [
+                    models.Index(fields=['user', 'kind', 'product'], name='unicflo_api_user_id_41e39b_idx'),
+                    models.Index(fields=['product', 'kind'], name='unicflo_api_product_b98470_idx'),
+                    models.Index(fields=['kind', 'created_at'], name='unicflo_api_kind_86642e_idx'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(condition=models.Q(('kind', 'like')), fields=('user', 'product'), name='unique_like_per_user_product'),
+                    models.UniqueConstraint(condition=models.Q(('kind', 'wishlist')), fields=('wishlist', 'product'), name='unique_product_per_wishlist'),
+                ],
+            },
+        ),
+        migrations.RunPython(merge_likes_and_wishlists, split_likes_and_wishlists),
+        migrations.RemoveField(
+            model_name='product',
+            name='likes',
+        ),
+        # A plain M2M cannot be altered into one with a through model. The
+        # replacement adds no column, so it only needs to exist in the state.
+        migrations.RemoveField(
+            model_name='wishlist',
+            name='products',
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='wishlist',
+                    name='products',
+                    field=models.ManyToManyField(related_name='wishlists', through='unicflo_api.UserProductInteraction', through_fields=('wishlist', 'product'), to='unicflo_api.product'),
+                ),
+            ],
+        ),
+    ]
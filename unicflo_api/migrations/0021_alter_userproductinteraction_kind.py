@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2025-06-05 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0020_userproductinteraction'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userproductinteraction',
+            name='kind',
+            field=models.CharField(choices=[('like', 'Like'), ('wishlist', 'Wishlist'), ('view', 'View'), ('cart_add', 'Cart Add'), ('wishlist_add', 'Wishlist Add'), ('wishlist_remove', 'Wishlist Remove'), ('purchase', 'Purchase')], max_length=20),
+        ),
+    ]
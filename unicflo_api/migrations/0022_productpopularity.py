@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2025-06-06 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0021_alter_userproductinteraction_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='unicflo_api.product')),
+            ],
+            options={
+                'verbose_name': 'Product Popularity',
+                'verbose_name_plural': 'Product Popularity',
+                'indexes': [models.Index(fields=['-score'], name='unicflo_api_score_12bf7f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.20 on 2025-06-07 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0022_productpopularity'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together=set(),
+        ),
+        migrations.RemoveIndex(
+            model_name='cartitem',
+            name='unicflo_api_is_dele_de5694_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='cartitem',
+            name='unicflo_api_deleted_9b21d2_idx',
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['updated_at'], name='cart_inactive_by_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['cart'], name='cartitem_live_by_cart'),
+        ),
+        migrations.AddIndex(
+            model_name='cartitem',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['deleted_at'], name='cartitem_deleted_at'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_deleted', False)), fields=('cart', 'product', 'variant'), name='unique_live_cart_item'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.20 on 2025-06-08 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0023_cart_item_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['updated_at', 'id'], name='cart_active_by_updated'),
+        ),
+        migrations.CreateModel(
+            name='CartReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=100)),
+                ('idempotency_key', models.CharField(max_length=100, unique=True)),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='unicflo_api.cart')),
+            ],
+            options={
+                'verbose_name': 'Cart Reminder',
+                'verbose_name_plural': 'Cart Reminders',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='cartreminder_pending')],
+            },
+        ),
+    ]
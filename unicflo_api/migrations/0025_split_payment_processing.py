@@ -0,0 +1,45 @@
+# Generated by Django 4.2.20 on 2025-06-09 09:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0024_cartreminder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_reserved',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_split_payment', True), ('payment_status', 'pending')), fields=['first_payment_date'], name='order_split_first_due'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('is_split_payment', True), ('payment_status', 'delivered'), ('second_payment_status', 'pending')), fields=['second_payment_due_date'], name='order_split_second_due'),
+        ),
+        migrations.CreateModel(
+            name='OrderNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=100)),
+                ('idempotency_key', models.CharField(max_length=100, unique=True)),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='unicflo_api.order')),
+            ],
+            options={
+                'verbose_name': 'Order Notification',
+                'verbose_name_plural': 'Order Notifications',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='ordernotification_pending')],
+            },
+        ),
+    ]
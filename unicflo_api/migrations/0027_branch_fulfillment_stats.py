@@ -0,0 +1,50 @@
+# Generated by Django 4.2.20 on 2025-06-11 10:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def add_creation_events(apps, schema_editor):
+    """Start every existing order's timeline with its creation, as new orders get on save"""
+    Order = apps.get_model('unicflo_api', 'Order')
+    OrderStatusEvent = apps.get_model('unicflo_api', 'OrderStatusEvent')
+
+    orders = Order.objects.exclude(status_events__from_status='').values_list('id', 'created_at')
+    OrderStatusEvent.objects.bulk_create((
+        OrderStatusEvent(order_id=order_id, from_status='', to_status='pending', created_at=created_at)
+        for order_id, created_at in orders.iterator(chunk_size=1000)
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0026_orderstatusevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderstatusevent',
+            index=models.Index(fields=['to_status', 'created_at'], name='unicflo_api_to_stat_ac35a3_idx'),
+        ),
+        migrations.CreateModel(
+            name='BranchFulfillmentStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('ready_count', models.PositiveIntegerField(default=0, help_text='Orders that became ready for pickup that day')),
+                ('avg_pending_to_ready', models.DurationField(blank=True, null=True)),
+                ('delivered_count', models.PositiveIntegerField(default=0, help_text='Orders picked up that day')),
+                ('avg_ready_to_delivered', models.DurationField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fulfillment_stats', to='unicflo_api.address')),
+            ],
+            options={
+                'verbose_name': 'Branch Fulfillment Stats',
+                'verbose_name_plural': 'Branch Fulfillment Stats',
+                'indexes': [models.Index(fields=['date'], name='unicflo_api_date_85d43e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('branch', 'date'), name='unique_branch_fulfillment_day')],
+            },
+        ),
+        migrations.RunPython(add_creation_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2025-06-12 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0027_branch_fulfillment_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['pickup_branch', 'status', 'created_at'], name='order_branch_queue'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2025-06-13 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0029_address_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(condition=models.Q(('stock__lte', 5)), fields=['stock'], name='variant_low_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['date_joined'], name='unicflo_api_date_jo_05ebd0_idx'),
+        ),
+    ]
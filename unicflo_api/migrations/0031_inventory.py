@@ -0,0 +1,85 @@
+# Generated by Django 4.2.20 on 2025-06-13 16:20
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def sync_inventory(apps, schema_editor):
+    """Fill the materialized stock totals and variant levels; existing stock raises no alerts"""
+    Product = apps.get_model('unicflo_api', 'Product')
+    ProductVariant = apps.get_model('unicflo_api', 'ProductVariant')
+
+    totals = ProductVariant.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        total=Sum('stock')
+    ).values('total')
+    Product.objects.update(
+        total_stock=Coalesce(Subquery(totals), 0),
+        in_stock=Exists(ProductVariant.objects.filter(product=OuterRef('pk'), stock__gt=0)),
+    )
+    ProductVariant.objects.filter(stock=0).update(stock_level='out')
+    ProductVariant.objects.filter(stock__gt=0, stock__lte=5).update(stock_level='low')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0030_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='in_stock',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='total_stock',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='stock_level',
+            field=models.CharField(choices=[('ok', 'In stock'), ('low', 'Low stock'), ('out', 'Out of stock')], default='ok', editable=False, max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['in_stock'], name='unicflo_api_in_stoc_492c3b_idx'),
+        ),
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('ok', 'In stock'), ('low', 'Low stock'), ('out', 'Out of stock')], max_length=10)),
+                ('stock', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='unicflo_api.productvariant')),
+            ],
+            options={
+                'verbose_name': 'Stock Alert',
+                'verbose_name_plural': 'Stock Alerts',
+                'indexes': [models.Index(condition=models.Q(('notified_at__isnull', True)), fields=['id'], name='stockalert_pending')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockAlertNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.CharField(max_length=100)),
+                ('idempotency_key', models.CharField(max_length=100, unique=True)),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Stock Alert Notification',
+                'verbose_name_plural': 'Stock Alert Notifications',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='stockalertnotification_pending')],
+            },
+        ),
+        migrations.RunPython(sync_inventory, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.20 on 2025-06-14 10:05
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def stamp_sending(apps, schema_editor):
+    """Rows stuck in 'sending' before claims were timed become reclaimable"""
+    for name in ('CartReminder', 'OrderNotification', 'StockAlertNotification'):
+        model = apps.get_model('unicflo_api', name)
+        model.objects.filter(status='sending').update(claimed_at=F('created_at'), attempts=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0031_inventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartreminder',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cartreminder',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cartreminder',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ordernotification',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='ordernotification',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ordernotification',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='stockalertnotification',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='stockalertnotification',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='stockalertnotification',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='cartreminder',
+            index=models.Index(condition=models.Q(('status', 'sending')), fields=['claimed_at'], name='cartreminder_sending'),
+        ),
+        migrations.AddIndex(
+            model_name='ordernotification',
+            index=models.Index(condition=models.Q(('status', 'sending')), fields=['claimed_at'], name='ordernotification_sending'),
+        ),
+        migrations.AddIndex(
+            model_name='stockalertnotification',
+            index=models.Index(condition=models.Q(('status', 'sending')), fields=['claimed_at'], name='stockalertnotification_sending'),
+        ),
+        migrations.RunPython(stamp_sending, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2025-06-14 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('unicflo_api', '0032_outbox_retries'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='productvariant',
+            name='variant_low_stock',
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(
+                condition=models.Q(('stock_level__in', ['low', 'out'])),
+                fields=['stock_level', 'stock'],
+                name='variant_low_stock_level'
+            ),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from datetime import timedelta
@@ -23,12 +25,18 @@ class User(AbstractUser):
             models.Index(fields=['telegram_id']),
             models.Index(fields=['telegram_username']),
             models.Index(fields=['is_telegram_admin']),
+            models.Index(fields=['date_joined']),
         ]
 
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}".strip() or self.username
 
+    @property
+    def cart(self):
+        """The user's active cart, or None"""
+        return self.carts.filter(is_active=True).first()
+
     @classmethod
     def get_telegram_admins(cls):
         return cls.objects.filter(is_telegram_admin=True, telegram_id__isnull=False)
@@ -235,13 +243,28 @@ class Product(models.Model):
     gender = models.ForeignKey(GenderCategory, on_delete=models.SET_NULL, null=True, related_name='products')
     is_featured = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    # Materialized from variant stock on every variant write (see inventory.py)
+    total_stock = models.PositiveIntegerField(default=0, editable=False)
+    in_stock = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    likes = models.ManyToManyField(User, related_name='liked_products', blank=True)
 
     def __str__(self):
         return self.name
 
+    def get_likes_count(self):
+        """Number of likes, from the prefetched like_interactions when available"""
+        if hasattr(self, 'like_interactions'):
+            return len(self.like_interactions)
+        return self.interactions.filter(kind='like').count()
+
+    def is_liked_by(self, user):
+        if not user or not user.is_authenticated:
+            return False
+        if hasattr(self, 'like_interactions'):
+            return any(interaction.user_id == user.id for interaction in self.like_interactions)
+        return self.interactions.filter(kind='like', user=user).exists()
+
     class Meta:
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
@@ -253,13 +276,28 @@ class Product(models.Model):
             models.Index(fields=['is_featured']),
             models.Index(fields=['is_active']),
             models.Index(fields=['gender']),
+            models.Index(fields=['in_stock']),
         ]
 
+# Variants at or below this stock are reported as running low. This is the default
+# of INVENTORY['LOW_STOCK_THRESHOLD'] (read it through inventory_setting), which is
+# applied through ProductVariant.stock_level; after changing the threshold, run
+# inventory.resync_inventory() to relevel the existing variants.
+LOW_STOCK_THRESHOLD = 5
+
 class ProductVariant(models.Model):
+    STOCK_LEVEL_CHOICES = (
+        ('ok', 'In stock'),
+        ('low', 'Low stock'),
+        ('out', 'Out of stock'),
+    )
+
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='variants')
     color = models.ForeignKey(Color, on_delete=models.CASCADE)
     size = models.ForeignKey(Size, on_delete=models.CASCADE)
     stock = models.PositiveIntegerField(default=0)
+    # Level of the last synced stock; a drop to a worse level raises a StockAlert
+    stock_level = models.CharField(max_length=10, choices=STOCK_LEVEL_CHOICES, default='ok', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -273,6 +311,11 @@ class ProductVariant(models.Model):
         indexes = [
             models.Index(fields=['product', 'color', 'size']),
             models.Index(fields=['stock']),
+            # Low-stock alerts and counts only ever read this small slice
+            models.Index(
+                fields=['stock_level', 'stock'], condition=models.Q(stock_level__in=['low', 'out']),
+                name='variant_low_stock_level'
+            ),
         ]
 
 class ProductImage(models.Model):
@@ -297,7 +340,12 @@ class ProductImage(models.Model):
 class Wishlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     session_key = models.CharField(max_length=40, null=True, blank=True)
-    products = models.ManyToManyField(Product)
+    products = models.ManyToManyField(
+        Product,
+        through='UserProductInteraction',
+        through_fields=('wishlist', 'product'),
+        related_name='wishlists'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_public = models.BooleanField(default=False)
@@ -309,44 +357,84 @@ class Wishlist(models.Model):
             return f"Wishlist for {self.user.username}"
         return f"Anonymous Wishlist {self.session_key}"
 
+    def has_product(self, product):
+        """Membership check against the interaction store, without loading the list"""
+        return UserProductInteraction.objects.filter(kind='wishlist', wishlist_id=self.pk, product_id=product.pk).exists()
+
+    def _insert(self, product):
+        UserProductInteraction.bulk_ingest([
+            UserProductInteraction(user_id=self.user_id, product_id=product.pk, kind='wishlist', wishlist_id=self.pk),
+            UserProductInteraction(user_id=self.user_id, product_id=product.pk, kind='like'),
+        ])
+
+    def _delete(self, product):
+        deleted, _ = UserProductInteraction.objects.filter(kind='wishlist', wishlist_id=self.pk, product_id=product.pk).delete()
+        if deleted:
+            # The product stays liked while another wishlist of the user still holds it
+            still_saved = UserProductInteraction.objects.filter(
+                kind='wishlist', user_id=self.user_id, product_id=product.pk
+            ).exists()
+            if not still_saved:
+                UserProductInteraction.objects.filter(kind='like', user_id=self.user_id, product_id=product.pk).delete()
+        return bool(deleted)
+
     def add_product(self, product):
         """Add a product to wishlist and update its liked status"""
-        self.products.add(product)
-        product.likes.add(self.user)
+        with transaction.atomic():
+            self._insert(product)
         return True
 
     def remove_product(self, product):
         """Remove a product from wishlist and update its liked status"""
-        self.products.remove(product)
-        product.likes.remove(self.user)
-        return True
+        with transaction.atomic():
+            return self._delete(product)
+
+    def toggle_product(self, product):
+        """Add the product if absent, remove it otherwise; returns True when it ends up in the wishlist"""
+        with transaction.atomic():
+            if self._delete(product):
+                return False
+            self._insert(product)
+            return True
 
     def clear(self):
         """Clear all products from wishlist and update their liked status"""
-        for product in self.products.all():
-            product.likes.remove(self.user)
-        self.products.clear()
+        with transaction.atomic():
+            items = UserProductInteraction.objects.filter(kind='wishlist', wishlist_id=self.pk)
+            product_ids = list(items.values_list('product_id', flat=True))
+            items.delete()
+            still_saved = UserProductInteraction.objects.filter(
+                kind='wishlist', user_id=self.user_id, product_id__in=product_ids
+            ).values('product_id')
+            UserProductInteraction.objects.filter(
+                kind='like', user_id=self.user_id, product_id__in=product_ids
+            ).exclude(product_id__in=still_saved).delete()
         return True
 
+    def get_totals(self):
+        """Price totals computed in one aggregate query and memoized on the instance"""
+        if not hasattr(self, '_totals'):
+            self._totals = self.products.aggregate(
+                total_value=Coalesce(Sum('price'), Decimal('0')),
+                discounted_value=Coalesce(Sum(Coalesce('discount_price', 'price')), Decimal('0')),
+                products_count=Count('id'),
+            )
+        return self._totals
+
     def get_total_value(self):
         """Calculate total value of all products in wishlist"""
-        return sum(product.price for product in self.products.all())
+        return self.get_totals()['total_value']
 
     def get_discounted_value(self):
         """Calculate total value with discounts applied"""
-        return sum(product.discount_price or product.price for product in self.products.all())
+        return self.get_totals()['discounted_value']
 
     def get_savings(self):
         """Calculate potential savings from discounts"""
         return self.get_total_value() - self.get_discounted_value()
 
-    def save(self, *args, **kwargs):
-        """Override save to ensure all products in wishlist are liked"""
-        super().save(*args, **kwargs)
-        # Ensure all products in wishlist are liked
-        for product in self.products.all():
-            if not product.likes.filter(id=self.user.id).exists():
-                product.likes.add(self.user)
+    def get_products_count(self):
+        return self.get_totals()['products_count']
 
     class Meta:
         verbose_name = 'Wishlist'
@@ -358,6 +446,81 @@ class Wishlist(models.Model):
             models.Index(fields=['updated_at']),
         ]
 
+class UserProductInteraction(models.Model):
+    """Single store of user-product facts: likes, wishlist membership and behavioural events"""
+    KIND_CHOICES = (
+        ('like', 'Like'),
+        ('wishlist', 'Wishlist'),
+        ('view', 'View'),
+        ('cart_add', 'Cart Add'),
+        ('wishlist_add', 'Wishlist Add'),
+        ('wishlist_remove', 'Wishlist Remove'),
+        ('purchase', 'Purchase'),
+    )
+    # Kinds describing current state (one row per fact); the others are append-only events
+    STATE_KINDS = ('like', 'wishlist')
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='product_interactions')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='interactions')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    wishlist = models.ForeignKey(Wishlist, on_delete=models.CASCADE, null=True, blank=True, related_name='interactions')
+    quantity = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user} {self.kind} {self.product}"
+
+    @classmethod
+    def bulk_ingest(cls, interactions, batch_size=1000):
+        """Insert interactions in batches; duplicate likes and wishlist entries are skipped"""
+        return cls.objects.bulk_create(interactions, batch_size=batch_size, ignore_conflicts=True)
+
+    @classmethod
+    def like_prefetch(cls, to_attr='like_interactions'):
+        """Prefetch for Product queries that serve likes count and liked status without per-row queries"""
+        return models.Prefetch(
+            'interactions',
+            queryset=cls.objects.filter(kind='like').only('id', 'product_id', 'user_id'),
+            to_attr=to_attr
+        )
+
+    class Meta:
+        verbose_name = 'User Product Interaction'
+        verbose_name_plural = 'User Product Interactions'
+        indexes = [
+            models.Index(fields=['user', 'kind', 'product']),
+            models.Index(fields=['product', 'kind']),
+            models.Index(fields=['kind', 'created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'product'],
+                condition=models.Q(kind='like'),
+                name='unique_like_per_user_product'
+            ),
+            models.UniqueConstraint(
+                fields=['wishlist', 'product'],
+                condition=models.Q(kind='wishlist'),
+                name='unique_product_per_wishlist'
+            ),
+        ]
+
+class ProductPopularity(models.Model):
+    """Exponentially time-decayed popularity score of a product, valid as of updated_at"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='popularity')
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.product} ({self.score:.2f})"
+
+    class Meta:
+        verbose_name = 'Product Popularity'
+        verbose_name_plural = 'Product Popularity'
+        indexes = [
+            models.Index(fields=['-score']),
+        ]
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='carts')
     session_key = models.CharField(max_length=40, null=True, blank=True)
@@ -375,7 +538,7 @@ class Cart(models.Model):
     @property
     def total_price(self):
         """Calculate subtotal (products only) for non-deleted items"""
-        return sum(item.total_price for item in self.items.filter(is_deleted=False))
+        return sum(item.total_price for item in self.get_active_items())
 
     @property
     def final_price(self):
@@ -387,24 +550,115 @@ class Cart(models.Model):
         """Get only non-deleted items"""
         return self.items.filter(is_deleted=False)
 
+    @staticmethod
+    def active_items_queryset():
+        """Non-deleted items with everything the cart serializers read about them"""
+        return CartItem.objects.filter(is_deleted=False).select_related(
+            'product__brand', 'product__subcategory', 'product__gender', 'variant__color', 'variant__size'
+        ).prefetch_related(
+            'product__images', 'product__materials', 'product__shipping_methods',
+            models.Prefetch(
+                'product__recommendations',
+                queryset=ProductRecommendation.objects.filter(
+                    recommendation_type__in=['bought_also_bought', 'viewed_also_viewed']
+                ).select_related('recommended_product').prefetch_related('recommended_product__images'),
+                to_attr='cart_recommendations'
+            ),
+        )
+
+    @classmethod
+    def active_items_prefetch(cls):
+        """Prefetch for Cart queries that get_active_items() then serves without per-item queries"""
+        return models.Prefetch('items', queryset=cls.active_items_queryset(), to_attr='prefetched_active_items')
+
+    def get_active_items(self):
+        """
+        Non-deleted items as a list: from active_items_prefetch() when the cart
+        was loaded with it, otherwise read with just their product and variant.
+        """
+        prefetched = getattr(self, 'prefetched_active_items', None)
+        if prefetched is not None:
+            return prefetched
+        return list(self.active_items.select_related('product', 'variant'))
+
     def get_available_shipping_methods(self):
         """Get common shipping methods available for all products in cart"""
-        active_items = self.active_items.select_related('product')
-        if not active_items.exists():
+        active_items = self.get_active_items()
+        if not active_items:
             return ShippingMethod.objects.none()
 
-        # Get all shipping methods for first product
-        first_item = active_items.first()
-        available_methods = set(first_item.product.shipping_methods.filter(is_active=True))
+        # Intersect the active shipping methods of every product
+        available_methods = None
+        for item in active_items:
+            product_methods = {method.id for method in item.product.shipping_methods.all() if method.is_active}
+            if available_methods is None:
+                available_methods = product_methods
+            else:
+                available_methods &= product_methods
 
-        # Intersect with shipping methods of other products
-        for item in active_items[1:]:
-            product_methods = set(item.product.shipping_methods.filter(is_active=True))
-            available_methods.intersection_update(product_methods)
+        return ShippingMethod.objects.filter(id__in=available_methods)
 
-        # Convert set back to queryset
-        method_ids = [method.id for method in available_methods]
-        return ShippingMethod.objects.filter(id__in=method_ids)
+    def apply_operations(self, operations):
+        """
+        Apply add/update/remove operations (dicts with op, product, variant and
+        quantity) with one read and bulk writes. Soft-deleted rows are revived
+        rather than duplicated. Raises ValueError when a variant lacks stock.
+        Returns {(product_id, variant_id): added quantity} for the additions.
+        """
+        now = timezone.now()
+        product_ids = {operation['product'].id for operation in operations}
+        items = {}
+        # Live rows first, so they win over soft-deleted ones for the same product/variant
+        for item in self.items.filter(product_id__in=product_ids).order_by('is_deleted', '-updated_at'):
+            items.setdefault((item.product_id, item.variant_id), item)
+
+        quantities, variants, added = {}, {}, {}
+        for operation in operations:
+            key = (operation['product'].id, operation['variant'].id if operation['variant'] else None)
+            variants[key] = operation['variant']
+            if key not in quantities:
+                item = items.get(key)
+                quantities[key] = item.quantity if item and not item.is_deleted else 0
+            if operation['op'] == 'add':
+                quantities[key] += operation['quantity']
+                added[key] = added.get(key, 0) + operation['quantity']
+            elif operation['op'] == 'update':
+                quantities[key] = operation['quantity']
+            else:
+                quantities[key] = 0
+
+        for key, quantity in quantities.items():
+            variant = variants[key]
+            if variant and quantity > variant.stock:
+                raise ValueError(f'Only {variant.stock} items available in stock for variant {variant.id}')
+
+        to_create, to_update = [], []
+        for (product_id, variant_id), quantity in quantities.items():
+            item = items.get((product_id, variant_id))
+            if item is None:
+                if quantity:
+                    to_create.append(CartItem(cart=self, product_id=product_id, variant_id=variant_id, quantity=quantity))
+                continue
+            if quantity:
+                if item.is_deleted or item.quantity != quantity:
+                    item.quantity, item.is_deleted, item.deleted_at = quantity, False, None
+                    to_update.append(item)
+            elif not item.is_deleted:
+                item.is_deleted, item.deleted_at = True, now
+                to_update.append(item)
+            item.updated_at = now
+
+        with transaction.atomic():
+            CartItem.objects.bulk_create(to_create)
+            CartItem.objects.bulk_update(to_update, ['quantity', 'is_deleted', 'deleted_at', 'updated_at'])
+            # Same as CartItem.delete: a cart whose last item was removed is deactivated
+            changes = {'updated_at': now}
+            if any(item.is_deleted for item in to_update) and not self.items.filter(is_deleted=False).exists():
+                changes['is_active'] = False
+            Cart.objects.filter(pk=self.pk).update(**changes)
+        for name, value in changes.items():
+            setattr(self, name, value)
+        return added
 
     def save(self, *args, **kwargs):
         """Override save to handle cart activation status"""
@@ -432,6 +686,8 @@ class Cart(models.Model):
             models.Index(fields=['user']),
             models.Index(fields=['session_key']),
             models.Index(fields=['is_active']),
+            models.Index(fields=['updated_at'], condition=models.Q(is_active=False), name='cart_inactive_by_updated'),
+            models.Index(fields=['updated_at', 'id'], condition=models.Q(is_active=True), name='cart_active_by_updated'),
         ]
         constraints = [
             models.UniqueConstraint(
@@ -485,10 +741,87 @@ class CartItem(models.Model):
     class Meta:
         verbose_name = 'Cart Item'
         verbose_name_plural = 'Cart Items'
-        unique_together = ['cart', 'product', 'variant']
         indexes = [
-            models.Index(fields=['is_deleted']),
-            models.Index(fields=['deleted_at']),
+            # Hot lookups only ever read live rows; compaction only reads deleted ones
+            models.Index(fields=['cart'], condition=models.Q(is_deleted=False), name='cartitem_live_by_cart'),
+            models.Index(fields=['deleted_at'], condition=models.Q(is_deleted=True), name='cartitem_deleted_at'),
+        ]
+        constraints = [
+            # Soft-deleted rows must not block adding the same product again
+            models.UniqueConstraint(
+                fields=['cart', 'product', 'variant'],
+                condition=models.Q(is_deleted=False),
+                name='unique_live_cart_item'
+            )
+        ]
+
+class OutboxMessage(models.Model):
+    """Telegram message waiting in a delivery queue, drained by outbox.send_pending"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    chat_id = models.CharField(max_length=100)
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    message = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+class CartReminder(OutboxMessage):
+    """Queued abandoned-cart reminder; the idempotency key allows one reminder per idle period of a cart"""
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reminders')
+
+    def __str__(self):
+        return f"Reminder for cart {self.cart_id} ({self.status})"
+
+    class Meta:
+        verbose_name = 'Cart Reminder'
+        verbose_name_plural = 'Cart Reminders'
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(status='pending'), name='cartreminder_pending'),
+            models.Index(fields=['claimed_at'], condition=models.Q(status='sending'), name='cartreminder_sending'),
+        ]
+
+class StockAlert(models.Model):
+    """A variant that dropped to a worse stock level; batched into admin notifications by inventory.py"""
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name='stock_alerts')
+    level = models.CharField(max_length=10, choices=ProductVariant.STOCK_LEVEL_CHOICES)
+    stock = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.variant_id}: {self.level} ({self.stock})"
+
+    class Meta:
+        verbose_name = 'Stock Alert'
+        verbose_name_plural = 'Stock Alerts'
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(notified_at__isnull=True), name='stockalert_pending'),
+        ]
+
+class StockAlertNotification(OutboxMessage):
+    """Queued batch of stock alerts for one Telegram admin"""
+
+    def __str__(self):
+        return f"Stock alerts for {self.chat_id} ({self.status})"
+
+    class Meta:
+        verbose_name = 'Stock Alert Notification'
+        verbose_name_plural = 'Stock Alert Notifications'
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(status='pending'), name='stockalertnotification_pending'),
+            models.Index(fields=['claimed_at'], condition=models.Q(status='sending'), name='stockalertnotification_sending'),
         ]
 
 class PromoCode(models.Model):
@@ -576,10 +909,10 @@ class PromoCode(models.Model):
             if user.birth_date.month != now.month or user.birth_date.day != now.day:
                 return False, "Only valid on your birthday"
                 
-        # Check per-user usage limit
+        # Check per-user usage limit; orders keep the promo code on the cart they were placed from
         user_usage_count = Order.objects.filter(
             user=user,
-            promo_code=self
+            cart__promo_code=self
         ).count()
         
         if user_usage_count >= self.per_user_limit:
@@ -679,6 +1012,9 @@ class Order(models.Model):
     second_payment_due_date = models.DateTimeField(null=True, blank=True)
     second_payment_status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     
+    # Set when item quantities were taken from variant stock and must be returned on cancellation
+    stock_reserved = models.BooleanField(default=False)
+    
     # Payment fields
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, default='cash_on_delivery')
     payment_status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -728,18 +1064,7 @@ class Order(models.Model):
                 self.second_payment_due_date = now + timedelta(days=30)
                 self.second_payment_status = 'pending'  # Second payment is pending
             
-            # Update payment statuses based on dates
-            if self.first_payment_date and self.payment_status == 'pending':
-                # If first payment is overdue (more than 1 day)
-                if now - self.first_payment_date > timedelta(days=1):
-                    self.payment_status = 'canceled'
-                    self.status = 'canceled'  # Cancel the entire order if first payment is overdue
-            elif self.payment_status == 'delivered':
-                # If first payment is delivered, check second payment
-                if self.second_payment_due_date and self.second_payment_status == 'pending':
-                    # If second payment is overdue
-                    if now > self.second_payment_due_date:
-                        self.second_payment_status = 'canceled'
+            # Overdue payments are handled by the process_split_payments command
         else:
             # Reset split payment fields if not using split payment
             self.is_split_payment = False
@@ -794,6 +1119,31 @@ class Order(models.Model):
         
         self.save()
 
+    @classmethod
+    def release_reserved_stock(cls, order_ids):
+        """Return the reserved item quantities of the given orders to variant stock, once"""
+        with transaction.atomic():
+            order_ids = list(
+                cls.objects.select_for_update().filter(id__in=order_ids, stock_reserved=True).values_list('id', flat=True)
+            )
+            if not order_ids:
+                return 0
+            quantities = dict(
+                OrderItem.objects.filter(order_id__in=order_ids, variant__isnull=False)
+                .values('variant_id').annotate(quantity=Sum('quantity')).values_list('variant_id', 'quantity')
+            )
+            if quantities:
+                # One UPDATE for all variants
+                ProductVariant.objects.filter(id__in=quantities).update(stock=models.F('stock') + models.Case(
+                    *[models.When(id=variant_id, then=models.Value(quantity)) for variant_id, quantity in quantities.items()],
+                    output_field=models.PositiveIntegerField()
+                ))
+                # A queryset update sends no signals; resync levels and product totals here
+                from .inventory import sync_variants
+                sync_variants(quantities)
+            cls.objects.filter(id__in=order_ids).update(stock_reserved=False)
+        return len(quantities)
+
     class Meta:
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
@@ -804,9 +1154,57 @@ class Order(models.Model):
             models.Index(fields=['payment_method']),
             models.Index(fields=['payment_status']),
             models.Index(fields=['is_split_payment']),
+            # Branch queues: counts per status and oldest-first order lists
+            models.Index(fields=['pickup_branch', 'status', 'created_at'], name='order_branch_queue'),
+            # Split payments still waiting for their first / second payment, by due date
+            models.Index(
+                fields=['first_payment_date'],
+                condition=models.Q(is_split_payment=True, payment_status='pending'),
+                name='order_split_first_due'
+            ),
+            models.Index(
+                fields=['second_payment_due_date'],
+                condition=models.Q(is_split_payment=True, payment_status='delivered', second_payment_status='pending'),
+                name='order_split_second_due'
+            ),
         ]
         ordering = ['-created_at']
 
+class OrderStatusEvent(models.Model):
+    """Append-only history of order status transitions"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_events')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_status_events')
+    note = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status or '-'} -> {self.to_status}"
+
+    class Meta:
+        verbose_name = 'Order Status Event'
+        verbose_name_plural = 'Order Status Events'
+        indexes = [
+            models.Index(fields=['order', 'created_at']),
+            models.Index(fields=['to_status', 'created_at']),
+        ]
+
+class OrderNotification(OutboxMessage):
+    """Queued order notification for the customer's Telegram chat"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='notifications')
+
+    def __str__(self):
+        return f"Notification for order {self.order_id} ({self.status})"
+
+    class Meta:
+        verbose_name = 'Order Notification'
+        verbose_name_plural = 'Order Notifications'
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(status='pending'), name='ordernotification_pending'),
+            models.Index(fields=['claimed_at'], condition=models.Q(status='sending'), name='ordernotification_sending'),
+        ]
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -858,6 +1256,8 @@ class Address(models.Model):
     working_hours = models.CharField(max_length=100, help_text="Example: 09:00-18:00")
     is_active = models.BooleanField(default=True)
     location_link = models.URLField(blank=True, help_text="Google Maps link")
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     
     # Additional fields for branch management
     manager_name = models.CharField(max_length=100, blank=True)
@@ -882,6 +1282,29 @@ class Address(models.Model):
         ]
         ordering = ['city', 'name']
 
+class BranchFulfillmentStats(models.Model):
+    """Daily pickup fulfillment SLA per branch, precomputed from the order status history"""
+    branch = models.ForeignKey(Address, on_delete=models.CASCADE, related_name='fulfillment_stats')
+    date = models.DateField()
+    ready_count = models.PositiveIntegerField(default=0, help_text='Orders that became ready for pickup that day')
+    avg_pending_to_ready = models.DurationField(null=True, blank=True)
+    delivered_count = models.PositiveIntegerField(default=0, help_text='Orders picked up that day')
+    avg_ready_to_delivered = models.DurationField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.branch_id} @ {self.date}"
+
+    class Meta:
+        verbose_name = 'Branch Fulfillment Stats'
+        verbose_name_plural = 'Branch Fulfillment Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'date'], name='unique_branch_fulfillment_day'),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
 class ProductRecommendation(models.Model):
     RECOMMENDATION_TYPES = (
         ('viewed_also_viewed', 'Customers Who Viewed Also Viewed'),
@@ -913,4 +1336,17 @@ class ProductRecommendation(models.Model):
         ordering = ['-score', '-created_at']
 
     def __str__(self):
-        return f"{self.product.name} -> {self.recommended_product.name} ({self.get_recommendation_type_display()})"
\ No newline at end of file
+        return f"{self.product.name} -> {self.recommended_product.name} ({self.get_recommendation_type_display()})"
+
+class CatalogVersion(models.Model):
+    """Monotonic version counter per catalog scope, bumped whenever the scope's data changes"""
+    scope = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Catalog Version'
+        verbose_name_plural = 'Catalog Versions'
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
\ No newline at end of file
@@ -0,0 +1,249 @@
+"""
+Streaming order export for accounting.
+
+Orders and their items are read with a single query: a values_list() over
+Order that LEFT JOINs items, products, variants, users and pickup branches,
+consumed with iterator(chunk_size) so rows are streamed from the database
+cursor instead of being loaded per page or per order. Rows come ordered by
+order and item, so JSONL nests each order's items by grouping consecutive
+rows, while CSV and Parquet write one flat row per item (orders without items
+get one row with empty item columns), the shape accounting tools import.
+
+Every writer is a generator of encoded chunks: the export_orders command
+writes them to a file, and OrderExportView hands them to a
+StreamingHttpResponse, so memory stays flat however many orders match.
+Parquet needs pyarrow (see requirements-optional.txt); rows are buffered into
+row groups of ROW_GROUP_SIZE.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Order
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+FORMATS = ['csv', 'jsonl', 'parquet']
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+ROW_GROUP_SIZE = 50000
+
+# Output column -> Order lookup
+ORDER_COLUMNS = {
+    'order_id': 'id',
+    'created_at': 'created_at',
+    'status': 'status',
+    'payment_method': 'payment_method',
+    'payment_status': 'payment_status',
+    'is_split_payment': 'is_split_payment',
+    'user_id': 'user_id',
+    'telegram_id': 'user__telegram_id',
+    'customer_name': 'customer_name',
+    'phone_number': 'phone_number',
+    'pickup_branch': 'pickup_branch__name',
+    'total_amount': 'total_amount',
+    'discount_amount': 'discount_amount',
+    'shipping_amount': 'shipping_amount',
+    'final_amount': 'final_amount',
+}
+ITEM_COLUMNS = {
+    'item_id': 'items__id',
+    'product_id': 'items__product_id',
+    'product_name': 'items__product__name',
+    'color': 'items__variant__color__name',
+    'size': 'items__variant__size__name',
+    'quantity': 'items__quantity',
+    'price': 'items__price',
+}
+COLUMNS = list(ORDER_COLUMNS) + list(ITEM_COLUMNS) + ['line_total']
+DECIMAL_COLUMNS = {'total_amount', 'discount_amount', 'shipping_amount', 'final_amount', 'price', 'line_total'}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _day_start(value, name):
+    try:
+        day = parse_date(value) if isinstance(value, str) else value
+    except ValueError:
+        # Well formed but not a real date, e.g. 2024-13-45
+        day = None
+    if day is None:
+        raise ExportError(f"{name} must be a date (YYYY-MM-DD)")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def export_queryset(date_from=None, date_to=None, statuses=None):
+    """
+    Orders created from ``date_from`` through ``date_to`` (inclusive dates,
+    local time) in any of ``statuses``; ranges keep the created_at index usable.
+    """
+    orders = Order.objects.all()
+    if date_from:
+        orders = orders.filter(created_at__gte=_day_start(date_from, 'from'))
+    if date_to:
+        orders = orders.filter(created_at__lt=_day_start(date_to, 'to') + timedelta(days=1))
+    if statuses:
+        valid = {status for status, _ in Order.STATUS_CHOICES}
+        unknown = set(statuses) - valid
+        if unknown:
+            raise ExportError(f"Unknown status: {', '.join(sorted(unknown))}")
+        orders = orders.filter(status__in=statuses)
+    return orders
+
+
+def export_rows(orders, chunk_size=2000):
+    """Yield one dict per order item (or per order without items), ordered by order and item"""
+    lookups = list(ORDER_COLUMNS.values()) + list(ITEM_COLUMNS.values())
+    names = list(ORDER_COLUMNS) + list(ITEM_COLUMNS)
+    rows = orders.order_by('id', 'items__id').values_list(*lookups)
+    for values in rows.iterator(chunk_size=chunk_size):
+        row = dict(zip(names, values))
+        quantity, price = row['quantity'], row['price']
+        row['line_total'] = quantity * price if quantity is not None and price is not None else None
+        yield row
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    return str(value)
+
+
+def iter_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow([_text(row[column]) for column in COLUMNS])
+        count += 1
+        # One chunk per 500 rows rather than one tiny chunk per row
+        if count % 500 == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    return _text(value)
+
+
+def iter_jsonl(rows):
+    """One JSON object per order with its items nested"""
+    for _, order_rows in groupby(rows, key=lambda row: row['order_id']):
+        order_rows = list(order_rows)
+        order = {column: _json_value(order_rows[0][column]) for column in ORDER_COLUMNS}
+        order['items'] = [
+            {column: _json_value(row[column]) for column in list(ITEM_COLUMNS) + ['line_total']}
+            for row in order_rows if row['item_id'] is not None
+        ]
+        yield (json.dumps(order, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last take()"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_schema():
+    types = {
+        'order_id': pyarrow.int64(),
+        'created_at': pyarrow.timestamp('us', tz='UTC'),
+        'is_split_payment': pyarrow.bool_(),
+        'user_id': pyarrow.int64(),
+        'item_id': pyarrow.int64(),
+        'product_id': pyarrow.int64(),
+        'quantity': pyarrow.int64(),
+    }
+    return pyarrow.schema([
+        (column, pyarrow.decimal128(18, 2) if column in DECIMAL_COLUMNS else types.get(column, pyarrow.string()))
+        for column in COLUMNS
+    ])
+
+
+def iter_parquet(rows, row_group_size=ROW_GROUP_SIZE):
+    if pyarrow is None:
+        raise ExportError("Parquet export needs pyarrow, which is not installed")
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='snappy')
+    text_columns = {field.name for field in schema if pyarrow.types.is_string(field.type)}
+    columns = {column: [] for column in COLUMNS}
+
+    def flush():
+        writer.write_table(pyarrow.table(columns, schema=schema))
+        for values in columns.values():
+            values.clear()
+        return sink.take()
+
+    for row in rows:
+        for column in COLUMNS:
+            value = row[column]
+            columns[column].append(str(value) if column in text_columns and value is not None else value)
+        if len(columns['order_id']) >= row_group_size:
+            yield flush()
+    if columns['order_id']:
+        yield flush()
+    writer.close()
+    yield sink.take()
+
+
+WRITERS = {'csv': iter_csv, 'jsonl': iter_jsonl, 'parquet': iter_parquet}
+
+
+def format_for_path(path):
+    extension = str(path).lower().rsplit('.', 1)[-1]
+    return extension if extension in FORMATS else 'csv'
+
+
+def check_format(fmt):
+    if fmt not in WRITERS:
+        raise ExportError(f"Unknown format {fmt!r}; use one of {', '.join(FORMATS)}")
+    if fmt == 'parquet' and pyarrow is None:
+        raise ExportError("Parquet export needs pyarrow, which is not installed")
+
+
+def export_orders(fmt, date_from=None, date_to=None, statuses=None, chunk_size=2000):
+    """Byte chunks of the export; filters are validated before the first chunk is produced"""
+    check_format(fmt)
+    orders = export_queryset(date_from, date_to, statuses)
+    return WRITERS[fmt](export_rows(orders, chunk_size=chunk_size))
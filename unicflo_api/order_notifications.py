@@ -0,0 +1,42 @@
+"""
+Queueing of customer notifications about orders.
+
+Messages are rendered in batches from orders loaded with everything the
+templates read, and stored as OrderNotification rows keyed by order and event,
+so re-running a job never queues the same notification twice. The
+send_order_notifications command delivers them (see outbox.py); run_scheduler
+runs it every few seconds (see scheduler.py), so nothing is sent unless the
+scheduler process is up.
+"""
+
+from django.db.models import Prefetch
+
+from .models import Order, OrderItem, OrderNotification
+from .outbox import enqueue
+from .utils.telegram import TelegramService
+
+
+def orders_for_messages(order_ids):
+    return Order.objects.filter(id__in=order_ids).select_related(
+        'user', 'shipping_method', 'pickup_branch'
+    ).prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+    )
+
+
+def enqueue_order_notifications(order_ids, event, render=TelegramService.render_order_status, batch_size=500):
+    """Queue one message per order for ``event``; orders of users without Telegram are skipped"""
+    order_ids = list(order_ids)
+    queued = 0
+    for start in range(0, len(order_ids), batch_size):
+        orders = orders_for_messages(order_ids[start:start + batch_size])
+        queued += enqueue(OrderNotification, [
+            OrderNotification(
+                order=order,
+                chat_id=order.user.telegram_id,
+                idempotency_key=f'order:{order.id}:{event}',
+                message=render(order),
+            )
+            for order in orders if order.user.telegram_id
+        ])
+    return queued
@@ -0,0 +1,111 @@
+"""
+Order status state machine shared by the REST API, the Telegram bot and the admin.
+
+TRANSITIONS lists the statuses each status may move to. transition() moves any
+number of orders to a new status with one conditional UPDATE per source status
+(the WHERE clause re-checks the source status, so orders changed concurrently
+are reported as rejected instead of being overwritten), writes the history rows
+with one bulk insert, returns reserved stock of canceled orders, adjusts the
+branch queue counters and queues one customer notification per changed order.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .branch_queue import adjust_counters
+from .models import Order, OrderStatusEvent
+from .order_notifications import enqueue_order_notifications
+
+logger = logging.getLogger(__name__)
+
+TRANSITIONS = {
+    'pending': ['processing', 'canceled'],
+    'processing': ['ready_for_pickup', 'shipped', 'canceled'],
+    'ready_for_pickup': ['delivered', 'canceled'],
+    'shipped': ['delivered', 'returned'],
+    'delivered': ['returned'],
+    'canceled': [],
+    'returned': [],
+}
+
+
+class TransitionError(ValueError):
+    pass
+
+
+def can_transition(current_status, new_status):
+    return new_status in TRANSITIONS.get(current_status, [])
+
+
+def source_statuses(new_status):
+    """Statuses an order may be in to move to ``new_status``"""
+    return [status for status, targets in TRANSITIONS.items() if new_status in targets]
+
+
+def transition(orders, new_status, actor=None, note='', changes=None, notify=True):
+    """
+    Move orders (a queryset or ids) to ``new_status``. ``changes`` are extra
+    field values written by the same UPDATE. Returns (changed ids, rejected)
+    where rejected maps the ids left alone to their status, or to 'changed' for
+    orders another request moved first.
+    """
+    if new_status not in TRANSITIONS:
+        raise TransitionError(f"Unknown order status: {new_status}")
+    queryset = orders if isinstance(orders, QuerySet) else Order.objects.filter(id__in=list(orders))
+    sources = source_statuses(new_status)
+    now = timezone.now()
+
+    changed, rejected, events, branches = [], {}, [], {}
+    with transaction.atomic():
+        by_source = defaultdict(list)
+        for order_id, status, branch_id in queryset.order_by().values_list('id', 'status', 'pickup_branch_id'):
+            if status in sources:
+                by_source[status].append(order_id)
+                branches[order_id] = branch_id
+            else:
+                rejected[order_id] = status
+
+        for source, ids in by_source.items():
+            # Locks the rows still in the source status; anything moved meanwhile is left out
+            locked = list(
+                Order.objects.select_for_update().filter(id__in=ids, status=source).values_list('id', flat=True)
+            )
+            Order.objects.filter(id__in=locked, status=source).update(
+                status=new_status, updated_at=now, **(changes or {})
+            )
+            rejected.update((order_id, 'changed') for order_id in set(ids) - set(locked))
+            changed.extend(locked)
+            events.extend(
+                OrderStatusEvent(
+                    order_id=order_id, from_status=source, to_status=new_status,
+                    actor=actor, note=note, created_at=now
+                )
+                for order_id in locked
+            )
+
+        OrderStatusEvent.objects.bulk_create(events, batch_size=1000)
+        if new_status == 'canceled' and changed:
+            Order.release_reserved_stock(changed)
+        moves = [(branches[event.order_id], event.from_status, new_status) for event in events]
+        transaction.on_commit(lambda: adjust_counters(moves))
+
+    if notify and changed:
+        enqueue_order_notifications(changed, f'status:{new_status}:{int(now.timestamp())}')
+    logger.info(f"Moved {len(changed)} orders to {new_status}, rejected {len(rejected)}")
+    return changed, rejected
+
+
+def transition_order(order, new_status, actor=None, note='', changes=None):
+    """Single-order transition; raises TransitionError when it is not allowed"""
+    changed, rejected = transition([order.pk], new_status, actor=actor, note=note, changes=changes)
+    if not changed:
+        current = rejected.get(order.pk, order.status)
+        raise TransitionError(f"Невозможно изменить статус с {current} на {new_status}")
+    order.status = new_status
+    for field, value in (changes or {}).items():
+        setattr(order, field, value)
+    return order
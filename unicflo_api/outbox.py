@@ -0,0 +1,185 @@
+"""
+Delivery of queued Telegram messages (OutboxMessage subclasses).
+
+Producers only insert rows; send_pending() drains a queue in id order at a
+bounded rate. Each batch is claimed in one transaction (pending -> sending,
+locked with SKIP LOCKED and stamped with claimed_at) before it is sent, so
+concurrent senders never deliver the same message twice, and the unique
+idempotency key keeps producers from queueing it twice.
+
+Transient errors (Telegram flood control, timeouts, network failures) put the
+message back to pending with next_attempt_at pushed out by an exponential
+backoff; it fails for good after OUTBOX['MAX_ATTEMPTS'] claims. A flood wait
+holds back the rest of the batch as well and ends the run, since every further
+message would be refused too. Rows left in 'sending' by a sender that died are
+reclaimed once their claim is older than OUTBOX['CLAIM_TIMEOUT'].
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': 30,  # seconds before the first retry, doubled for every further attempt
+    'CLAIM_TIMEOUT': 10 * 60,  # seconds before a 'sending' row is considered abandoned
+}
+
+
+def outbox_setting(name):
+    return getattr(settings, 'OUTBOX', {}).get(name, DEFAULTS[name])
+
+
+@dataclass
+class BatchResult:
+    delivered: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    retry: list = field(default_factory=list)  # sent and refused for a transient reason
+    held: list = field(default_factory=list)  # not attempted because of a flood wait
+    flood_wait: int = 0
+
+
+async def _send_batch(messages, rate):
+    """Send claimed messages at most ``rate`` per second"""
+    result = BatchResult()
+    if not settings.TELEGRAM_BOT_TOKEN:
+        logger.warning("TELEGRAM_BOT_TOKEN not set. Skipping notification.")
+        result.failed = [message.id for message in messages]
+        return result
+
+    loop = asyncio.get_running_loop()
+    interval = 1 / rate
+    next_at = loop.time()
+    # One bot (and HTTP connection pool) per batch instead of one per message
+    bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+    try:
+        for index, message in enumerate(messages):
+            await asyncio.sleep(max(0, next_at - loop.time()))
+            next_at = loop.time() + interval
+            try:
+                await bot.send_message(chat_id=message.chat_id, text=message.message, parse_mode='Markdown')
+            except RetryAfter as e:
+                logger.warning(f"Telegram flood control: retrying in {e.retry_after}s")
+                result.retry.append(message)
+                result.held = [held.id for held in messages[index + 1:]]
+                result.flood_wait = e.retry_after
+                break
+            except BadRequest as e:
+                # A subclass of NetworkError, but retrying the same message cannot succeed
+                logger.error(f"Failed to send Telegram message: {str(e)}")
+                result.failed.append(message.id)
+            except NetworkError as e:
+                logger.warning(f"Telegram unreachable, will retry message {message.id}: {str(e)}")
+                result.retry.append(message)
+            except TelegramError as e:
+                logger.error(f"Failed to send Telegram message: {str(e)}")
+                result.failed.append(message.id)
+            except Exception as e:
+                logger.error(f"Unexpected error while sending Telegram message: {str(e)}")
+                result.failed.append(message.id)
+            else:
+                result.delivered.append(message.id)
+    finally:
+        await bot.shutdown()
+    return result
+
+
+def enqueue(model, messages):
+    """Insert outbox rows, skipping those whose idempotency key is already queued; returns the number queued"""
+    keys = [message.idempotency_key for message in messages]
+    existing = set(model.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', flat=True))
+    model.objects.bulk_create(
+        [message for message in messages if message.idempotency_key not in existing],
+        ignore_conflicts=True
+    )
+    return len(set(keys) - existing)
+
+
+def reclaim_stale(model):
+    """Return rows abandoned in 'sending' to the queue (or fail them when out of attempts)"""
+    stale = model.objects.filter(
+        status='sending', claimed_at__lt=timezone.now() - timedelta(seconds=outbox_setting('CLAIM_TIMEOUT'))
+    )
+    exhausted = stale.filter(attempts__gte=outbox_setting('MAX_ATTEMPTS')).update(status='failed', claimed_at=None)
+    reclaimed = stale.update(status='pending', claimed_at=None)
+    if reclaimed or exhausted:
+        logger.warning(
+            f"{model._meta.verbose_name_plural}: reclaimed {reclaimed} abandoned messages, {exhausted} out of attempts"
+        )
+    return reclaimed
+
+
+def claim_batch(model, after_id, size):
+    """Move up to ``size`` due pending rows with id > ``after_id`` to 'sending' and return them"""
+    now = timezone.now()
+    with transaction.atomic():
+        # Rows claimed by a concurrent sender are locked and skipped
+        due = model.objects.filter(
+            Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now), status='pending', id__gt=after_id
+        ).select_for_update(skip_locked=True).order_by('id')
+        ids = list(due.values_list('id', flat=True)[:size])
+        if not ids:
+            return []
+        model.objects.filter(id__in=ids).update(status='sending', claimed_at=now, attempts=F('attempts') + 1)
+    return list(model.objects.filter(id__in=ids).order_by('id').only('id', 'chat_id', 'message', 'attempts'))
+
+
+def _record(model, result):
+    """Store the outcome of a batch; returns the number of messages that failed for good"""
+    now = timezone.now()
+    model.objects.filter(id__in=result.delivered).update(status='sent', sent_at=now, claimed_at=None)
+    failed = list(result.failed)
+    max_attempts = outbox_setting('MAX_ATTEMPTS')
+    backoff = outbox_setting('RETRY_BACKOFF')
+    for message in result.retry:
+        if message.attempts >= max_attempts:
+            failed.append(message.id)
+            continue
+        delay = max(result.flood_wait, backoff * 2 ** (message.attempts - 1))
+        model.objects.filter(pk=message.pk).update(
+            status='pending', claimed_at=None, next_attempt_at=now + timedelta(seconds=delay)
+        )
+    if result.held:
+        # Never sent, so the claim does not count as an attempt
+        model.objects.filter(id__in=result.held).update(
+            status='pending', claimed_at=None, attempts=F('attempts') - 1,
+            next_attempt_at=now + timedelta(seconds=result.flood_wait),
+        )
+    model.objects.filter(id__in=failed).update(status='failed', claimed_at=None)
+    return len(failed)
+
+
+def send_pending(model, rate=20, batch_size=100, limit=None):
+    """Deliver pending rows of an outbox model; returns (sent, failed)"""
+    label = model._meta.verbose_name_plural
+    reclaim_stale(model)
+    sent = failed = retried = 0
+    last_id = 0
+    while limit is None or sent + failed + retried < limit:
+        size = batch_size if limit is None else min(batch_size, limit - sent - failed - retried)
+        claimed = claim_batch(model, last_id, size)
+        if not claimed:
+            break
+        # Messages put back for a retry are behind the cursor, so one run attempts each message once
+        last_id = claimed[-1].id
+
+        result = asyncio.run(_send_batch(claimed, rate))
+        batch_failed = _record(model, result)
+        sent += len(result.delivered)
+        failed += batch_failed
+        # Retries past MAX_ATTEMPTS are counted in batch_failed
+        retried += len(result.retry) + len(result.failed) - batch_failed
+        logger.info(f"{label}: {sent} sent, {failed} failed, {retried} to retry so far")
+        if result.flood_wait:
+            break
+    return sent, failed
@@ -17,4 +17,13 @@ class IsCartOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if hasattr(obj, 'cart'):
             return obj.cart.user == request.user
-        return obj.user == request.user 
\ No newline at end of file
+        return obj.user == request.user 
+
+
+class IsStaffOrTelegramAdmin(permissions.BasePermission):
+    """
+    Allows access to admin users and to Telegram admins (branch staff).
+    """
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.is_staff or user.is_telegram_admin))
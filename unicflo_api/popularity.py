@@ -0,0 +1,149 @@
+"""
+Time-decayed product popularity and the trending rankings built from it.
+
+Every product with recent activity has a ProductPopularity row holding an
+exponentially decayed score valid as of ``updated_at``: an event adds its
+weight, and the score halves every HALF_LIFE_HOURS. Events are folded in
+incrementally when the event buffer flushes them (views, cart adds, wishlist
+toggles and purchases, see events.py), outside any request transaction.
+
+The update_popularity command periodically compacts the table (decays every
+row to the present and deletes negligible ones) and rebuilds the rankings:
+sorted product id lists, globally and per gender and category, written to the
+cache under a new generation. Trending requests only slice one of those lists
+and never aggregate; while the rankings are missing from the cache (cold
+cache, or the command has not run within CACHE_TIMEOUT) they are empty until
+the scheduler's next update_popularity run.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ProductPopularity
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'HALF_LIFE_HOURS': 72,
+    'WEIGHTS': {'purchase': 10, 'cart_add': 3, 'wishlist_add': 2, 'like': 2, 'view': 1},
+    'MIN_SCORE': 0.01,
+    'RANKING_SIZE': 100,
+    'CACHE_ALIAS': 'default',
+    'CACHE_TIMEOUT': 24 * 60 * 60,
+}
+
+GLOBAL_SCOPE = 'global'
+
+
+def popularity_setting(name):
+    return getattr(settings, 'POPULARITY', {}).get(name, DEFAULTS[name])
+
+
+def _cache():
+    return caches[popularity_setting('CACHE_ALIAS')]
+
+
+def _ranking_key(generation, scope):
+    return f'popularity:trending:{generation}:{scope}'
+
+
+def decay(score, since, now):
+    """Score as of ``now`` for a score last valid at ``since``"""
+    hours = (now - since).total_seconds() / 3600
+    return score * 0.5 ** (hours / popularity_setting('HALF_LIFE_HOURS'))
+
+
+def add_events(events):
+    """
+    Fold (product_id, kind, quantity, created_at) events into the decayed scores.
+    Kinds without a weight are ignored.
+    """
+    weights = popularity_setting('WEIGHTS')
+    now = timezone.now()
+    increments = defaultdict(float)
+    for product_id, kind, quantity, created_at in events:
+        if weights.get(kind):
+            increments[product_id] += decay(weights[kind] * quantity, created_at, now)
+    if not increments:
+        return
+
+    with transaction.atomic():
+        rows = ProductPopularity.objects.select_for_update().in_bulk(list(increments), field_name='product_id')
+        for product_id, row in rows.items():
+            row.score = decay(row.score, row.updated_at, now) + increments.pop(product_id)
+            row.updated_at = now
+        ProductPopularity.objects.bulk_update(rows.values(), ['score', 'updated_at'])
+        # A row created concurrently by another worker wins; losing one increment is acceptable
+        ProductPopularity.objects.bulk_create([
+            ProductPopularity(product_id=product_id, score=increment, updated_at=now)
+            for product_id, increment in increments.items()
+        ], ignore_conflicts=True)
+
+
+def compact_scores(batch_size=1000):
+    """Decay every score to the present and delete the negligible ones; returns (kept, deleted)"""
+    now = timezone.now()
+    min_score = popularity_setting('MIN_SCORE')
+    kept, expired = [], []
+    with transaction.atomic():
+        # Locked so increments arriving meanwhile are not overwritten by the decayed values
+        rows = ProductPopularity.objects.select_for_update().only('id', 'score', 'updated_at')
+        for row in rows.iterator(chunk_size=batch_size):
+            row.score = decay(row.score, row.updated_at, now)
+            row.updated_at = now
+            (kept if row.score >= min_score else expired).append(row)
+        ProductPopularity.objects.bulk_update(kept, ['score', 'updated_at'], batch_size=batch_size)
+        deleted, _ = ProductPopularity.objects.filter(id__in=[row.id for row in expired]).delete()
+    return len(kept), deleted
+
+
+def build_rankings():
+    """Return {scope: [product ids by descending score]} for the global, gender and category scopes"""
+    now = timezone.now()
+    size = popularity_setting('RANKING_SIZE')
+    rows = ProductPopularity.objects.filter(product__is_active=True).values_list(
+        'product_id', 'product__gender_id', 'product__subcategory__category_id', 'score', 'updated_at'
+    )
+    scored = sorted(
+        ((decay(score, updated_at, now), product_id, gender_id, category_id)
+         for product_id, gender_id, category_id, score, updated_at in rows),
+        reverse=True
+    )
+
+    rankings = defaultdict(list)
+    for _, product_id, gender_id, category_id in scored:
+        scopes = [GLOBAL_SCOPE, f'category:{category_id}']
+        if gender_id is not None:
+            scopes.append(f'gender:{gender_id}')
+        for scope in scopes:
+            if len(rankings[scope]) < size:
+                rankings[scope].append(product_id)
+    rankings.setdefault(GLOBAL_SCOPE, [])
+    return dict(rankings)
+
+
+def refresh_rankings():
+    """Publish freshly built rankings under a new cache generation"""
+    cache = _cache()
+    timeout = popularity_setting('CACHE_TIMEOUT')
+    rankings = build_rankings()
+    generation = int(timezone.now().timestamp() * 1000)
+    cache.set_many({_ranking_key(generation, scope): ids for scope, ids in rankings.items()}, timeout)
+    # Readers switch to the new lists only once all of them are written
+    cache.set('popularity:generation', generation, timeout)
+    logger.info(f"Published {len(rankings)} trending rankings (generation {generation})")
+    return rankings
+
+
+def get_trending_ids(scope=GLOBAL_SCOPE):
+    """Ranked product ids for a scope ('global', 'gender:<id>' or 'category:<id>'); empty until rankings are published"""
+    cache = _cache()
+    generation = cache.get('popularity:generation')
+    if generation is None:
+        return []
+    return cache.get(_ranking_key(generation, scope), [])
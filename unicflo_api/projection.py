@@ -0,0 +1,271 @@
+"""
+Field projection for serializers and the querysets that feed them.
+
+Clients pick what a response contains with ``?fields=``, ``?expand=`` or a
+named ``?profile=``; dotted names reach into nested serializers, e.g.
+``?profile=card&expand=variants`` or ``?fields=id,name,brand.name``, and a
+profile also selects the same-named profile of nested serializers (orders
+with ``?profile=card`` embed product cards instead of full products). The
+queryset is then derived from the projected serializer: forward relations become
+``select_related``, to-many relations become ``Prefetch`` objects with their
+own derived querysets, and ``only()`` limits each model to the columns the
+serialized fields read.
+
+Names the serializer does not have are rejected with a 400 listing them
+(dotted, as requested), so a typo cannot silently return a different shape.
+
+SerializerMethodFields and sources that are not model fields cannot be
+introspected; they load their model in full unless the serializer declares
+the ORM paths (or ``Prefetch`` objects) they read in ``field_hints``.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_fields(value):
+    """Turn 'id,brand.name,variants' (or a list of such names) into a nested dict"""
+    if not value:
+        return {}
+    if isinstance(value, str):
+        value = value.split(',')
+    tree = {}
+    for name in value:
+        node = tree
+        for part in name.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def _merge(base, extra):
+    merged = dict(base)
+    for name, subtree in extra.items():
+        merged[name] = _merge(merged.get(name, {}), subtree)
+    return merged
+
+
+class ProjectedSerializerMixin:
+    """
+    Lets a serializer render a subset of its fields.
+
+    ``field_profiles`` maps profile names to field lists (``None`` means every
+    field); ``default_profile`` is used when nothing was requested. Nested
+    serializers using this mixin receive the dotted part of the selection and
+    the requested profile, which applies wherever they define that name.
+    """
+    field_profiles = {}
+    default_profile = None
+    field_hints = {}
+
+    def __init__(self, *args, fields=None, expand=None, profile=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._requested_fields = parse_fields(fields)
+        self._expanded_fields = parse_fields(expand)
+        self._profile = profile
+        self._field_prefix = ''
+
+    def get_selection(self):
+        """Nested dict of explicitly selected field names, or None for all fields"""
+        if self._requested_fields:
+            return self._requested_fields
+        profile = self._profile or self.default_profile
+        if self.field_profiles.get(profile) is None:
+            return None
+        return parse_fields(self.field_profiles[profile])
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.get_selection()
+        expanded = self._expanded_fields
+
+        errors = {}
+        for param, requested in (('fields', self._requested_fields), ('expand', expanded)):
+            unknown = sorted(self._field_prefix + name for name in requested if name not in fields)
+            if unknown:
+                errors[param] = [f"Unknown fields: {', '.join(unknown)}"]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        for name in list(fields):
+            if selection is not None and name not in selection and name not in expanded:
+                fields.pop(name)
+                continue
+            target = getattr(fields[name], 'child', fields[name])
+            if isinstance(target, ProjectedSerializerMixin):
+                target._field_prefix = f'{self._field_prefix}{name}.'
+                if target._profile is None:
+                    target._profile = self._profile
+                if selection and selection.get(name):
+                    target._requested_fields = selection[name]
+                if expanded.get(name):
+                    target._expanded_fields = _merge(target._expanded_fields, expanded[name])
+        return fields
+
+
+class _Node:
+    """Columns and relations one model needs in a derived queryset"""
+
+    def __init__(self, model):
+        self.model = model
+        self.only = {model._meta.pk.name}
+        self.restrict = True
+        self.select = {}
+        self.prefetch = {}
+        self.extra_prefetch = {}
+
+    def relation(self, field):
+        if field.many_to_many or field.one_to_many:
+            node = self.prefetch.get(field.name)
+            if node is None:
+                node = self.prefetch[field.name] = _Node(field.related_model)
+                if field.one_to_many:
+                    # Prefetching a reverse FK needs the FK column on the children
+                    node.only.add(field.field.name)
+        else:
+            if field.concrete:
+                self.only.add(field.name)
+            node = self.select.get(field.name)
+            if node is None:
+                node = self.select[field.name] = _Node(field.related_model)
+        return node
+
+    def _field(self, attr):
+        try:
+            return self.model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            # A property or method: its dependencies are unknown
+            self.restrict = False
+            return None
+
+    def add_path(self, attrs):
+        """Record an attribute path read from this model"""
+        node = self
+        for attr in attrs:
+            field = node._field(attr)
+            if field is None:
+                return
+            if not field.is_relation:
+                node.only.add(field.name)
+                return
+            node = node.relation(field)
+        # A path ending on a relation reads the related object as a whole
+        node.restrict = False
+
+    def add_related_pk(self, attrs):
+        """Record a relation rendered as primary keys only"""
+        node = self
+        for attr in attrs[:-1]:
+            field = node._field(attr)
+            if field is None or not field.is_relation:
+                return
+            node = node.relation(field)
+        field = node._field(attrs[-1])
+        if field is None:
+            return
+        if field.many_to_many or field.one_to_many:
+            node.relation(field)
+        elif field.concrete:
+            node.only.add(field.name)
+        else:
+            node.restrict = False
+
+
+def _collect(serializer, node):
+    hints = getattr(serializer, 'field_hints', {})
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.field_name in hints:
+            for path in hints[field.field_name]:
+                if isinstance(path, Prefetch):
+                    node.extra_prefetch[path.prefetch_to] = path
+                else:
+                    node.add_path(path.split('__'))
+            continue
+        if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+            node.restrict = False
+            continue
+
+        attrs = [attr for attr in field.source_attrs if attr != 'all']
+        if isinstance(field, (serializers.PrimaryKeyRelatedField, serializers.ManyRelatedField)):
+            # Primary keys only need the FK column or the through table
+            node.add_related_pk(attrs)
+            continue
+        nested = getattr(field, 'child', field)
+        if isinstance(nested, serializers.BaseSerializer):
+            target = node
+            for attr in attrs:
+                related = target._field(attr)
+                if related is None or not related.is_relation:
+                    target.restrict = False
+                    break
+                target = target.relation(related)
+            else:
+                _collect(nested, target)
+        else:
+            node.add_path(attrs)
+
+
+def _only_paths(node, prefix=''):
+    if node.restrict:
+        paths = [prefix + name for name in node.only]
+    else:
+        paths = [prefix + field.name for field in node.model._meta.concrete_fields]
+    for name, child in node.select.items():
+        paths.extend(_only_paths(child, f'{prefix}{name}__'))
+    return paths
+
+
+def _apply(queryset, node):
+    select, prefetches = [], []
+
+    def walk(current, prefix):
+        for name, child in current.select.items():
+            select.append(prefix + name)
+            walk(child, f'{prefix}{name}__')
+        for name, child in current.prefetch.items():
+            prefetches.append(Prefetch(prefix + name, queryset=_apply(child.model._default_manager.all(), child)))
+        for extra in current.extra_prefetch.values():
+            prefetches.append(Prefetch(prefix + extra.prefetch_through, queryset=extra.queryset, to_attr=extra.to_attr))
+
+    walk(node, '')
+    queryset = queryset.only(*_only_paths(node))
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+def optimize_queryset(queryset, serializer):
+    """Add select_related/prefetch_related/only() for exactly what the serializer renders"""
+    serializer = getattr(serializer, 'child', serializer)
+    node = _Node(queryset.model)
+    _collect(serializer, node)
+    return _apply(queryset, node)
+
+
+class ProjectionMixin:
+    """
+    Generic view mixin wiring ``?fields=``, ``?expand=`` and ``?profile=`` to
+    the serializer and deriving the read queryset from the projected fields.
+    Write requests use the full serializer and an unrestricted queryset.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request is not None and self.request.method in SAFE_METHODS:
+            params = self.request.query_params
+            kwargs.setdefault('fields', params.get('fields'))
+            kwargs.setdefault('expand', params.get('expand'))
+            kwargs.setdefault('profile', params.get('profile'))
+        return super().get_serializer(*args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        # Runs after the view's own get_queryset(), for lists and get_object() alike
+        queryset = super().filter_queryset(queryset)
+        if getattr(self, 'swagger_fake_view', False) or self.request.method not in SAFE_METHODS:
+            return queryset
+        return optimize_queryset(queryset, self.get_serializer())
@@ -0,0 +1,57 @@
+"""
+orjson-backed JSON renderer.
+
+Output matches rest_framework.renderers.JSONRenderer: serializer fields
+already arrive as strings (DecimalField honours COERCE_DECIMAL_TO_STRING,
+DateTimeField uses DATETIME_FORMAT), and values orjson does not handle
+natively - Decimal, datetime, lazy strings, querysets - are converted by
+DRF's own JSONEncoder. U+2028/U+2029 are escaped as DRF does, and NaN or
+infinite floats (which orjson would silently write as null) are rejected
+under STRICT_JSON. Falls back to the stock renderer when orjson is not
+installed, an indented response is requested, or COMPACT_JSON/UNICODE_JSON
+ask for output orjson cannot produce.
+"""
+
+import math
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _has_non_finite(data):
+    """True when data holds a NaN or infinite float"""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+class ORJSONRenderer(JSONRenderer):
+    # Datetimes go through DRF's encoder so raw values keep DRF's format
+    options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=JSONEncoder().default, option=self.options)
+        # orjson writes non-finite floats as null, so only output containing null needs the scan.
+        # The stock renderer then raises under STRICT_JSON and writes NaN/Infinity otherwise.
+        if b'null' in ret and _has_non_finite(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer, so the output stays a strict JavaScript subset
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,99 @@
+"""
+In-process scheduler for the periodic management commands.
+
+The outbox senders (order notifications, stock alerts, cart reminders) and
+the maintenance jobs only queue or rebuild data when they run, so something
+has to run them. run_scheduler calls each command in SCHEDULER['JOBS'] every
+``interval`` seconds from a single long-lived process, which runs as its own
+supervised service next to the web server (``entrypoint.sh scheduler``). Jobs
+run one after another, a failing job is logged and retried on its next tick,
+and every command is already safe to run repeatedly or from more than one
+scheduler at a time.
+
+Each job first runs ``offset`` seconds after start-up, by default at a random
+point in its first interval, so restarts and deploys neither run every job at
+once nor rerun the daily jobs each time.
+"""
+
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # (command, interval in seconds, extra arguments[, first run offset in seconds])
+    'JOBS': [
+        ('send_order_notifications', 15, []),
+        ('send_stock_alerts', 60, []),
+        ('send_cart_reminders', 15 * 60, []),
+        ('process_split_payments', 15 * 60, []),
+        ('update_popularity', 15 * 60, []),
+        ('rollup_branch_sla', 60 * 60, []),
+        ('compact_carts', 24 * 60 * 60, []),
+    ],
+    'TICK': 1,  # seconds between checks for due jobs
+}
+
+
+def scheduler_setting(name):
+    return getattr(settings, 'SCHEDULER', {}).get(name, DEFAULTS[name])
+
+
+@dataclass
+class Job:
+    command: str
+    interval: float
+    args: list = field(default_factory=list)
+    offset: float = None  # None picks a random point in the first interval
+    next_run: float = None
+
+    def __post_init__(self):
+        if self.next_run is None:
+            offset = random.uniform(0, self.interval) if self.offset is None else self.offset
+            self.next_run = time.monotonic() + offset
+
+    def due(self, now):
+        return now >= self.next_run
+
+    def run(self, stdout=None):
+        started = time.monotonic()
+        close_old_connections()
+        try:
+            call_command(self.command, *self.args, stdout=stdout)
+        except Exception:
+            logger.exception(f"Scheduled job {self.command} failed")
+        finally:
+            close_old_connections()
+            # Intervals count from the start, so a slow job does not drift the schedule.
+            self.next_run = started + self.interval
+
+
+def load_jobs(only=None):
+    jobs = [Job(command, interval, list(args), *offset) for command, interval, args, *offset in scheduler_setting('JOBS')]
+    if only:
+        jobs = [job for job in jobs if job.command in only]
+    return jobs
+
+
+def run_due(jobs, now=None, stdout=None):
+    """Run every due job once (every job when now is infinite); returns the commands that ran"""
+    now = time.monotonic() if now is None else now
+    ran = []
+    for job in jobs:
+        if job.due(now):
+            job.run(stdout=stdout)
+            ran.append(job.command)
+    return ran
+
+
+def run_forever(jobs, stdout=None):
+    tick = scheduler_setting('TICK')
+    while True:
+        run_due(jobs, stdout=stdout)
+        time.sleep(tick)
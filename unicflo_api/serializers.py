@@ -3,15 +3,18 @@ from rest_framework.exceptions import ValidationError
 from .models import (
     User, Category, Product, ProductImage,
     Wishlist, Cart, CartItem, Order, OrderItem, Address, Subcategory, Brand, Size, Material, Season, ShippingMethod, ProductVariant, GenderCategory,
-    Color, PromoCode, ProductRecommendation
+    Color, PromoCode, ProductRecommendation, UserProductInteraction
 )
 from .utils.telegram import TelegramService
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from decimal import Decimal
 from django.utils import timezone
 from datetime import timedelta
 from drf_spectacular.utils import extend_schema_field
+from .projection import ProjectedSerializerMixin
+from .branch_directory import BRANCH_TYPES, get_branch_directory
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -30,12 +33,12 @@ class UserSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['username', 'is_telegram_admin']  # Only admins can change this via admin panel
 
-class GenderCategorySerializer(serializers.ModelSerializer):
+class GenderCategorySerializer(ProjectedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = GenderCategory
         fields = ['id', 'name', 'slug']
 
-class SubcategorySerializer(serializers.ModelSerializer):
+class SubcategorySerializer(ProjectedSerializerMixin, serializers.ModelSerializer):
     gender = GenderCategorySerializer(read_only=True)
     products_count = serializers.IntegerField(read_only=True)
 
@@ -53,7 +56,7 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'description', 'gender', 'image', 'subcategories', 'products_count', 'created_at']
         read_only_fields = ['slug']
 
-class BrandSerializer(serializers.ModelSerializer):
+class BrandSerializer(ProjectedSerializerMixin, serializers.ModelSerializer):
     products_count = serializers.IntegerField(read_only=True)
     
     class Meta:
@@ -92,12 +95,12 @@ class ShippingMethodSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
 
-class ProductImageSerializer(serializers.ModelSerializer):
+class ProductImageSerializer(ProjectedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = ProductImage
         fields = ['id', 'image', 'is_primary']
 
-class ProductVariantSerializer(serializers.ModelSerializer):
+class ProductVariantSerializer(ProjectedSerializerMixin, serializers.ModelSerializer):
     color_name = serializers.CharField(source='color.name', read_only=True)
     color_hex = serializers.CharField(source='color.hex_code', read_only=True)
     size_name = serializers.CharField(source='size.name', read_only=True)
@@ -111,7 +114,19 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         fields = ['id', 'color', 'color_name', 'color_hex', 'size', 'size_name', 'size_eu', 'size_us', 'size_uk', 'size_fr', 'stock']
         read_only_fields = ['color_name', 'color_hex', 'size_name', 'size_eu', 'size_us', 'size_uk', 'size_fr']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(ProjectedSerializerMixin, serializers.ModelSerializer):
+    field_profiles = {
+        'card': [
+            'id', 'name', 'slug', 'price', 'discount_price', 'brand.id', 'brand.name', 'brand.logo',
+            'images', 'likes_count', 'is_liked',
+        ],
+        'detail': None,
+    }
+    field_hints = {
+        'likes_count': [UserProductInteraction.like_prefetch()],
+        'is_liked': [UserProductInteraction.like_prefetch()],
+    }
+
     subcategory = SubcategorySerializer(read_only=True)
     subcategory_id = serializers.PrimaryKeyRelatedField(
         queryset=Subcategory.objects.all(),
@@ -172,19 +187,19 @@ class ProductSerializer(serializers.ModelSerializer):
             'subcategory', 'subcategory_id', 'brand', 'brand_id',
             'gender', 'gender_id', 'season', 'season_id',
             'materials', 'material_ids', 'shipping_methods', 'shipping_method_ids',
-            'is_featured', 'is_active', 'created_at', 'updated_at',
+            'is_featured', 'is_active', 'total_stock', 'in_stock', 'created_at', 'updated_at',
             'images', 'uploaded_images', 'variants',
             'likes_count', 'is_liked'
         ]
-        read_only_fields = ['slug']
+        read_only_fields = ['slug', 'total_stock', 'in_stock']
 
     def get_likes_count(self, obj):
-        return obj.likes.count()
+        return obj.get_likes_count()
 
     def get_is_liked(self, obj):
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.likes.filter(id=request.user.id).exists()
+        if request:
+            return obj.is_liked_by(request.user)
         return False
 
     def validate_price(self, value):
@@ -233,10 +248,10 @@ class WishlistSerializer(serializers.ModelSerializer):
         write_only=True,
         required=False
     )
-    total_value = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    discounted_value = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    potential_savings = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    products_count = serializers.IntegerField(read_only=True)
+    total_value = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, source='get_total_value')
+    discounted_value = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, source='get_discounted_value')
+    potential_savings = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, source='get_savings')
+    products_count = serializers.IntegerField(read_only=True, source='get_products_count')
     is_public = serializers.BooleanField(default=False)
     name = serializers.CharField(max_length=100, required=False, allow_blank=True)
     description = serializers.CharField(required=False, allow_blank=True)
@@ -250,18 +265,6 @@ class WishlistSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['user', 'created_at', 'updated_at']
     
-    def get_total_value(self, obj):
-        return obj.get_total_value()
-
-    def get_discounted_value(self, obj):
-        return obj.get_discounted_value()
-
-    def get_potential_savings(self, obj):
-        return obj.get_savings()
-
-    def get_products_count(self, obj):
-        return obj.products.count()
-    
     def create(self, validated_data):
         product_ids = validated_data.pop('product_ids', [])
         wishlist = Wishlist.objects.create(**validated_data)
@@ -404,15 +407,12 @@ class CartItemSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         base_url = request.build_absolute_uri('/')[:-1] if request else ''
         
+        # Filtered in Python so images prefetched with the cart are reused
+        images = obj.product.images.all()
         # Variant bo'yicha rasm
         if obj.variant:
-            images = ProductImage.objects.filter(
-                product=obj.product,
-                color=obj.variant.color
-            ).order_by('-is_primary')
-        else:
-            # Barcha rasmlar
-            images = obj.product.images.all().order_by('-is_primary')
+            images = [img for img in images if img.color_id == obj.variant.color_id]
+        images = sorted(images, key=lambda img: not img.is_primary)
         
         result = []
         for img in images:
@@ -495,16 +495,18 @@ class CartItemSerializer(serializers.ModelSerializer):
 
     def get_recommendations(self, obj):
         """Mahsulotga oid tavsiyalar"""
-        # Shu mahsulot bilan birga sotib olingan mahsulotlar
-        recommendations = ProductRecommendation.objects.filter(
-            product=obj.product,
-            recommendation_type__in=['bought_also_bought', 'viewed_also_viewed']
-        ).select_related('recommended_product')[:3]
+        # Shu mahsulot bilan birga sotib olingan mahsulotlar (Cart.active_items_queryset prefetches them)
+        recommendations = getattr(obj.product, 'cart_recommendations', None)
+        if recommendations is None:
+            recommendations = ProductRecommendation.objects.filter(
+                product=obj.product,
+                recommendation_type__in=['bought_also_bought', 'viewed_also_viewed']
+            ).select_related('recommended_product').prefetch_related('recommended_product__images')
         
         result = []
-        for rec in recommendations:
+        for rec in recommendations[:3]:
             product = rec.recommended_product
-            primary_image = product.images.filter(is_primary=True).first()
+            primary_image = next((img for img in product.images.all() if img.is_primary), None)
             
             result.append({
                 'id': product.id,
@@ -660,7 +662,7 @@ class ApplyPromoCodeSerializer(serializers.Serializer):
         return attrs
 
 class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True, source='active_items')
+    items = CartItemSerializer(many=True, read_only=True, source='get_active_items')
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     final_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     items_count = serializers.SerializerMethodField()
@@ -694,16 +696,28 @@ class CartSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
 
+    def to_representation(self, instance):
+        # Every field below reads the active items; load them once unless the view already prefetched them
+        loaded_here = not hasattr(instance, 'prefetched_active_items')
+        if loaded_here:
+            prefetch_related_objects([instance], Cart.active_items_prefetch())
+        try:
+            return super().to_representation(instance)
+        finally:
+            if loaded_here:
+                # Later reads of this instance must not see a stale item list
+                del instance.prefetched_active_items
+
     @extend_schema_field(serializers.IntegerField())
     def get_items_count(self, obj):
         """Savatchadagi mahsulotlar soni"""
-        return obj.active_items.count()
+        return len(obj.get_active_items())
 
     @extend_schema_field(serializers.DecimalField(max_digits=10, decimal_places=2))
     def get_total_savings(self, obj):
         """Umumiy tejalgan miqdor"""
         total_savings = 0
-        for item in obj.active_items.all():
+        for item in obj.get_active_items():
             if item.product.discount_price:
                 savings = (item.product.price - item.product.discount_price) * item.quantity
                 total_savings += savings
@@ -712,12 +726,12 @@ class CartSerializer(serializers.ModelSerializer):
     @extend_schema_field(serializers.IntegerField())
     def get_total_items_quantity(self, obj):
         """Savatchadagi mahsulotlar umumiy miqdori"""
-        return sum(item.quantity for item in obj.active_items.all())
+        return sum(item.quantity for item in obj.get_active_items())
     
     @extend_schema_field(serializers.ListField(child=ShippingMethodSerializer()))
     def get_available_shipping_methods(self, obj):
         """Mavjud yetkazib berish usullari"""
-        if not obj.active_items.exists():
+        if not obj.get_active_items():
             return []
         shipping_methods = obj.get_available_shipping_methods()
         result = []
@@ -750,9 +764,9 @@ class CartSerializer(serializers.ModelSerializer):
         )
         result = []
         for promo in promo_codes:
-            is_valid, message = promo.is_valid(user, obj.total_price, obj.active_items.count())
+            is_valid, message = promo.is_valid(user, obj.total_price, len(obj.get_active_items()))
             if is_valid:
-                discount = promo.calculate_discount(obj.total_price, obj.active_items.all())
+                discount = promo.calculate_discount(obj.total_price, obj.get_active_items())
                 result.append({
                     'id': promo.id,
                     'code': promo.code,
@@ -782,7 +796,7 @@ class CartSerializer(serializers.ModelSerializer):
     @extend_schema_field(serializers.DictField())
     def get_estimated_delivery(self, obj):
         """Taxminiy yetkazib berish vaqtlari"""
-        if not obj.active_items.exists():
+        if not obj.get_active_items():
             return None
         shipping_methods = obj.get_available_shipping_methods()
         if not shipping_methods:
@@ -808,12 +822,12 @@ class CartSerializer(serializers.ModelSerializer):
     @extend_schema_field(serializers.BooleanField())
     def get_has_discounted_items(self, obj):
         """Savatchada chegirmali mahsulotlar bormi?"""
-        return obj.active_items.filter(product__discount_price__isnull=False).exists()
+        return any(item.product.discount_price is not None for item in obj.get_active_items())
     
     @extend_schema_field(serializers.BooleanField())
     def get_has_out_of_stock_items(self, obj):
         """Savatchada omborda yo'q mahsulotlar bormi?"""
-        for item in obj.active_items.all():
+        for item in obj.get_active_items():
             if item.variant and item.variant.stock <= 0:
                 return True
         return False
@@ -840,7 +854,12 @@ class CartSerializer(serializers.ModelSerializer):
         cart = Cart.objects.create(user=user, is_active=True)
         return cart
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(ProjectedSerializerMixin, serializers.ModelSerializer):
+    field_hints = {
+        'total_price': ['price', 'quantity'],
+        'product_image': ['product__images__image'],
+    }
+
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all(), source='product', write_only=True)
     total_price = serializers.DecimalField(read_only=True, max_digits=10, decimal_places=2)
@@ -856,8 +875,9 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'price', 'total_price', 'created_at']
 
     def get_product_image(self, obj):
-        if obj.product.images.exists():
-            return obj.product.images.first().image.url
+        images = obj.product.images.all()
+        if images:
+            return images[0].image.url
         return None
 
     def validate_quantity(self, value):
@@ -885,14 +905,57 @@ class AddressSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'branch_type', 'street', 'district', 'city', 'region',
             'country', 'postal_code', 'phone', 'working_hours', 'is_active',
-            'location_link', 'manager_name', 'manager_phone', 'has_fitting_room',
+            'location_link', 'latitude', 'longitude', 'manager_name', 'manager_phone', 'has_fitting_room',
             'has_parking', 'is_24_hours', 'created_at', 'updated_at'
         ]
 
     def validate(self, attrs):
         return attrs
 
-class OrderSerializer(serializers.ModelSerializer):
+class ActiveBranchField(serializers.PrimaryKeyRelatedField):
+    """Primary key of an active pickup branch, resolved from the in-memory branch directory"""
+
+    def __init__(self, **kwargs):
+        # The queryset is only used for the browsable API and schema choices
+        kwargs.setdefault('queryset', Address.objects.filter(branch_type__in=BRANCH_TYPES, is_active=True))
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        branch = get_branch_directory().get(pk)
+        if branch is None:
+            self.fail('does_not_exist', pk_value=data)
+        return branch
+
+class OrderSerializer(ProjectedSerializerMixin, serializers.ModelSerializer):
+    field_profiles = {
+        'summary': [
+            'id', 'status', 'status_display', 'final_amount', 'payment_method',
+            'payment_status', 'items_count', 'created_at',
+        ],
+        'queue': [
+            'id', 'status', 'customer_name', 'phone_number', 'final_amount',
+            'payment_method', 'payment_status', 'items_count', 'created_at',
+        ],
+        # Every order field; item products use their own 'card' profile
+        'card': None,
+        'detail': None,
+    }
+    field_hints = {
+        'items_count': ['items__id'],
+        'can_cancel': ['status'],
+        'status_display': ['status'],
+        'payment_method_display': ['payment_method'],
+        'shipping_info': ['shipping_amount', 'shipping_method', 'pickup_branch'],
+        'estimated_delivery_date': ['created_at', 'shipping_method'],
+        'active_branches': ['id'],
+    }
+
     items = OrderItemSerializer(many=True, read_only=True)
     shipping_method = ShippingMethodSerializer(read_only=True)
     shipping_method_id = serializers.PrimaryKeyRelatedField(
@@ -902,8 +965,7 @@ class OrderSerializer(serializers.ModelSerializer):
         required=False
     )
     pickup_branch = AddressSerializer(read_only=True)
-    pickup_branch_id = serializers.PrimaryKeyRelatedField(
-        queryset=Address.objects.filter(branch_type__in=['store', 'pickup']),
+    pickup_branch_id = ActiveBranchField(
         source='pickup_branch',
         write_only=True,
         required=False
@@ -999,12 +1061,7 @@ class OrderSerializer(serializers.ModelSerializer):
         if obj.pk:
             return None
             
-        branches = Address.objects.filter(
-            branch_type__in=['store', 'pickup'],
-            is_active=True
-        ).values('id', 'name', 'street', 'district', 'city', 'working_hours', 'location_link')
-        
-        return branches
+        return get_branch_directory().summaries
 
     @extend_schema_field(serializers.DictField())
     def get_split_payment_info(self, obj):
@@ -1101,8 +1158,8 @@ class OrderSerializer(serializers.ModelSerializer):
         # Save the order first
         order.save()
         
-        # Add items from cart
-        for item in cart.active_items.all():
+        # Add items from cart; one create per item, so the OrderItem signals run
+        for item in cart.active_items.select_related('product', 'variant'):
             OrderItem.objects.create(
                 order=order,
                 product=item.product,
@@ -1126,6 +1183,55 @@ class AddToCartRequestSerializer(serializers.Serializer):
     variant_id = serializers.IntegerField(required=False)
     quantity = serializers.IntegerField(default=1)
 
+class CartBatchOperationSerializer(serializers.Serializer):
+    OPERATION_CHOICES = (
+        ('add', 'Add quantity'),
+        ('update', 'Set quantity'),
+        ('remove', 'Remove item'),
+    )
+
+    op = serializers.ChoiceField(choices=OPERATION_CHOICES)
+    product_id = serializers.IntegerField()
+    variant_id = serializers.IntegerField(required=False, allow_null=True)
+    quantity = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, attrs):
+        if attrs['op'] == 'update' and 'quantity' not in attrs:
+            raise serializers.ValidationError({'quantity': 'Quantity is required for update'})
+        if attrs['op'] == 'add' and attrs.setdefault('quantity', 1) < 1:
+            raise serializers.ValidationError({'quantity': 'Quantity must be at least 1'})
+        return attrs
+
+class CartBatchRequestSerializer(serializers.Serializer):
+    MAX_OPERATIONS = 100
+
+    operations = CartBatchOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, operations):
+        """Resolve all products and variants with one query each"""
+        if len(operations) > self.MAX_OPERATIONS:
+            raise serializers.ValidationError(f"At most {self.MAX_OPERATIONS} operations per request")
+
+        products = Product.objects.filter(is_active=True).only('id', 'name').in_bulk(
+            {operation['product_id'] for operation in operations}
+        )
+        variants = ProductVariant.objects.only('id', 'product_id', 'stock').in_bulk(
+            {operation['variant_id'] for operation in operations if operation.get('variant_id')}
+        )
+        errors = {}
+        for index, operation in enumerate(operations):
+            operation['product'] = products.get(operation['product_id'])
+            operation['variant'] = variants.get(operation.get('variant_id'))
+            if operation['product'] is None:
+                errors[index] = 'Product not found'
+            elif operation.get('variant_id') and (
+                operation['variant'] is None or operation['variant'].product_id != operation['product_id']
+            ):
+                errors[index] = 'Variant not found'
+        if errors:
+            raise serializers.ValidationError(errors)
+        return operations
+
 class CartResponseSerializer(serializers.Serializer):
     message = serializers.CharField()
     cart_item = CartItemSerializer()
@@ -1171,11 +1277,9 @@ class DirectPurchaseSerializer(serializers.Serializer):
         return value
 
     def validate_pickup_branch_id(self, value):
-        try:
-            branch = Address.objects.get(id=value, branch_type__in=['store', 'pickup'], is_active=True)
-            return value
-        except Address.DoesNotExist:
+        if value not in get_branch_directory():
             raise serializers.ValidationError("Filial topilmadi yoki faol emas")
+        return value
 
     def validate(self, data):
         # Check product stock
@@ -1,10 +1,79 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import User
+from django.db import transaction
+from django.utils import timezone
+from .models import User, Address, Cart, CartItem, Order, OrderItem, OrderStatusEvent, ProductVariant
+from .catalog_cache import CATALOG_SCOPES, scopes_for_model, bump_catalog_version
+from .events import record_user_event
+from .branch_queue import adjust_counters
+from .inventory import stock_level, sync_product_stock, sync_variants
+from .branch_directory import BRANCH_TYPES
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """Create a UserProfile when a new User is created"""
     if created:
         # Add any additional user setup logic here if needed
-        pass 
\ No newline at end of file
+        pass
+
+@receiver(pre_save, sender=Address)
+def remember_branch_type(sender, instance, **kwargs):
+    """Keep the stored branch_type, so invalidate_catalog notices a branch turned into a warehouse"""
+    instance._stored_branch_type = None if instance._state.adding else (
+        Address.objects.filter(pk=instance.pk).values_list('branch_type', flat=True).first()
+    )
+
+def invalidate_catalog(sender, instance, **kwargs):
+    """Bump the catalog scopes that depend on the written model"""
+    scopes = scopes_for_model(sender.__name__)
+    if sender is Address and not (
+        instance.branch_type in BRANCH_TYPES or getattr(instance, '_stored_branch_type', None) in BRANCH_TYPES
+    ):
+        # Warehouses never show up in the branch directory
+        scopes = [scope for scope in scopes if scope != 'branches']
+    if scopes:
+        bump_catalog_version(*scopes)
+
+for model_name in {name for names in CATALOG_SCOPES.values() for name in names}:
+    post_save.connect(invalidate_catalog, sender=f'unicflo_api.{model_name}', dispatch_uid=f'catalog_save_{model_name}')
+    post_delete.connect(invalidate_catalog, sender=f'unicflo_api.{model_name}', dispatch_uid=f'catalog_delete_{model_name}')
+
+@receiver(post_save, sender=OrderItem)
+def record_purchase(sender, instance, created, **kwargs):
+    """
+    Queue purchased items for the interaction store once the order commits. The
+    event flusher writes and scores them, so checkouts neither insert the row
+    nor lock the product's popularity row inside their transaction.
+    """
+    if created:
+        user_id, product_id, quantity = instance.order.user_id, instance.product_id, instance.quantity
+        transaction.on_commit(lambda: record_user_event(user_id, product_id, 'purchase', quantity))
+
+@receiver(post_save, sender=CartItem)
+def touch_cart(sender, instance, **kwargs):
+    """Keep Cart.updated_at at the last item change; abandoned cart detection relies on it"""
+    Cart.objects.filter(pk=instance.cart_id).update(updated_at=timezone.now())
+
+@receiver(post_save, sender=Order)
+def start_status_history(sender, instance, created, **kwargs):
+    """Open the order's status timeline (SLA rollups measure from it) and count it in its branch queue"""
+    if created:
+        OrderStatusEvent.objects.create(
+            order=instance,
+            from_status='',
+            to_status=instance.status,
+            created_at=instance.created_at
+        )
+        move = (instance.pickup_branch_id, '', instance.status)
+        transaction.on_commit(lambda: adjust_counters([move]))
+
+@receiver(post_save, sender=ProductVariant)
+def sync_variant_stock(sender, instance, created, **kwargs):
+    """Keep the product's stock totals and the variant's stock level current; new variants don't alert"""
+    sync_variants([instance.pk], alert=not created)
+    # The level was written by a queryset update; a later save of this instance must not revert it
+    instance.stock_level = stock_level(instance.stock)
+
+@receiver(post_delete, sender=ProductVariant)
+def drop_variant_stock(sender, instance, **kwargs):
+    sync_product_stock([instance.product_id])
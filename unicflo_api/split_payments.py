@@ -0,0 +1,93 @@
+"""
+Scheduled processing of overdue split payments.
+
+A split-payment order whose first payment is still pending FIRST_PAYMENT_GRACE
+after first_payment_date is canceled through the order state machine, which
+releases its reserved stock and records the status change. One whose first
+payment arrived but whose second payment is past second_payment_due_date gets
+second_payment_status 'canceled'. Candidates come from partial indexes on the
+two due dates; each batch is changed with a single UPDATE and the customers are
+notified through the order outbox.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order
+from .order_notifications import enqueue_order_notifications
+from .order_workflow import source_statuses, transition
+from .utils.telegram import TelegramService
+
+logger = logging.getLogger(__name__)
+
+FIRST_PAYMENT_GRACE = timedelta(days=1)
+
+
+def overdue_first_payments(now):
+    return Order.objects.filter(
+        is_split_payment=True,
+        payment_status='pending',
+        first_payment_date__lt=now - FIRST_PAYMENT_GRACE,
+        status__in=source_statuses('canceled'),
+    )
+
+
+def overdue_second_payments(now):
+    return Order.objects.filter(
+        is_split_payment=True,
+        payment_status='delivered',
+        second_payment_status='pending',
+        second_payment_due_date__lt=now,
+    )
+
+
+def _process(queryset, changes, batch_size):
+    """Apply ``changes`` to the matching orders batch by batch; returns the ids changed"""
+    changed = []
+    while True:
+        with transaction.atomic():
+            # Updated orders leave the queryset, so every pass picks up the next batch
+            locked = queryset.select_for_update(skip_locked=True).order_by('id')
+            ids = list(locked.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return changed
+            Order.objects.filter(id__in=ids).update(updated_at=timezone.now(), **changes)
+        changed.extend(ids)
+
+
+def _cancel(queryset, batch_size):
+    canceled = []
+    while True:
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return canceled
+        changed, _ = transition(
+            ids, 'canceled', changes={'payment_status': 'canceled'},
+            note="Первый платеж по рассрочке не поступил"
+        )
+        if not changed:
+            # Everything in the batch was moved concurrently; pick it up on the next run
+            return canceled
+        canceled.extend(changed)
+
+
+def process_overdue_split_payments(dry_run=False, batch_size=500):
+    """Returns {'first_payment_overdue': [ids], 'second_payment_overdue': [ids]}"""
+    now = timezone.now()
+    first, second = overdue_first_payments(now), overdue_second_payments(now)
+    if dry_run:
+        return {
+            'first_payment_overdue': list(first.order_by('id').values_list('id', flat=True)),
+            'second_payment_overdue': list(second.order_by('id').values_list('id', flat=True)),
+        }
+
+    canceled = _cancel(first, batch_size)
+
+    lapsed = _process(second, {'second_payment_status': 'canceled'}, batch_size)
+    enqueue_order_notifications(lapsed, 'second-payment-overdue', render=TelegramService.render_second_payment_overdue)
+
+    logger.info(f"Split payments: {len(canceled)} orders canceled, {len(lapsed)} second payments overdue")
+    return {'first_payment_overdue': canceled, 'second_payment_overdue': lapsed}
@@ -22,7 +22,8 @@ from .commands.admin import (
     show_stats,
     settings as admin_settings,
     process_order_action,
-    process_navigation
+    process_navigation,
+    branch_queue_command
 )
 from .commands.orders import (
     my_orders_command,
@@ -51,6 +52,7 @@ class UnicfloBot:
         self.application.add_handler(CommandHandler("admin", admin_command))
         self.application.add_handler(CommandHandler("myorders", my_orders_command))
         self.application.add_handler(CommandHandler("search", search_orders))
+        self.application.add_handler(CommandHandler("queue", branch_queue_command))
         
         # Callback query handlers
         self.application.add_handler(CallbackQueryHandler(
@@ -75,7 +77,7 @@ class UnicfloBot:
         ))
         self.application.add_handler(CallbackQueryHandler(
             process_order_action,
-            pattern="^(accept|process|ship|deliver|cancel|return)_order_[0-9]+$"
+            pattern="^(accept|process|ready|ship|deliver|cancel|return)_order_[0-9]+$"
         ))
         self.application.add_handler(CallbackQueryHandler(
             process_navigation,
@@ -10,7 +10,8 @@ from .admin import (
     show_stats,
     settings,
     process_order_action,
-    process_navigation
+    process_navigation,
+    branch_queue_command
 )
 from .orders import (
     my_orders_command,
@@ -27,6 +28,7 @@ __all__ = [
     'settings',
     'process_order_action',
     'process_navigation',
+    'branch_queue_command',
     'my_orders_command',
     'view_order',
     'refresh_order',
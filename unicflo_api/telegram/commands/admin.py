@@ -4,6 +4,7 @@ Contains admin command handlers and related functionality.
 """
 
 import logging
+from django.utils import timezone
 from telegram import Update
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
@@ -12,6 +13,7 @@ from ..ui.keyboards import Keyboards
 from ..ui.styles import Emojis, TextStyles
 from ..services.order_service import OrderService
 from ..services.user_service import UserService
+from ...fulfillment_sla import format_duration
 from ..utils.decorators import handle_errors, admin_required
 
 logger = logging.getLogger(__name__)
@@ -84,29 +86,42 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         # Get statistics
         order_stats = await OrderService.get_order_stats()
         user_stats = await UserService.get_user_stats()
+        sla_stats = await OrderService.get_sla_stats()
         
         # Format statistics message
         stats_message = (
             f"{TextStyles.section_title('Статистика', Emojis.STATS)}\n"
             f"\n{TextStyles.section_title('Заказы', Emojis.ORDER)}"
             f"{TextStyles.key_value('Всего заказов', str(order_stats['total']), Emojis.CHART)}"
-            f"{TextStyles.key_value('Активные', str(order_stats['active']) + f' ({order_stats['active_percent']}%)', Emojis.FIRE)}"
-            f"{TextStyles.key_value('Ожидают', str(order_stats['pending']) + f' ({order_stats['pending_percent']}%)', Emojis.PENDING)}"
-            f"{TextStyles.key_value('В обработке', str(order_stats['processing']) + f' ({order_stats['processing_percent']}%)', Emojis.PROCESSING)}"
-            f"{TextStyles.key_value('Отправлены', str(order_stats['shipped']) + f' ({order_stats['shipped_percent']}%)', Emojis.SHIPPED)}"
-            f"{TextStyles.key_value('Доставлены', str(order_stats['delivered']) + f' ({order_stats['delivered_percent']}%)', Emojis.SUCCESS)}"
-            f"{TextStyles.key_value('Отменены', str(order_stats['canceled']) + f' ({order_stats['canceled_percent']}%)', Emojis.ERROR)}"
-            f"{TextStyles.key_value('Возвраты', str(order_stats['returned']) + f' ({order_stats['returned_percent']}%)', Emojis.RETURNED)}"
+            f"{TextStyles.key_value('Активные', str(order_stats['active']) + ' (' + str(order_stats['active_percent']) + '%)', Emojis.FIRE)}"
+            f"{TextStyles.key_value('Ожидают', str(order_stats['pending']) + ' (' + str(order_stats['pending_percent']) + '%)', Emojis.PENDING)}"
+            f"{TextStyles.key_value('В обработке', str(order_stats['processing']) + ' (' + str(order_stats['processing_percent']) + '%)', Emojis.PROCESSING)}"
+            f"{TextStyles.key_value('Готовы к выдаче', str(order_stats['ready_for_pickup']) + ' (' + str(order_stats['ready_for_pickup_percent']) + '%)', Emojis.READY)}"
+            f"{TextStyles.key_value('Отправлены', str(order_stats['shipped']) + ' (' + str(order_stats['shipped_percent']) + '%)', Emojis.SHIPPED)}"
+            f"{TextStyles.key_value('Доставлены', str(order_stats['delivered']) + ' (' + str(order_stats['delivered_percent']) + '%)', Emojis.SUCCESS)}"
+            f"{TextStyles.key_value('Отменены', str(order_stats['canceled']) + ' (' + str(order_stats['canceled_percent']) + '%)', Emojis.ERROR)}"
+            f"{TextStyles.key_value('Возвраты', str(order_stats['returned']) + ' (' + str(order_stats['returned_percent']) + '%)', Emojis.RETURNED)}"
             f"{TextStyles.key_value('За сегодня', str(order_stats['today']), Emojis.CALENDAR)}"
             f"\n{TextStyles.section_title('Пользователи', Emojis.USER)}"
             f"{TextStyles.key_value('Всего пользователей', str(user_stats['total']), Emojis.CHART)}"
-            f"{TextStyles.key_value('Администраторы', str(user_stats['admins']) + f' ({user_stats['admins_percent']}%)', Emojis.ADMIN)}"
-            f"{TextStyles.key_value('Активные', str(user_stats['active']) + f' ({user_stats['active_percent']}%)', Emojis.SUCCESS)}"
-            f"{TextStyles.key_value('Заблокированные', str(user_stats['blocked']) + f' ({user_stats['blocked_percent']}%)', Emojis.ERROR)}"
-            f"{TextStyles.key_value('С заказами', str(user_stats['with_orders']) + f' ({user_stats['with_orders_percent']}%)', Emojis.ORDER)}"
+            f"{TextStyles.key_value('Администраторы', str(user_stats['admins']) + ' (' + str(user_stats['admins_percent']) + '%)', Emojis.ADMIN)}"
+            f"{TextStyles.key_value('Активные', str(user_stats['active']) + ' (' + str(user_stats['active_percent']) + '%)', Emojis.SUCCESS)}"
+            f"{TextStyles.key_value('Заблокированные', str(user_stats['blocked']) + ' (' + str(user_stats['blocked_percent']) + '%)', Emojis.ERROR)}"
+            f"{TextStyles.key_value('С заказами', str(user_stats['with_orders']) + ' (' + str(user_stats['with_orders_percent']) + '%)', Emojis.ORDER)}"
             f"{TextStyles.key_value('За сегодня', str(user_stats['today']), Emojis.CALENDAR)}"
         )
         
+        if sla_stats:
+            stats_message += f"\n{TextStyles.section_title('Выдача по филиалам (30 дней)', Emojis.BRANCH)}"
+            for branch in sla_stats:
+                stats_message += TextStyles.key_value(
+                    branch['branch_name'],
+                    f"готов за {format_duration(branch['avg_pending_to_ready'])}, "
+                    f"выдан за {format_duration(branch['avg_ready_to_delivered'])} "
+                    f"({branch['delivered_count']} выдач)",
+                    Emojis.CLOCK
+                )
+        
         # Send statistics
         message = update.callback_query.message if update.callback_query else update.message
         await message.reply_text(
@@ -121,6 +136,59 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         logger.error(f"Error in show_stats: {str(e)}")
         raise
 
+@handle_errors
+@admin_required
+async def branch_queue_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /queue [branch_id] command."""
+    try:
+        # Get user from context
+        user = context.user_data['user']
+        
+        if not context.args:
+            branches = await OrderService.get_branch_queues()
+            lines = [TextStyles.section_title('Очереди филиалов', Emojis.BRANCH)]
+            for branch in branches:
+                queues = branch['queues']
+                lines.append(
+                    f"{TextStyles.bold(branch['name'])} (/queue {branch['id']})\n"
+                    f"{Emojis.PENDING} {queues['pending']}  "
+                    f"{Emojis.PROCESSING} {queues['processing']}  "
+                    f"{Emojis.READY} {queues['ready_for_pickup']}\n"
+                )
+            if not branches:
+                lines.append("Нет активных филиалов")
+            await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+            logger.info(f"Admin {user.telegram_id} viewed branch queues")
+            return
+        
+        if not context.args[0].isdigit():
+            await update.message.reply_text("Использование: /queue [ID филиала]")
+            return
+        
+        branch = await OrderService.get_branch_queue(int(context.args[0]))
+        if branch is None:
+            await update.message.reply_text(f"{Emojis.ERROR} Филиал не найден")
+            return
+        
+        queues = branch['queues']
+        lines = [
+            TextStyles.section_title(branch['name'], Emojis.BRANCH),
+            TextStyles.key_value('Ожидают', str(queues['pending']), Emojis.PENDING)
+            + TextStyles.key_value('В обработке', str(queues['processing']), Emojis.PROCESSING)
+            + TextStyles.key_value('Готовы к выдаче', str(queues['ready_for_pickup']), Emojis.READY),
+        ]
+        for order in branch['orders']:
+            lines.append(
+                f"#{order.id} {order.customer_name}, {order.phone_number} — "
+                f"{TextStyles.price(order.final_amount)} ({timezone.localtime(order.created_at):%d.%m %H:%M})"
+            )
+        await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+        logger.info(f"Admin {user.telegram_id} viewed queue of branch {branch['id']}")
+        
+    except Exception as e:
+        logger.error(f"Error in branch_queue_command: {str(e)}")
+        raise
+
 @handle_errors
 @admin_required
 async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -163,7 +231,7 @@ async def process_order_action(update: Update, context: ContextTypes.DEFAULT_TYP
             return
         
         # Process action
-        order = await OrderService.update_order_status(order_id, action)
+        order = await OrderService.update_order_status(order_id, action, user)
         if not order:
             await update.callback_query.answer("Ошибка при обновлении заказа")
             return
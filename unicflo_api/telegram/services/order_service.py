@@ -9,7 +9,10 @@ from django.db.models import Q, Count, Sum
 from django.utils import timezone
 from django.core.cache import cache
 from asgiref.sync import sync_to_async
-from ...models import Order, User
+from ...models import Address, Order, User
+from ...order_workflow import TransitionError, can_transition, transition_order
+from ...fulfillment_sla import branch_sla_summary
+from ...branch_queue import QUEUE_STATUSES, queue_counts, queue_orders
 from ..ui.messages import OrderMessages
 
 logger = logging.getLogger(__name__)
@@ -18,6 +21,20 @@ class OrderService:
     """Service for handling order-related operations."""
     
     CACHE_TIMEOUT = 300  # 5 minutes
+
+    # Keyboard callback verbs and the statuses they move an order to
+    ACTION_STATUSES = {
+        'accept': 'processing',
+        'ready': 'ready_for_pickup',
+        'ship': 'shipped',
+        'deliver': 'delivered',
+        'cancel': 'canceled',
+    }
+
+    @staticmethod
+    def action_status(action: str) -> str:
+        """Target status of a callback action (a verb or a status name)."""
+        return OrderService.ACTION_STATUSES.get(action, action)
     
     @staticmethod
     @sync_to_async
@@ -33,7 +50,7 @@ class OrderService:
             orders = list(Order.objects.filter(user=user).select_related(
                 'user',
                 'shipping_method',
-                'branch',
+                'pickup_branch',
             ).prefetch_related(
                 'items__product',
                 'items__variant',
@@ -65,7 +82,7 @@ class OrderService:
             ).select_related(
                 'user',
                 'shipping_method',
-                'branch',
+                'pickup_branch',
             ).prefetch_related(
                 'items__product',
                 'items__variant',
@@ -95,7 +112,7 @@ class OrderService:
             order = Order.objects.select_related(
                 'user',
                 'shipping_method',
-                'branch',
+                'pickup_branch',
             ).prefetch_related(
                 'items__product',
                 'items__variant',
@@ -116,13 +133,14 @@ class OrderService:
     
     @staticmethod
     @sync_to_async
-    def update_order_status(order_id: int, new_status: str) -> Optional[Order]:
-        """Update order status."""
+    def update_order_status(order_id: int, new_status: str, user: Optional[User] = None) -> Optional[Order]:
+        """Update order status through the order state machine."""
         try:
+            new_status = OrderService.action_status(new_status)
             order = Order.objects.select_related(
                 'user',
                 'shipping_method',
-                'branch',
+                'pickup_branch',
             ).prefetch_related(
                 'items__product',
                 'items__variant',
@@ -131,8 +149,7 @@ class OrderService:
                 'items__product__brand',
             ).get(id=order_id)
             
-            order.status = new_status
-            order.save()
+            transition_order(order, new_status, actor=user)
             
             # Clear cache
             cache.delete(f'order_{order_id}')
@@ -145,6 +162,9 @@ class OrderService:
         except Order.DoesNotExist:
             logger.error(f"Order {order_id} not found")
             return None
+        except TransitionError as e:
+            logger.warning(f"Order {order_id}: {e}")
+            return None
         except Exception as e:
             logger.error(f"Error updating order {order_id} status: {str(e)}")
             return None
@@ -168,7 +188,7 @@ class OrderService:
             queryset = Order.objects.select_related(
                 'user',
                 'shipping_method',
-                'branch',
+                'pickup_branch',
             ).prefetch_related(
                 'items__product',
                 'items__variant',
@@ -200,6 +220,69 @@ class OrderService:
             logger.error(f"Error getting filtered orders: {str(e)}")
             return [], 0
     
+    @staticmethod
+    @sync_to_async
+    def get_order_stats() -> Dict[str, Any]:
+        """Get order counts per status in a single aggregate query."""
+        statuses = [code for code, _ in Order.STATUS_CHOICES]
+        try:
+            stats = Order.objects.aggregate(
+                total=Count('id'),
+                today=Count('id', filter=Q(created_at__date=timezone.localdate())),
+                **{code: Count('id', filter=Q(status=code)) for code in statuses}
+            )
+        except Exception as e:
+            logger.error(f"Error getting order stats: {str(e)}")
+            stats = dict.fromkeys(['total', 'today', *statuses], 0)
+        
+        stats['active'] = sum(stats[code] for code in statuses if code not in ('delivered', 'canceled', 'returned'))
+        total = stats['total'] or 1  # Avoid division by zero
+        for key in ['active', *statuses]:
+            stats[f'{key}_percent'] = round(stats[key] / total * 100, 1)
+        return stats
+    
+    @staticmethod
+    @sync_to_async
+    def get_sla_stats(days: int = 30) -> List[Dict[str, Any]]:
+        """Get precomputed per-branch pickup SLA (see rollup_branch_sla)."""
+        cache_key = f'branch_sla_{days}'
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        try:
+            summary = branch_sla_summary(days)
+        except Exception as e:
+            logger.error(f"Error getting SLA stats: {str(e)}")
+            return []
+        cache.set(cache_key, summary, OrderService.CACHE_TIMEOUT)
+        return summary
+    
+    @staticmethod
+    @sync_to_async
+    def get_branch_queues() -> List[Dict[str, Any]]:
+        """Get queue counts of every active branch (served from cached counters)."""
+        branches = list(Address.objects.filter(
+            branch_type__in=['store', 'pickup'],
+            is_active=True
+        ).order_by('name').values('id', 'name'))
+        counts = queue_counts(branch['id'] for branch in branches)
+        for branch in branches:
+            branch['queues'] = counts[branch['id']]
+        return branches
+    
+    @staticmethod
+    @sync_to_async
+    def get_branch_queue(branch_id: int, status: str = 'ready_for_pickup', limit: int = 10) -> Optional[Dict[str, Any]]:
+        """Get one branch's queue counts and its oldest orders in a status."""
+        branch = Address.objects.filter(id=branch_id).values('id', 'name').first()
+        if branch is None or status not in QUEUE_STATUSES:
+            return None
+        branch['queues'] = queue_counts([branch_id])[branch_id]
+        branch['orders'] = list(queue_orders(branch_id, status).only(
+            'id', 'customer_name', 'phone_number', 'final_amount', 'created_at'
+        )[:limit])
+        return branch
+    
     @staticmethod
     async def format_order_message(order: Order, show_items: bool = True) -> str:
         """Format order message using OrderMessages."""
@@ -220,33 +303,20 @@ class OrderService:
     def validate_order_action(order_id: int, action: str, user: User) -> Tuple[bool, str]:
         """Validate if order action is allowed."""
         try:
-            order = Order.objects.get(id=order_id)
-            
-            # Check if order exists
-            if not order:
-                return False, "Заказ не найден"
-            
             # Check if user has permission
             if not user.is_telegram_admin:
                 return False, "У вас нет прав для этого действия"
             
-            # Validate status transitions
-            valid_transitions = {
-                'pending': ['processing', 'canceled'],
-                'processing': ['shipped', 'canceled'],
-                'shipped': ['delivered', 'returned'],
-                'delivered': ['returned'],
-                'canceled': [],
-                'returned': []
-            }
+            current_status = Order.objects.filter(id=order_id).values_list('status', flat=True).first()
+            if current_status is None:
+                return False, "Заказ не найден"
             
-            if action not in valid_transitions.get(order.status, []):
-                return False, f"Невозможно изменить статус с {order.status} на {action}"
+            new_status = OrderService.action_status(action)
+            if not can_transition(current_status, new_status):
+                return False, f"Невозможно изменить статус с {current_status} на {new_status}"
             
             return True, "OK"
             
-        except Order.DoesNotExist:
-            return False, "Заказ не найден"
         except Exception as e:
             logger.error(f"Error validating order action: {str(e)}")
-            return False, "Произошла ошибка при проверке" 
\ No newline at end of file
+            return False, "Произошла ошибка при проверке"
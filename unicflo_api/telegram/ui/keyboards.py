@@ -167,12 +167,18 @@ class Keyboards:
             )
             
         elif order.status == 'processing':
-            builder.add_button(
-                f"{Emojis.SHIPPING} Отправить",
-                callback_data=f"ship_order_{order.id}"
-            )
+            if order.delivery_type == 'branch_pickup':
+                builder.add_button(
+                    f"{Emojis.BRANCH} Готов к выдаче",
+                    callback_data=f"ready_order_{order.id}"
+                )
+            else:
+                builder.add_button(
+                    f"{Emojis.SHIPPING} Отправить",
+                    callback_data=f"ship_order_{order.id}"
+                )
             
-        elif order.status == 'shipped':
+        elif order.status in ('shipped', 'ready_for_pickup'):
             builder.add_button(
                 f"{Emojis.SUCCESS} Доставлен",
                 callback_data=f"deliver_order_{order.id}"
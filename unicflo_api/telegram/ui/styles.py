@@ -53,9 +53,21 @@ class Emojis:
     # UI elements
     STORE = "🏪"
     ADMIN = "👨‍💼"
+    USER = "👤"
     LOCATION = "📍"
     PACKAGE = "📦"
+    ORDER = "🧾"
+    SHIPPING = "🚚"
+    RETURN = "↩️"
     TRACKING = "🔍"
+    SEARCH = "🔎"
+    STATS = "📈"
+    CHART = "📊"
+    FIRE = "🔥"
+    SPARKLES = "✨"
+    MANAGE = "🛠️"
+    SETTINGS = "⚙️"
+    HELP = "❓"
     
     # Navigation
     BACK = "⬅️"
@@ -111,6 +123,12 @@ class TextStyles:
         """Format section title."""
         return TextStyles.HEADER.format(text)
         
+    @staticmethod
+    def section_title(text: str, emoji: str = "") -> str:
+        """Format section title with an optional emoji."""
+        emoji_prefix = f"{emoji} " if emoji else ""
+        return f"{emoji_prefix}{TextStyles.bold(text)}\n"
+        
     @staticmethod
     def subheader(text: str) -> str:
         """Format subheader."""
@@ -0,0 +1,10 @@
+from django import template
+
+from ..admin_dashboard import get_dashboard_data
+
+register = template.Library()
+
+
+@register.simple_tag
+def admin_dashboard():
+    return get_dashboard_data()
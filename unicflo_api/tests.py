@@ -1,3 +1,2003 @@
-from django.test import TestCase
+import threading
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import events
+from .cache_backends import TieredRedisCache
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def setUpModule():
+    # Interaction events are only written by tests that flush the buffer themselves
+    events.get_event_buffer().pause()
+
+
+def tearDownModule():
+    buffer = events.get_event_buffer()
+    buffer.discard()
+    buffer.resume()
+
+
+def create_variant(name, stock=10, price='100.00', **product_fields):
+    """An active product with one variant, plus the reference rows it needs"""
+    from decimal import Decimal
+
+    from .models import Category, Color, GenderCategory, Product, ProductVariant, Size, Subcategory
+
+    gender, _ = GenderCategory.objects.get_or_create(name='Unisex', slug='unisex')
+    category, _ = Category.objects.get_or_create(name='Shoes', slug='shoes', gender=gender)
+    subcategory, _ = Subcategory.objects.get_or_create(
+        name='Sneakers', slug='sneakers', category=category, gender=gender
+    )
+    color, _ = Color.objects.get_or_create(name='Black', hex_code='#000000')
+    size, _ = Size.objects.get_or_create(name='42')
+    product = Product.objects.create(
+        name=name, slug=name.lower().replace(' ', '-'), description='-', price=Decimal(price),
+        subcategory=subcategory, gender=gender, **product_fields
+    )
+    return ProductVariant.objects.create(product=product, color=color, size=size, stock=stock)
+
+
+def create_order(user, variant=None, quantity=1, status='pending', **fields):
+    """An order (moved to ``status`` without side effects) with one item of ``variant``"""
+    from .models import Order, OrderItem
+
+    fields.setdefault('customer_name', 'Test Customer')
+    fields.setdefault('phone_number', '+998900000000')
+    order = Order.objects.create(user=user, total_amount=0, final_amount=0, **fields)
+    if variant is not None:
+        OrderItem.objects.create(order=order, product=variant.product, variant=variant, quantity=quantity)
+    if status != order.status:
+        Order.objects.filter(pk=order.pk).update(status=status)
+        order.status = status
+    return order
+
+
+# Process-local caches, so tests neither need Redis nor see each other's entries
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-local'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import caches
+
+        from .models import Color
+
+        for cache in caches.all():
+            cache.clear()
+        Color.objects.create(name='Black', hex_code='#000000')
+
+    def get(self, path='/colors/', **headers):
+        return self.client.get(path, **headers)
+
+    def test_matching_etag_returns_304_without_queries(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # The query string is part of the fingerprint
+        self.assertNotEqual(self.get('/colors/?search=Bl')['ETag'], etag)
+
+    def test_bodies_are_served_from_the_cache(self):
+        first = self.get()
+        with self.assertNumQueries(0):
+            second = self.get()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_writes_bump_the_scope_version(self):
+        from .models import Color, Size
+
+        etag = self.get()['ETag']
+        sizes_etag = self.get('/sizes/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Color.objects.create(name='White', hex_code='#FFFFFF')
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(b'White', response.content)
+        # Other scopes keep their version
+        self.assertEqual(self.get('/sizes/', HTTP_IF_NONE_MATCH=sizes_etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Size.objects.create(name='44')
+        self.assertEqual(self.get('/sizes/', HTTP_IF_NONE_MATCH=sizes_etag).status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        from django.core.cache import caches
+
+        from . import category_tree
+
+        for cache in caches.all():
+            cache.clear()
+        # The blob is process-global; a version left by another test must not match
+        category_tree._tree = (None, None)
+        self.variant = create_variant('Court Shoe')
+        create_variant('Retired Shoe', is_active=False)
+
+    def tree(self, **headers):
+        return self.client.get('/categories/tree/', **headers)
+
+    def test_tree_shape_and_counts(self):
+        import json
+
+        response = self.tree()
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['categories_without_gender'], [])
+        [gender] = data['genders']
+        [category] = gender['categories']
+        [subcategory] = category['subcategories']
+        self.assertEqual((gender['slug'], category['slug'], subcategory['slug']), ('unisex', 'shoes', 'sneakers'))
+        # Inactive products are not counted
+        self.assertEqual((gender['products_count'], category['products_count'], subcategory['products_count']), (1, 1, 1))
+
+    def test_warm_tree_is_served_without_queries_until_the_catalog_changes(self):
+        first = self.tree()
+        with self.assertNumQueries(0):
+            second = self.tree()
+        self.assertEqual(second.content, first.content)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tree(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_variant('Boat Shoe')
+        response = self.tree(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertIn(b'"products_count":2', response.content)
+
+
+@skipUnless(orjson, 'orjson is not installed')
+class ORJSONRendererParserTests(SimpleTestCase):
+    def payload(self):
+        import datetime
+        import decimal
+
+        from django.utils.translation import gettext_lazy
+
+        return {
+            'id': 7,
+            'name': 'Кроссовки «Air» ✓',
+            'separators': 'line\u2028paragraph\u2029end',
+            'price': decimal.Decimal('199.90'),
+            'ratio': 0.1,
+            'created_at': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2024, 5, 1),
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'label': gettext_lazy('Active'),
+            'flags': [True, False, None],
+            'nested': {1: 'int key', 'items': ({'qty': 2},)},
+        }
+
+    def test_output_is_byte_identical_to_json_renderer(self):
+        from rest_framework.renderers import JSONRenderer
+
+        from .renderers import ORJSONRenderer
+
+        expected = JSONRenderer().render(self.payload())
+        self.assertEqual(ORJSONRenderer().render(self.payload()), expected)
+        self.assertIn(b'\\u2028', expected)
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        self.assertEqual(
+            ORJSONRenderer().render({'a': 1}, 'application/json; indent=2'),
+            JSONRenderer().render({'a': 1}, 'application/json; indent=2'),
+        )
+
+    def test_non_finite_floats_follow_strict_json(self):
+        from .renderers import ORJSONRenderer
+
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                ORJSONRenderer().render({'scores': [1.5, {'avg': value}], 'note': None})
+
+        with mock.patch.object(ORJSONRenderer, 'strict', False):
+            self.assertEqual(ORJSONRenderer().render({'avg': float('nan')}), b'{"avg":NaN}')
+
+    def test_parser_matches_json_parser(self):
+        from io import BytesIO
+
+        from rest_framework.exceptions import ParseError
+        from rest_framework.parsers import JSONParser
+
+        from .parsers import ORJSONParser
+
+        body = '{"name": "Ботинки", "qty": 2, "price": 1.25, "tags": [null, true]}'
+        for encoding in ('utf-8', 'utf-16'):
+            with self.subTest(encoding=encoding):
+                context = {'encoding': encoding}
+                self.assertEqual(
+                    ORJSONParser().parse(BytesIO(body.encode(encoding)), parser_context=context),
+                    JSONParser().parse(BytesIO(body.encode(encoding)), parser_context=context),
+                )
+        for invalid in (b'{"a": NaN}', b'{"a": Infinity}', b'{"a": ', b'\xff'):
+            with self.subTest(body=invalid):
+                with self.assertRaises(ParseError):
+                    JSONParser().parse(BytesIO(invalid))
+                with self.assertRaises(ParseError):
+                    ORJSONParser().parse(BytesIO(invalid))
+
+
+class ProjectionTests(TestCase):
+    CARD = {'id', 'name', 'slug', 'price', 'discount_price', 'brand', 'images', 'likes_count', 'is_liked'}
+
+    def setUp(self):
+        from .models import Brand, User
+
+        self.user = User.objects.create(username='viewer', telegram_id='3001')
+        self.variant = create_variant('Runner', brand=Brand.objects.create(name='Acme', slug='acme'))
+
+    def products(self, **params):
+        return self.client.get('/products/', params)
+
+    def test_fields_profiles_and_dotted_names(self):
+        [product] = self.products(fields='id,name').json()['results']
+        self.assertEqual(set(product), {'id', 'name'})
+
+        [product] = self.products(fields='id,brand.name').json()['results']
+        self.assertEqual(product, {'id': self.variant.product_id, 'brand': {'name': 'Acme'}})
+
+        [product] = self.products(profile='card').json()['results']
+        self.assertEqual(set(product), self.CARD)
+        self.assertEqual(set(product['brand']), {'id', 'name', 'logo'})
+
+        [product] = self.products(profile='card', expand='variants').json()['results']
+        self.assertEqual(set(product), self.CARD | {'variants'})
+
+    def test_unknown_names_are_rejected(self):
+        cases = [
+            ({'fields': 'id,nope'}, 'fields', 'Unknown fields: nope'),
+            ({'fields': 'id,brand.nope,brand.other'}, 'fields', 'Unknown fields: brand.nope, brand.other'),
+            ({'profile': 'card', 'expand': 'bogus'}, 'expand', 'Unknown fields: bogus'),
+        ]
+        for params, param, message in cases:
+            with self.subTest(**params):
+                response = self.products(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {param: [message]})
+
+    def test_projected_queryset_does_not_grow_with_rows(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def queries(**params):
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.products(**params).status_code, 200)
+            return len(captured)
+
+        lean, card = queries(fields='id,name'), queries(profile='card')
+        for i in range(5):
+            create_variant(f'Walker {i}')
+        self.assertEqual(queries(fields='id,name'), lean)
+        self.assertEqual(queries(profile='card'), card)
+        self.assertLess(lean, card)
+
+    def test_order_items_embed_full_products_unless_cards_are_requested(self):
+        create_order(self.user, self.variant)
+        headers = {'HTTP_X_TELEGRAM_ID': self.user.telegram_id}
+
+        [order] = self.client.get('/orders/', **headers).json()['results']
+        product = order['items'][0]['product']
+        self.assertTrue({'description', 'variants', 'subcategory'} <= set(product))
+
+        [order] = self.client.get('/orders/', {'profile': 'card'}, **headers).json()['results']
+        self.assertIn('shipping_info', order)
+        self.assertEqual(set(order['items'][0]['product']), self.CARD)
+
+
+class WishlistToggleTests(TestCase):
+    def setUp(self):
+        from .models import User, Wishlist
+
+        self.user = User.objects.create(username='collector', telegram_id='3101')
+        self.wishlist = Wishlist.objects.create(user=self.user)
+        self.product = create_variant('Sandal', price='80.00', discount_price='60.00').product
+
+    def liked(self, product=None):
+        from .models import UserProductInteraction
+
+        product = product or self.product
+        return UserProductInteraction.objects.filter(kind='like', user=self.user, product=product).exists()
+
+    def toggle(self, product):
+        return self.client.post(
+            '/wishlist/add/', {'product_id': product.pk}, content_type='application/json',
+            HTTP_X_TELEGRAM_ID=self.user.telegram_id
+        )
+
+    def test_toggle_adds_then_removes_and_keeps_likes_in_step(self):
+        self.assertTrue(self.wishlist.toggle_product(self.product))
+        self.assertTrue(self.wishlist.has_product(self.product))
+        self.assertTrue(self.liked())
+
+        self.assertFalse(self.wishlist.toggle_product(self.product))
+        self.assertFalse(self.wishlist.has_product(self.product))
+        self.assertFalse(self.liked())
+        self.assertFalse(self.wishlist.remove_product(self.product))
+
+    def test_like_stays_while_another_wishlist_holds_the_product(self):
+        from .models import Wishlist
+
+        other = Wishlist.objects.create(user=self.user, name='Gifts')
+        self.wishlist.add_product(self.product)
+        other.add_product(self.product)
+        self.wishlist.add_product(self.product)
+
+        self.assertTrue(self.wishlist.remove_product(self.product))
+        self.assertTrue(self.liked())
+        other.clear()
+        self.assertFalse(self.liked())
+
+    def test_totals(self):
+        self.wishlist.add_product(self.product)
+        self.wishlist.add_product(create_variant('Clog', price='40.00').product)
+
+        self.assertEqual(self.wishlist.get_products_count(), 2)
+        self.assertEqual(self.wishlist.get_total_value(), 120)
+        self.assertEqual(self.wishlist.get_discounted_value(), 100)
+        self.assertEqual(self.wishlist.get_savings(), 20)
+
+    def test_endpoint_toggles_with_constant_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.wishlist.add_product(create_variant('Slipper').product)
+        response = self.toggle(self.product)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_liked'])
+        self.assertEqual(response.json()['wishlist']['products_count'], 2)
+
+        def toggle_queries():
+            with CaptureQueriesContext(connection) as captured:
+                self.assertFalse(self.toggle(self.product).json()['is_liked'])
+            with CaptureQueriesContext(connection) as captured_again:
+                self.assertTrue(self.toggle(self.product).json()['is_liked'])
+            return len(captured), len(captured_again)
+
+        small = toggle_queries()
+        for i in range(5):
+            self.wishlist.add_product(create_variant(f'Mule {i}').product)
+        self.assertEqual(toggle_queries(), small)
+
+
+class WishlistAdminTests(TestCase):
+    def setUp(self):
+        from .models import User, Wishlist
+
+        admin = User.objects.create_superuser(username='admin', password='admin', email='admin@example.com')
+        self.client.force_login(admin)
+        self.user = User.objects.create(username='collector', telegram_id='3201')
+        self.wishlist = Wishlist.objects.create(user=self.user)
+        self.sandal, self.clog, self.boot = [create_variant(name).product for name in ('Sandal', 'Clog', 'Boot')]
+        self.wishlist.add_product(self.sandal)
+        self.wishlist.add_product(self.clog)
+        self.url = f'/admin/unicflo_api/wishlist/{self.wishlist.pk}/change/'
+
+    def post_rows(self, products, delete=()):
+        """Resubmit the change form with the inline rows pointing at ``products``"""
+        response = self.client.get(self.url)
+        formset = response.context['inline_admin_formsets'][0].formset
+        data = {
+            key: value for key, value in response.context['adminform'].form.initial.items()
+            if value is not None and not isinstance(value, bool)
+        }
+        data.update({
+            f'{formset.prefix}-TOTAL_FORMS': len(formset.forms),
+            f'{formset.prefix}-INITIAL_FORMS': len(formset.initial_forms),
+        })
+        for index, (inline_form, product) in enumerate(zip(formset.forms, products)):
+            data[f'{formset.prefix}-{index}-id'] = inline_form.instance.pk
+            data[f'{formset.prefix}-{index}-wishlist'] = self.wishlist.pk
+            data[f'{formset.prefix}-{index}-product'] = product.pk
+            if inline_form.instance.product in delete:
+                data[f'{formset.prefix}-{index}-DELETE'] = 'on'
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+
+    def liked(self):
+        from .models import UserProductInteraction
+
+        return set(UserProductInteraction.objects.filter(kind='like', user=self.user).values_list('product__name', flat=True))
+
+    def test_edited_row_replaces_the_product(self):
+        self.post_rows([self.sandal, self.boot])
+
+        self.assertEqual(set(self.wishlist.products.values_list('name', flat=True)), {'Sandal', 'Boot'})
+        self.assertEqual(self.liked(), {'Sandal', 'Boot'})
+
+    def test_deleted_row_drops_the_product_and_its_like(self):
+        self.post_rows([self.sandal, self.clog], delete=[self.clog])
+
+        self.assertEqual(list(self.wishlist.products.values_list('name', flat=True)), ['Sandal'])
+        self.assertEqual(self.liked(), {'Sandal'})
+
+
+class EventBufferTests(TestCase):
+    def setUp(self):
+        from .models import User
+
+        self.user = User.objects.create(username='browser', telegram_id='3301')
+        self.product = create_variant('Espadrille').product
+
+    def make_buffer(self, capacity=100, batch_size=2):
+        buffer = events.EventBuffer(capacity=capacity, batch_size=batch_size, flush_interval=60)
+        # No background thread: the test flushes explicitly
+        buffer.pause()
+        return buffer
+
+    def test_flush_writes_interactions_in_batches_and_scores_them(self):
+        from .models import ProductPopularity, UserProductInteraction
+
+        buffer = self.make_buffer(batch_size=2)
+        for kind in ('view', 'view', 'cart_add'):
+            buffer.record(self.user.pk, self.product.pk, kind)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(buffer.get_stats()['buffered'], 3)
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(
+            sorted(UserProductInteraction.objects.filter(user=self.user).values_list('kind', flat=True)),
+            ['cart_add', 'view', 'view'],
+        )
+        self.assertAlmostEqual(ProductPopularity.objects.get(product=self.product).score, 5, places=2)
+        self.assertEqual(buffer.get_stats(), {'buffered': 0, 'recorded': 3, 'flushed': 3, 'dropped': 0, 'failed': 0})
+
+    def test_full_buffer_drops_the_oldest_events(self):
+        from .models import UserProductInteraction
+
+        buffer = self.make_buffer(capacity=2)
+        for kind in ('view', 'cart_add', 'wishlist_add'):
+            buffer.record(self.user.pk, self.product.pk, kind)
+
+        self.assertEqual(buffer.get_stats()['dropped'], 1)
+        buffer.flush()
+        self.assertEqual(
+            set(UserProductInteraction.objects.values_list('kind', flat=True)), {'cart_add', 'wishlist_add'}
+        )
+
+    def test_failed_batches_are_counted_not_retried(self):
+        from django.db import DatabaseError
+
+        buffer = self.make_buffer()
+        buffer.record(self.user.pk, self.product.pk, 'view')
+        with mock.patch.object(events.UserProductInteraction, 'bulk_ingest', side_effect=DatabaseError('down')):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.get_stats()['failed'], 1)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_record_event_skips_anonymous_users_and_disabled_buffers(self):
+        from django.contrib.auth.models import AnonymousUser
+
+        buffer = self.make_buffer()
+        with mock.patch.object(events, 'get_event_buffer', return_value=buffer):
+            events.record_event(AnonymousUser(), self.product, 'view')
+            events.record_event(None, self.product, 'view')
+            with override_settings(INTERACTION_EVENTS={'ENABLED': False}):
+                events.record_event(self.user, self.product, 'view')
+            self.assertEqual(buffer.get_stats()['recorded'], 0)
+
+            events.record_event(self.user, self.product.pk, 'view')
+        self.assertEqual(buffer.get_stats()['recorded'], 1)
+
+    def test_pause_stops_the_flusher_and_keeps_events(self):
+        buffer = events.EventBuffer(capacity=100, batch_size=10, flush_interval=60)
+        buffer.record(self.user.pk, self.product.pk, 'view')
+        self.assertTrue(buffer._thread.is_alive())
+
+        buffer.pause()
+        self.assertFalse(buffer._thread.is_alive())
+        buffer.record(self.user.pk, self.product.pk, 'view')
+        self.assertFalse(buffer._thread.is_alive())
+        self.assertEqual(buffer.discard(), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PopularityTests(TestCase):
+    def setUp(self):
+        from django.core.cache import caches
+
+        from .models import User
+
+        caches['default'].clear()
+        self.user = User.objects.create(username='trendsetter', telegram_id='3401')
+        self.first = create_variant('Chelsea Boot')
+        self.second = create_variant('Derby')
+
+    def test_purchases_are_buffered_until_commit_and_scored_by_the_flusher(self):
+        from .models import ProductPopularity, UserProductInteraction
+
+        buffer = events.EventBuffer(capacity=100, batch_size=100, flush_interval=60)
+        buffer.pause()
+        with mock.patch.object(events, 'get_event_buffer', return_value=buffer):
+            with self.captureOnCommitCallbacks(execute=True):
+                create_order(self.user, self.first, quantity=2)
+                self.assertEqual(buffer.get_stats()['recorded'], 0)
+            # Nothing written or locked inside the checkout transaction
+            self.assertFalse(UserProductInteraction.objects.filter(kind='purchase').exists())
+            self.assertFalse(ProductPopularity.objects.exists())
+
+            with override_settings(INTERACTION_EVENTS={'ENABLED': False}):
+                with self.captureOnCommitCallbacks(execute=True):
+                    create_order(self.user, self.second)
+
+        self.assertEqual(buffer.flush(), 1)
+        purchase = UserProductInteraction.objects.get(kind='purchase')
+        self.assertEqual((purchase.user, purchase.product_id, purchase.quantity), (self.user, self.first.product_id, 2))
+        self.assertAlmostEqual(ProductPopularity.objects.get().score, 20, places=2)
+
+    def test_scores_decay_with_the_configured_half_life(self):
+        from .models import ProductPopularity
+        from .popularity import add_events
+
+        three_days_ago = timezone.now() - timedelta(hours=72)
+        # Kinds without a weight are ignored
+        add_events([
+            (self.first.product_id, 'purchase', 1, three_days_ago),
+            (self.first.product_id, 'refund', 1, three_days_ago),
+        ])
+        self.assertAlmostEqual(ProductPopularity.objects.get().score, 5, places=2)
+
+    def test_trending_is_empty_until_rankings_are_published(self):
+        from .models import Product
+        from .popularity import add_events, get_trending_ids, refresh_rankings
+
+        now = timezone.now()
+        add_events([(self.first.product_id, 'view', 1, now), (self.second.product_id, 'purchase', 1, now)])
+        # A cold cache never triggers the aggregation at request time
+        with self.assertNumQueries(0):
+            self.assertEqual(get_trending_ids(), [])
+
+        refresh_rankings()
+        self.assertEqual(get_trending_ids(), [self.second.product_id, self.first.product_id])
+        self.assertEqual(get_trending_ids(f'gender:{self.first.product.gender_id}'), get_trending_ids())
+        self.assertEqual(get_trending_ids('category:0'), [])
+
+        Product.objects.filter(pk=self.second.product_id).update(is_active=False)
+        refresh_rankings()
+        response = self.client.get('/products/trending/', {'limit': 5})
+        self.assertEqual([product['id'] for product in response.json()], [self.first.product_id])
+
+
+class InteractionStoreMigrationTests(TransactionTestCase):
+    """0020 copies likes and wishlist membership into UserProductInteraction, and back"""
+
+    before = [('unicflo_api', '0019_catalogversion')]
+    after = [('unicflo_api', '0020_userproductinteraction')]
+
+    def migrate(self, targets):
+        from django.db import connection
+        from django.db.migrations.executor import MigrationExecutor
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        from django.db import connection
+        from django.db.migrations.executor import MigrationExecutor
+
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_backfill_and_reverse(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('unicflo_api', 'User')
+        Product = apps.get_model('unicflo_api', 'Product')
+        Wishlist = apps.get_model('unicflo_api', 'Wishlist')
+        GenderCategory = apps.get_model('unicflo_api', 'GenderCategory')
+        Category = apps.get_model('unicflo_api', 'Category')
+        Subcategory = apps.get_model('unicflo_api', 'Subcategory')
+
+        gender = GenderCategory.objects.create(name='Unisex', slug='unisex')
+        category = Category.objects.create(name='Shoes', slug='shoes', gender=gender)
+        subcategory = Subcategory.objects.create(name='Boots', slug='boots', category=category, gender=gender)
+        shoe, boot, hat = [
+            Product.objects.create(name=name, slug=name, description='-', price=10, subcategory=subcategory, gender=gender)
+            for name in ('shoe', 'boot', 'hat')
+        ]
+        alice = User.objects.create(username='alice', telegram_id='3201')
+        bob = User.objects.create(username='bob', telegram_id='3202')
+        shoe.likes.add(alice, bob)
+        main, gifts = Wishlist.objects.create(user=alice), Wishlist.objects.create(user=alice)
+        main.products.add(shoe, boot)
+        gifts.products.add(boot)
+        bobs = Wishlist.objects.create(user=bob)
+        bobs.products.add(hat)
+
+        apps = self.migrate(self.after)
+        interactions = apps.get_model('unicflo_api', 'UserProductInteraction').objects
+        # Liked directly or through a wishlist, once per user and product
+        self.assertEqual(
+            set(interactions.filter(kind='like').values_list('user__username', 'product__slug')),
+            {('alice', 'shoe'), ('alice', 'boot'), ('bob', 'shoe'), ('bob', 'hat')},
+        )
+        self.assertEqual(interactions.filter(kind='like').count(), 4)
+        self.assertEqual(
+            sorted(interactions.filter(kind='wishlist').values_list('wishlist_id', 'product__slug')),
+            sorted([(main.pk, 'shoe'), (main.pk, 'boot'), (gifts.pk, 'boot'), (bobs.pk, 'hat')]),
+        )
+
+        apps = self.migrate(self.before)
+        Product = apps.get_model('unicflo_api', 'Product')
+        Wishlist = apps.get_model('unicflo_api', 'Wishlist')
+        self.assertEqual(set(Product.objects.get(slug='shoe').likes.values_list('username', flat=True)), {'alice', 'bob'})
+        self.assertEqual(set(Wishlist.objects.get(pk=main.pk).products.values_list('slug', flat=True)), {'shoe', 'boot'})
+
+
+@skipUnless(fakeredis, 'fakeredis is not installed')
+class TieredRedisCacheTests(SimpleTestCase):
+    def make_cache(self, server=None, **options):
+        server = server or fakeredis.FakeServer()
+        options.setdefault('CLIENT_CLASS', 'fakeredis.FakeRedis')
+        options.setdefault('CLIENT_KWARGS', {'server': server})
+        # A unique prefix keeps the per-process local tier isolated between tests
+        return TieredRedisCache('redis://localhost:6379/1', {
+            'KEY_PREFIX': uuid.uuid4().hex,
+            'TIMEOUT': 60,
+            'OPTIONS': options,
+        })
+
+    def test_reads_fall_through_to_redis_and_populate_local_tier(self):
+        cache = self.make_cache()
+        cache.set('answer', {'value': 42})
+        # Simulate another worker process: empty local tier, shared Redis
+        cache._state.local.clear()
+
+        self.assertEqual(cache.get('answer'), {'value': 42})
+        self.assertEqual(cache.get('answer'), {'value': 42})
+
+        stats = cache.get_stats()
+        self.assertEqual(stats['l2_hits'], 1)
+        self.assertEqual(stats['l1_hits'], 1)
+
+    def test_versioning_spans_both_tiers(self):
+        cache = self.make_cache()
+        cache.set('key', 'v1')
+        cache.incr_version('key')
+        self.assertIsNone(cache.get('key', version=1))
+        self.assertEqual(cache.get('key', version=2), 'v1')
+
+    def test_delete_and_clear(self):
+        cache = self.make_cache()
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.assertTrue(cache.delete('a'))
+        self.assertIsNone(cache.get('a'))
+        cache.clear()
+        self.assertIsNone(cache.get('b'))
+
+    def test_falls_back_to_local_tier_when_redis_is_down(self):
+        server = fakeredis.FakeServer()
+        server.connected = False
+        cache = self.make_cache(server, RETRY_AFTER=60)
+
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertTrue(cache.add('other', 1))
+        self.assertFalse(cache.add('other', 2))
+
+        stats = cache.get_stats()
+        self.assertFalse(stats['redis_available'])
+        self.assertEqual(stats['errors'], 1)
+
+    def test_get_or_set_computes_once_under_concurrency(self):
+        cache = self.make_cache()
+        calls = []
+
+        def expensive():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'computed'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_set('hot', expensive)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['computed'] * 8)
+
+    def test_get_or_set_waits_for_lock_held_by_another_worker(self):
+        server = fakeredis.FakeServer()
+        cache = self.make_cache(server, LOCK_POLL_INTERVAL=0.01)
+        other_worker = fakeredis.FakeRedis(server=server, db=1)
+        full_key = cache.make_key('hot')
+        other_worker.set(f'{full_key}:lock', 'token', px=5000)
+
+        def finish_elsewhere():
+            time.sleep(0.05)
+            cache.set('hot', 'from-other-worker')
+            other_worker.delete(f'{full_key}:lock')
+
+        thread = threading.Thread(target=finish_elsewhere)
+        thread.start()
+        value = cache.get_or_set('hot', lambda: 'computed-here')
+        thread.join()
+
+        self.assertEqual(value, 'from-other-worker')
+        self.assertEqual(cache.get_stats()['lock_waits'], 1)
+
+    def test_incr_is_atomic_across_workers(self):
+        server = fakeredis.FakeServer()
+        cache = self.make_cache(server)
+        # A second process: its own local tier, same Redis and key prefix
+        other = self.make_cache(server)
+        other.key_prefix = cache.key_prefix
+        other._state = type(cache._state)(100)
+
+        cache.set('waiting', 0)
+        self.assertEqual(other.get('waiting'), 0)
+        cache.incr('waiting')
+        other.incr('waiting')
+        cache.incr('waiting')
+
+        self.assertEqual(cache.get('waiting'), 3)
+        self.assertEqual(other.get('waiting'), 3)
+        self.assertEqual(other.decr('waiting', 2), 1)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_incr_keeps_the_ttl_and_never_recreates_a_key(self):
+        server = fakeredis.FakeServer()
+        cache = self.make_cache(server)
+        redis = fakeredis.FakeRedis(server=server, db=1)
+        full_key = cache.make_key('counter')
+
+        cache.set('counter', 5, timeout=30)
+        cache.incr('counter', 2)
+        self.assertEqual(redis.get(full_key), b'7')
+        self.assertGreater(redis.pttl(full_key), 0)
+
+        # Expired in Redis while the local tier still holds a copy
+        redis.delete(full_key)
+        with self.assertRaises(ValueError):
+            cache.incr('counter')
+        self.assertFalse(redis.exists(full_key))
+        self.assertIsNone(cache.get('counter'))
+
+        cache.set('counter', 0)
+        threads = [
+            threading.Thread(target=lambda: [cache.incr('counter') for _ in range(25)])
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.get('counter'), 200)
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Changelist pages must not issue queries per row"""
+
+    CHANGELISTS = ['product', 'productvariant', 'cart', 'cartitem', 'order', 'category', 'subcategory', 'wishlist']
+    MAX_QUERIES = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        from .models import User
+
+        cls.admin = User.objects.create_superuser(username='admin', password='admin', email='admin@example.com')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, batch, count):
+        from decimal import Decimal
+
+        from .models import (
+            Brand, Cart, CartItem, Category, Color, GenderCategory, Order, Product,
+            ProductImage, ProductVariant, Size, Subcategory, User, Wishlist,
+        )
+
+        gender = GenderCategory.objects.create(name=f'Gender {batch}', slug=f'gender-{batch}')
+        brand = Brand.objects.create(name=f'Brand {batch}', slug=f'brand-{batch}')
+        color = Color.objects.create(name=f'Color {batch}', hex_code='#000000')
+        size = Size.objects.create(name=f'Size {batch}')
+        for i in range(count):
+            category = Category.objects.create(name=f'Category {batch}-{i}', slug=f'category-{batch}-{i}', gender=gender)
+            subcategory = Subcategory.objects.create(
+                name=f'Subcategory {batch}-{i}', slug=f'subcategory-{batch}-{i}', category=category, gender=gender
+            )
+            product = Product.objects.create(
+                name=f'Product {batch}-{i}', slug=f'product-{batch}-{i}', description='-',
+                price=Decimal('100.00'), subcategory=subcategory, brand=brand, gender=gender
+            )
+            variant = ProductVariant.objects.create(product=product, color=color, size=size, stock=i)
+            ProductImage.objects.create(product=product, color=color, image='product.jpg', is_primary=True)
+            user = User.objects.create(username=f'user-{batch}-{i}', telegram_id=f'{batch}{i}')
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=product, variant=variant, quantity=2)
+            Order.objects.create(user=user, customer_name='-', phone_number='-', total_amount=0, final_amount=0)
+            Wishlist.objects.create(user=user).add_product(product)
+
+    def changelist_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        counts = {}
+        for name in self.CHANGELISTS:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f'/admin/unicflo_api/{name}/')
+            self.assertEqual(response.status_code, 200, name)
+            counts[name] = len(queries.captured_queries)
+        return counts
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_rows('a', 3)
+        small = self.changelist_queries()
+        self.add_rows('b', 6)
+        large = self.changelist_queries()
+
+        self.assertEqual(small, large)
+        for name, count in large.items():
+            self.assertLessEqual(count, self.MAX_QUERIES, name)
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='123:test', OUTBOX={'MAX_ATTEMPTS': 2, 'RETRY_BACKOFF': 30})
+class OutboxTests(TestCase):
+    def queue(self, *chat_ids):
+        from .models import StockAlertNotification
+        from .outbox import enqueue
+
+        enqueue(StockAlertNotification, [
+            StockAlertNotification(chat_id=chat_id, idempotency_key=f'test:{chat_id}', message='low stock')
+            for chat_id in chat_ids
+        ])
+
+    def send(self, side_effect):
+        from .models import StockAlertNotification
+        from .outbox import send_pending
+
+        with mock.patch('unicflo_api.outbox.Bot') as bot_class:
+            bot = bot_class.return_value
+            bot.send_message = mock.AsyncMock(side_effect=side_effect)
+            bot.shutdown = mock.AsyncMock()
+            return send_pending(StockAlertNotification, rate=1000)
+
+    def statuses(self):
+        from .models import StockAlertNotification
+
+        return dict(StockAlertNotification.objects.values_list('chat_id', 'status'))
+
+    def test_transient_errors_are_retried_with_backoff_then_fail(self):
+        from telegram.error import Forbidden, TimedOut
+
+        from .models import StockAlertNotification
+
+        self.queue('ok', 'blocked', 'flaky')
+
+        def reply(chat_id, **kwargs):
+            if chat_id == 'blocked':
+                raise Forbidden('bot was blocked by the user')
+            if chat_id == 'flaky':
+                raise TimedOut()
+
+        self.assertEqual(self.send(reply), (1, 1))
+        self.assertEqual(self.statuses(), {'ok': 'sent', 'blocked': 'failed', 'flaky': 'pending'})
+        flaky = StockAlertNotification.objects.get(chat_id='flaky')
+        self.assertEqual(flaky.attempts, 1)
+        self.assertGreater(flaky.next_attempt_at, timezone.now() + timedelta(seconds=20))
+
+        # Not due yet, then retried until MAX_ATTEMPTS
+        self.assertEqual(self.send(reply), (0, 0))
+        StockAlertNotification.objects.filter(chat_id='flaky').update(next_attempt_at=timezone.now())
+        self.assertEqual(self.send(reply), (0, 1))
+        self.assertEqual(self.statuses()['flaky'], 'failed')
+
+    def test_flood_wait_holds_back_the_rest_of_the_batch(self):
+        from telegram.error import RetryAfter
+
+        from .models import StockAlertNotification
+
+        self.queue('a', 'b', 'c')
+        calls = []
+
+        def reply(chat_id, **kwargs):
+            calls.append(chat_id)
+            if chat_id == 'b':
+                raise RetryAfter(120)
+
+        self.assertEqual(self.send(reply), (1, 0))
+        self.assertEqual(calls, ['a', 'b'])
+        held = StockAlertNotification.objects.get(chat_id='c')
+        self.assertEqual((held.status, held.attempts), ('pending', 0))
+        self.assertGreater(held.next_attempt_at, timezone.now() + timedelta(seconds=100))
+
+    def test_abandoned_claims_are_reclaimed(self):
+        from .models import StockAlertNotification
+
+        self.queue('stuck')
+        StockAlertNotification.objects.update(
+            status='sending', attempts=1, claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(self.send(None), (1, 0))
+        self.assertEqual(StockAlertNotification.objects.get().attempts, 2)
+
+
+class CartReminderTests(TestCase):
+    def setUp(self):
+        self.variant = create_variant('Canvas_Shoe')
+        self.idle = timezone.now() - timedelta(days=2)
+        self.first = self.cart('first', updated_at=self.idle)
+        self.second = self.cart('second', updated_at=self.idle + timedelta(minutes=1))
+        self.cart('recent', updated_at=timezone.now() - timedelta(hours=1))
+        self.cart('expired', updated_at=timezone.now() - timedelta(days=10))
+        self.cart('inactive', updated_at=self.idle, is_active=False)
+        self.cart('emptied', updated_at=self.idle, is_deleted=True)
+
+    def cart(self, name, updated_at, is_active=True, is_deleted=False):
+        from .models import Cart, CartItem, User
+
+        user = User.objects.create(username=name, telegram_id=f'chat-{name}')
+        cart = Cart.objects.create(user=user, is_active=is_active)
+        CartItem.objects.create(cart=cart, product=self.variant.product, variant=self.variant, quantity=2,
+                                is_deleted=is_deleted)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=updated_at)
+        cart.refresh_from_db()
+        return cart
+
+    def test_only_idle_carts_with_live_items_are_queued(self):
+        from .cart_reminders import enqueue_reminders, idempotency_key
+        from .models import CartReminder
+
+        # Batches of one walk the keyset pagination
+        self.assertEqual(enqueue_reminders(batch_size=1), (2, 2))
+        reminders = {reminder.cart_id: reminder for reminder in CartReminder.objects.all()}
+        self.assertEqual(set(reminders), {self.first.id, self.second.id})
+        first = reminders[self.first.id]
+        self.assertEqual(first.chat_id, 'chat-first')
+        self.assertEqual(first.idempotency_key, idempotency_key(self.first))
+        self.assertIn('2x Canvas\\_Shoe', first.message)
+
+    def test_a_cart_gets_one_reminder_per_idle_period(self):
+        from .cart_reminders import enqueue_reminders
+        from .models import Cart, CartReminder
+
+        enqueue_reminders()
+        self.assertEqual(enqueue_reminders(), (2, 0))
+        self.assertEqual(CartReminder.objects.count(), 2)
+
+        # Touched again and abandoned again: a new idle period, a new reminder
+        Cart.objects.filter(pk=self.first.pk).update(updated_at=self.idle + timedelta(hours=1))
+        self.assertEqual(enqueue_reminders(), (2, 1))
+        self.assertEqual(CartReminder.objects.filter(cart=self.first).count(), 2)
+
+
+class SchedulerTests(SimpleTestCase):
+    JOBS = [('check', 60, []), ('compact_carts', 24 * 60 * 60, [], 3600), ('send_stock_alerts', 60, [], 0)]
+
+    def test_jobs_start_after_their_offset(self):
+        from .scheduler import load_jobs, run_due
+
+        with override_settings(SCHEDULER={'JOBS': self.JOBS}):
+            started = time.monotonic()
+            check, compact, alerts = load_jobs()
+        self.assertTrue(started <= check.next_run <= started + 60 + 1)
+        self.assertTrue(started + 3600 <= compact.next_run <= started + 3600 + 1)
+        self.assertFalse(compact.due(started + 60))
+        self.assertTrue(alerts.due(time.monotonic()))
+
+        with mock.patch('unicflo_api.scheduler.call_command') as call_command:
+            self.assertEqual(run_due([check, compact], now=started + 61), ['check'])
+            self.assertEqual(run_due([check, compact], now=float('inf')), ['check', 'compact_carts'])
+        self.assertEqual([call.args[0] for call in call_command.call_args_list], ['check', 'check', 'compact_carts'])
+
+    def test_failing_job_is_retried_on_its_next_tick(self):
+        from .scheduler import Job
+
+        job = Job('check', 60, offset=0)
+        with mock.patch('unicflo_api.scheduler.call_command', side_effect=RuntimeError('boom')), \
+                self.assertLogs('unicflo_api.scheduler', 'ERROR'):
+            job.run()
+        self.assertFalse(job.due(time.monotonic()))
+        self.assertTrue(job.due(time.monotonic() + 60))
+
+
+class OrderWorkflowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import User
+
+        cls.user = User.objects.create(username='customer', telegram_id='1001')
+        cls.admin = User.objects.create(username='manager', telegram_id='1002', is_staff=True)
+
+    def setUp(self):
+        self.variant = create_variant('Runner', stock=3)
+
+    def test_allowed_transition_writes_history_and_notification(self):
+        from .models import OrderNotification, OrderStatusEvent
+        from .order_workflow import transition_order
+
+        order = create_order(self.user, self.variant)
+        transition_order(order, 'processing', actor=self.admin, note='picked')
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'processing')
+        event = OrderStatusEvent.objects.get(order=order, to_status='processing')
+        self.assertEqual((event.from_status, event.actor, event.note), ('pending', self.admin, 'picked'))
+        self.assertEqual(OrderNotification.objects.filter(order=order).count(), 1)
+
+    def test_forbidden_transition_changes_nothing(self):
+        from .models import OrderStatusEvent
+        from .order_workflow import TransitionError, can_transition, transition_order
+
+        self.assertFalse(can_transition('delivered', 'processing'))
+        self.assertTrue(can_transition('delivered', 'returned'))
+        order = create_order(self.user, self.variant, status='delivered')
+        with self.assertRaises(TransitionError):
+            transition_order(order, 'processing')
+        with self.assertRaises(TransitionError):
+            transition_order(order, 'no-such-status')
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'delivered')
+        self.assertFalse(OrderStatusEvent.objects.filter(order=order, to_status='processing').exists())
+
+    def test_bulk_transition_reports_rejected_orders(self):
+        from .order_workflow import transition
+
+        pending = create_order(self.user, self.variant)
+        shipped = create_order(self.user, self.variant, status='shipped')
+        changed, rejected = transition([pending.pk, shipped.pk], 'processing')
+
+        self.assertEqual(changed, [pending.pk])
+        self.assertEqual(rejected, {shipped.pk: 'shipped'})
+
+    def test_cancel_releases_reserved_stock_once(self):
+        from .models import Order, Product
+        from .order_workflow import transition_order
+
+        order = create_order(self.user, self.variant, quantity=2, stock_reserved=True)
+        transition_order(order, 'canceled')
+
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 5)
+        self.assertEqual(Product.objects.get(pk=self.variant.product_id).total_stock, 5)
+        self.assertEqual(Order.release_reserved_stock([order.pk]), 0)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 5)
+
+    def test_delete_cancels_through_the_state_machine(self):
+        from .models import OrderStatusEvent
+
+        order = create_order(self.user, self.variant, quantity=2, stock_reserved=True)
+        response = self.client.delete(f'/orders/{order.pk}/', HTTP_X_TELEGRAM_ID=self.user.telegram_id)
+
+        self.assertEqual(response.status_code, 204)
+        order.refresh_from_db()
+        self.variant.refresh_from_db()
+        self.assertEqual(order.status, 'canceled')
+        self.assertEqual(self.variant.stock, 5)
+        self.assertTrue(OrderStatusEvent.objects.filter(order=order, from_status='pending', to_status='canceled').exists())
+
+        processing = create_order(self.user, self.variant, status='processing')
+        response = self.client.delete(f'/orders/{processing.pk}/', HTTP_X_TELEGRAM_ID=self.user.telegram_id)
+        self.assertEqual(response.status_code, 400)
+
+    def test_cancel_endpoint_only_cancels_pending_orders(self):
+        pending = create_order(self.user, self.variant)
+        response = self.client.post(f'/orders/{pending.pk}/cancel/', {'reason': 'changed my mind'},
+                                    HTTP_X_TELEGRAM_ID=self.user.telegram_id)
+        self.assertEqual(response.status_code, 200)
+        pending.refresh_from_db()
+        self.assertEqual((pending.status, pending.order_note), ('canceled', 'changed my mind'))
+
+        # Staff included: orders past pending go through the status endpoint
+        processing = create_order(self.user, self.variant, status='processing')
+        response = self.client.post(f'/orders/{processing.pk}/cancel/', HTTP_X_TELEGRAM_ID=self.admin.telegram_id)
+        self.assertEqual(response.status_code, 400)
+        processing.refresh_from_db()
+        self.assertEqual(processing.status, 'processing')
+
+
+class CartOperationsTests(TestCase):
+    def setUp(self):
+        from .models import Cart, User
+
+        self.user = User.objects.create(username='shopper', telegram_id='2001')
+        self.cart = Cart.objects.create(user=self.user)
+        self.shoe = create_variant('Trail Shoe', stock=5)
+        self.boot = create_variant('Winter Boot', stock=2)
+
+    def op(self, op, variant, quantity=0):
+        return {'op': op, 'product': variant.product, 'variant': variant, 'quantity': quantity}
+
+    def quantities(self):
+        return dict(self.cart.active_items.values_list('variant_id', 'quantity'))
+
+    def test_operations_are_folded_per_item(self):
+        added = self.cart.apply_operations([
+            self.op('add', self.shoe, 1), self.op('add', self.shoe, 2), self.op('add', self.boot, 1),
+        ])
+
+        self.assertEqual(added, {(self.shoe.product_id, self.shoe.id): 3, (self.boot.product_id, self.boot.id): 1})
+        self.assertEqual(self.quantities(), {self.shoe.id: 3, self.boot.id: 1})
+
+        self.cart.apply_operations([self.op('update', self.shoe, 4), self.op('remove', self.boot)])
+        self.assertEqual(self.quantities(), {self.shoe.id: 4})
+
+    def test_removed_items_are_revived_not_duplicated(self):
+        self.cart.apply_operations([self.op('add', self.boot, 1)])
+        self.cart.apply_operations([self.op('remove', self.boot)])
+        self.assertEqual(self.quantities(), {})
+
+        self.cart.apply_operations([self.op('add', self.boot, 2)])
+        self.assertEqual(self.quantities(), {self.boot.id: 2})
+        self.assertEqual(self.cart.items.count(), 1)
+        self.assertIsNone(self.cart.items.get().deleted_at)
+
+    def test_stock_is_checked_against_the_final_quantity(self):
+        with self.assertRaises(ValueError):
+            self.cart.apply_operations([self.op('add', self.boot, 2), self.op('add', self.boot, 1)])
+        self.assertFalse(self.cart.items.exists())
+
+        # Within stock once the operations are combined
+        self.cart.apply_operations([self.op('add', self.boot, 3), self.op('update', self.boot, 2)])
+        self.assertEqual(self.quantities(), {self.boot.id: 2})
+
+    def test_query_count_does_not_grow_with_operations(self):
+        self.cart.apply_operations([self.op('add', self.shoe, 1), self.op('add', self.boot, 1)])
+        # One read, one bulk update, the cart timestamp (plus the savepoint pair)
+        with self.assertNumQueries(5):
+            self.cart.apply_operations([
+                self.op('update', self.shoe, 2), self.op('update', self.boot, 2),
+                self.op('add', self.shoe, 1),
+            ])
+        self.assertEqual(self.quantities(), {self.shoe.id: 3, self.boot.id: 2})
+
+    def test_removing_the_last_item_deactivates_the_cart(self):
+        self.cart.apply_operations([self.op('add', self.shoe, 1), self.op('add', self.boot, 1)])
+        self.cart.apply_operations([self.op('remove', self.shoe)])
+        self.cart.refresh_from_db()
+        self.assertTrue(self.cart.is_active)
+
+        self.cart.apply_operations([self.op('remove', self.boot)])
+        self.assertFalse(self.cart.is_active)
+        self.cart.refresh_from_db()
+        self.assertFalse(self.cart.is_active)
+
+    def test_batch_response_does_not_grow_with_items(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from .models import ShippingMethod
+
+        pickup = ShippingMethod.objects.create(name='Pickup', min_days=1, max_days=2, price=0)
+
+        def batch(*variants):
+            for variant in variants:
+                variant.product.shipping_methods.add(pickup)
+            operations = [{'op': 'add', 'product_id': v.product_id, 'variant_id': v.id, 'quantity': 1} for v in variants]
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.post(
+                    '/cart/batch/', {'operations': operations}, content_type='application/json',
+                    HTTP_X_TELEGRAM_ID='2001'
+                )
+            self.assertEqual(response.status_code, 200)
+            return response.json(), len(captured)
+
+        data, small = batch(self.shoe)
+        self.assertEqual(data['items_count'], 1)
+        data, large = batch(*[create_variant(f'Runner {i}') for i in range(4)])
+        self.assertEqual(data['items_count'], 5)
+        self.assertEqual([method['id'] for method in data['available_shipping_methods']], [pickup.id])
+        self.assertEqual(large, small)
+
+
+class CartCompactionTests(TestCase):
+    def setUp(self):
+        from .models import Cart, CartItem, User
+
+        self.old = timezone.now() - timedelta(days=45)
+        self.variant = create_variant('Sandal', stock=10)
+        self.users = [User.objects.create(username=f'cart-owner-{i}', telegram_id=f'30{i}') for i in range(3)]
+        self.active = Cart.objects.create(user=self.users[0])
+        self.live_item = self.add_item(self.active)
+        self.old_deleted = self.add_item(self.active, is_deleted=True, deleted_at=self.old)
+        self.recent_deleted = self.add_item(self.active, is_deleted=True, deleted_at=timezone.now())
+        # Soft-deleted before deleted_at existed: aged by updated_at
+        self.legacy_deleted = self.add_item(self.active, is_deleted=True)
+        CartItem.objects.filter(pk=self.legacy_deleted.pk).update(updated_at=self.old)
+
+        self.abandoned = Cart.objects.create(user=self.users[1], is_active=False)
+        self.ordered = Cart.objects.create(user=self.users[2], is_active=False)
+        create_order(self.users[2], cart=self.ordered)
+        self.recent_inactive = Cart.objects.create(user=self.users[1], is_active=False)
+        Cart.objects.filter(pk__in=[self.abandoned.pk, self.ordered.pk, self.active.pk]).update(updated_at=self.old)
+
+    def add_item(self, cart, **fields):
+        from .models import CartItem
+
+        return CartItem.objects.create(cart=cart, product=self.variant.product, variant=self.variant, **fields)
+
+    def compact(self, *args):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('compact_carts', '--batch-size=1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_only_old_soft_deleted_items_and_abandoned_carts(self):
+        from .models import Cart, CartItem
+
+        self.compact()
+
+        self.assertEqual(
+            set(CartItem.objects.values_list('pk', flat=True)), {self.live_item.pk, self.recent_deleted.pk}
+        )
+        self.assertEqual(
+            set(Cart.objects.values_list('pk', flat=True)), {self.active.pk, self.ordered.pk, self.recent_inactive.pk}
+        )
+
+    def test_dry_run_only_counts(self):
+        from .models import Cart, CartItem
+
+        output = self.compact('--dry-run')
+
+        self.assertIn('Would delete 2 cart items and 1 carts', output)
+        self.assertEqual(CartItem.objects.count(), 4)
+        self.assertEqual(Cart.objects.count(), 4)
+
+
+class SplitPaymentProcessingTests(TestCase):
+    def setUp(self):
+        from .models import User
+
+        self.user = User.objects.create(username='installments', telegram_id='4001')
+        self.variant = create_variant('Parka', stock=1)
+        now = timezone.now()
+        self.overdue_first = self.split_order(first_payment_date=now - timedelta(days=2), quantity=2)
+        self.within_grace = self.split_order(first_payment_date=now - timedelta(hours=12))
+        self.shipped_unpaid = self.split_order(first_payment_date=now - timedelta(days=2), status='shipped')
+        self.overdue_second = self.split_order(
+            status='delivered', payment_status='delivered', second_payment_due_date=now - timedelta(days=1)
+        )
+        self.second_not_due = self.split_order(
+            status='delivered', payment_status='delivered', second_payment_due_date=now + timedelta(days=5)
+        )
+
+    def split_order(self, status='pending', quantity=1, **fields):
+        from .models import Order
+
+        order = create_order(self.user, self.variant, quantity=quantity, status=status)
+        fields.setdefault('payment_status', 'pending')
+        Order.objects.filter(pk=order.pk).update(
+            is_split_payment=True, stock_reserved=True, second_payment_status='pending',
+            first_payment_amount=50, second_payment_amount=50, **fields
+        )
+        return order
+
+    def test_dry_run_lists_without_changing(self):
+        from .models import Order
+        from .split_payments import process_overdue_split_payments
+
+        result = process_overdue_split_payments(dry_run=True)
+
+        self.assertEqual(result, {
+            'first_payment_overdue': [self.overdue_first.pk],
+            'second_payment_overdue': [self.overdue_second.pk],
+        })
+        self.assertFalse(Order.objects.filter(status='canceled').exists())
+
+    def test_overdue_payments_are_processed_once(self):
+        from .models import Order, OrderNotification, OrderStatusEvent
+        from .split_payments import process_overdue_split_payments
+
+        result = process_overdue_split_payments(batch_size=1)
+
+        self.assertEqual(result['first_payment_overdue'], [self.overdue_first.pk])
+        self.assertEqual(result['second_payment_overdue'], [self.overdue_second.pk])
+        statuses = dict(Order.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[self.overdue_first.pk], 'canceled')
+        self.assertEqual(statuses[self.within_grace.pk], 'pending')
+        self.assertEqual(statuses[self.shipped_unpaid.pk], 'shipped')
+        self.assertEqual(Order.objects.get(pk=self.overdue_first.pk).payment_status, 'canceled')
+        self.assertEqual(Order.objects.get(pk=self.overdue_second.pk).second_payment_status, 'canceled')
+        self.assertEqual(Order.objects.get(pk=self.second_not_due.pk).second_payment_status, 'pending')
+
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 3)
+        self.assertTrue(OrderStatusEvent.objects.filter(order=self.overdue_first, to_status='canceled').exists())
+        self.assertEqual(
+            set(OrderNotification.objects.values_list('order_id', flat=True)),
+            {self.overdue_first.pk, self.overdue_second.pk},
+        )
+
+        self.assertEqual(process_overdue_split_payments(), {'first_payment_overdue': [], 'second_payment_overdue': []})
+
+
+class BranchSlaRollupTests(TestCase):
+    def setUp(self):
+        from datetime import datetime, time
+
+        from .models import Address, User
+
+        self.user = User.objects.create(username='pickup-customer', telegram_id='5001')
+        self.north, self.south = [
+            Address.objects.create(
+                name=name, branch_type='pickup', street='Main 1', district='Center', city='Tashkent',
+                region='Tashkent', postal_code='100000', phone='+998901234567', working_hours='09:00-21:00',
+            )
+            for name in ('North', 'South')
+        ]
+        self.yesterday = timezone.localdate() - timedelta(days=1)
+        self.morning = timezone.make_aware(datetime.combine(self.yesterday, time(9)))
+
+    def order(self, branch, created_at, ready_after=None, delivered_after=None):
+        """An order with ready/delivered events ``*_after`` after creation and readiness"""
+        from .models import Order, OrderStatusEvent
+
+        order = create_order(self.user, pickup_branch=branch)
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        OrderStatusEvent.objects.filter(order=order).update(created_at=created_at)
+        if ready_after is not None:
+            ready_at = created_at + ready_after
+            OrderStatusEvent.objects.create(
+                order=order, from_status='processing', to_status='ready_for_pickup', created_at=ready_at
+            )
+            if delivered_after is not None:
+                OrderStatusEvent.objects.create(
+                    order=order, from_status='ready_for_pickup', to_status='delivered',
+                    created_at=ready_at + delivered_after
+                )
+        return order
+
+    def stats(self):
+        from .models import BranchFulfillmentStats
+
+        return {
+            (row.branch_id, row.date): (row.ready_count, row.avg_pending_to_ready,
+                                        row.delivered_count, row.avg_ready_to_delivered)
+            for row in BranchFulfillmentStats.objects.all()
+        }
+
+    def test_rollup_buckets_by_branch_and_day(self):
+        from .fulfillment_sla import rollup_branch_sla
+        from .models import BranchFulfillmentStats
+
+        self.order(self.north, self.morning, timedelta(hours=2), timedelta(hours=1))
+        self.order(self.north, self.morning, timedelta(hours=4))
+        # Ready before the window, picked up inside it
+        self.order(self.south, self.morning - timedelta(days=9), timedelta(hours=1), timedelta(days=9))
+        self.order(self.south, self.morning)  # never ready
+        stale = BranchFulfillmentStats.objects.create(branch=self.south, date=self.yesterday, ready_count=99)
+        kept = BranchFulfillmentStats.objects.create(
+            branch=self.north, date=self.yesterday - timedelta(days=10), ready_count=2,
+            avg_pending_to_ready=timedelta(hours=6),
+        )
+
+        self.assertEqual(rollup_branch_sla(days=7), 2)
+        self.assertEqual(rollup_branch_sla(days=7), 2)
+
+        stats = self.stats()
+        self.assertEqual(stats[(self.north.pk, self.yesterday)], (2, timedelta(hours=3), 1, timedelta(hours=1)))
+        self.assertEqual(stats[(self.south.pk, self.yesterday)], (0, None, 1, timedelta(days=9)))
+        self.assertFalse(BranchFulfillmentStats.objects.filter(pk=stale.pk).exists())
+        self.assertTrue(BranchFulfillmentStats.objects.filter(pk=kept.pk).exists())
+
+    def test_summary_weights_days_by_order_count(self):
+        from .fulfillment_sla import branch_sla_summary, format_duration, rollup_branch_sla
+        from .models import BranchFulfillmentStats
+
+        self.order(self.north, self.morning, timedelta(hours=2), timedelta(hours=1))
+        self.order(self.north, self.morning, timedelta(hours=4))
+        self.order(self.south, self.morning, timedelta(minutes=30))
+        rollup_branch_sla(days=7)
+        BranchFulfillmentStats.objects.create(
+            branch=self.north, date=self.yesterday - timedelta(days=10), ready_count=2,
+            avg_pending_to_ready=timedelta(hours=6),
+        )
+
+        north, south = branch_sla_summary(days=30)
+        self.assertEqual((north['branch_name'], north['ready_count'], north['delivered_count']), ('North', 4, 1))
+        self.assertEqual(north['avg_pending_to_ready'], timedelta(hours=4, minutes=30))
+        self.assertEqual(south['avg_pending_to_ready'], timedelta(minutes=30))
+        self.assertIsNone(south['avg_ready_to_delivered'])
+        self.assertEqual(format_duration(north['avg_pending_to_ready']), '4h 30m')
+        self.assertEqual(format_duration(None), '—')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'queue-tests'}})
+class BranchQueueCounterTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        from .models import Address, User
+
+        cache.clear()
+        self.user = User.objects.create(username='queue-customer', telegram_id='6001')
+        self.branch = Address.objects.create(
+            name='Queue branch', branch_type='pickup', street='Main 1', district='Center', city='Tashkent',
+            region='Tashkent', postal_code='100000', phone='+998901234567', working_hours='09:00-21:00',
+        )
+
+    def place_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_order(self.user, pickup_branch=self.branch)
+
+    def move(self, orders, status):
+        from .order_workflow import transition
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transition([order.pk for order in orders], status, notify=False)
+
+    def recount(self):
+        from django.core.cache import cache
+
+        from .branch_queue import queue_counts
+
+        cache.clear()
+        return queue_counts([self.branch.pk])[self.branch.pk]
+
+    def test_counters_follow_transitions_without_recounting(self):
+        from .branch_queue import queue_counts
+
+        first = self.place_order()
+        self.assertEqual(queue_counts([self.branch.pk])[self.branch.pk],
+                         {'pending': 1, 'processing': 0, 'ready_for_pickup': 0})
+
+        second, third = self.place_order(), self.place_order()
+        self.move([first, second], 'processing')
+        self.move([first], 'ready_for_pickup')
+        self.move([third], 'canceled')
+        self.move([first], 'delivered')
+
+        with self.assertNumQueries(0):
+            counts = queue_counts([self.branch.pk])[self.branch.pk]
+        self.assertEqual(counts, {'pending': 0, 'processing': 1, 'ready_for_pickup': 0})
+        self.assertEqual(counts, self.recount())
+
+    def test_uncached_counters_are_recounted_not_adjusted(self):
+        from django.core.cache import cache
+
+        from .branch_queue import _counter_key, adjust_counters
+
+        order = self.place_order()
+        adjust_counters([(self.branch.pk, 'pending', 'processing'), (None, '', 'pending')])
+        self.assertIsNone(cache.get(_counter_key(self.branch.pk, 'pending')))
+
+        self.move([order], 'processing')
+        self.assertEqual(self.recount(), {'pending': 0, 'processing': 1, 'ready_for_pickup': 0})
+
+
+class KDTreeTests(SimpleTestCase):
+    @staticmethod
+    def great_circle_km(lat1, lon1, lat2, lon2):
+        import math
+
+        from .geo import EARTH_RADIUS_KM
+
+        lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+        a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+    def brute_force(self, points, lat, lon, k, predicate=None):
+        distances = sorted(
+            (self.great_circle_km(lat, lon, p_lat, p_lon), item)
+            for p_lat, p_lon, item in points
+            if predicate is None or predicate(item)
+        )
+        return distances[:k]
+
+    def assert_same_neighbours(self, found, expected):
+        self.assertEqual(len(found), len(expected))
+        for (distance, _), (expected_distance, _) in zip(found, expected):
+            self.assertAlmostEqual(distance, expected_distance, places=6)
+        # Items may only differ between equally distant points
+        self.assertEqual(
+            {item for distance, item in found if distance < expected[-1][0] - 1e-6},
+            {item for distance, item in expected if distance < expected[-1][0] - 1e-6},
+        )
+
+    def test_matches_brute_force(self):
+        import random
+
+        from .geo import KDTree
+
+        rng = random.Random(43)
+        # Around Tashkent, plus points near the poles and the antimeridian
+        points = [(41.3 + rng.uniform(-0.5, 0.5), 69.2 + rng.uniform(-0.5, 0.5), i) for i in range(300)]
+        points += [(rng.uniform(-90, 90), rng.uniform(-180, 180), 300 + i) for i in range(200)]
+        points += [(89.9, 10.0, 'north'), (-89.9, -170.0, 'south'), (0.0, 179.99, 'east'), (0.0, -179.99, 'west')]
+        tree = KDTree(points)
+        self.assertEqual(tree.size, len(points))
+
+        queries = [(41.3 + rng.uniform(-1, 1), 69.2 + rng.uniform(-1, 1)) for _ in range(30)]
+        queries += [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(30)]
+        queries += [(90.0, 0.0), (0.0, 180.0), (0.0, -180.0)]
+        even = lambda item: isinstance(item, int) and item % 2 == 0
+        for lat, lon in queries:
+            for k in (1, 5, 25):
+                self.assert_same_neighbours(tree.nearest(lat, lon, k), self.brute_force(points, lat, lon, k))
+            self.assert_same_neighbours(
+                tree.nearest(lat, lon, 5, predicate=even), self.brute_force(points, lat, lon, 5, even)
+            )
+
+        self.assertEqual({item for _, item in tree.nearest(0.0, 180.0, 2)}, {'east', 'west'})
+
+    def test_edge_cases(self):
+        from .geo import KDTree
+
+        self.assertEqual(KDTree([]).nearest(41.3, 69.2, 3), [])
+        tree = KDTree([(41.3, 69.2, 'a'), (41.4, 69.3, 'b')])
+        self.assertEqual(tree.nearest(41.3, 69.2, 0), [])
+        self.assertEqual([item for _, item in tree.nearest(41.3, 69.2, 10)], ['a', 'b'])
+        self.assertEqual(tree.nearest(41.3, 69.2, 2, predicate=lambda item: False), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BranchDirectoryTests(TestCase):
+    def setUp(self):
+        from django.core.cache import caches
+
+        from . import branch_directory
+
+        for cache in caches.all():
+            cache.clear()
+        branch_directory._directory = None
+        self.store = self.address('Store', latitude='41.311000', longitude='69.279000')
+        self.pickup = self.address('Pickup', branch_type='pickup', working_hours='22:00-02:00')
+        self.address('Closed', is_active=False)
+        self.warehouse = self.address('Warehouse', branch_type='warehouse')
+
+    def address(self, name, branch_type='store', **fields):
+        from .models import Address
+
+        fields.setdefault('working_hours', '09:00-18:00')
+        with self.captureOnCommitCallbacks(execute=True):
+            return Address.objects.create(
+                name=name, branch_type=branch_type, street='Main 1', district='Center', city='Tashkent',
+                region='Tashkent', postal_code='100000', phone='+998901234567', **fields
+            )
+
+    def test_directory_holds_active_branches_only(self):
+        from .branch_directory import get_branch_directory
+
+        directory = get_branch_directory()
+        self.assertEqual([branch['name'] for branch in directory.data], ['Pickup', 'Store'])
+        self.assertIn(self.store.id, directory)
+        self.assertNotIn(self.warehouse.id, directory)
+        self.assertIsNone(directory.get(self.warehouse.id))
+
+        # Callers get a private copy
+        branch = directory.get(self.store.id)
+        branch.name = 'Renamed'
+        self.assertEqual(directory.get(self.store.id).name, 'Store')
+
+        # Only branches with coordinates are located
+        self.assertEqual([item['id'] for item in directory.nearest(41.3, 69.2)], [self.store.id])
+        with self.assertNumQueries(0):
+            self.assertIs(get_branch_directory(), directory)
+
+    def test_working_hours(self):
+        from .branch_directory import is_open_at, parse_working_hours
+
+        self.assertEqual(parse_working_hours('09:00-13:00, 14.00 - 20:00'), [(540, 780), (840, 1200)])
+        self.assertIsNone(parse_working_hours('by appointment'))
+        overnight = parse_working_hours('22:00-02:00')
+        self.assertTrue(is_open_at(overnight, 23 * 60))
+        self.assertTrue(is_open_at(overnight, 60))
+        self.assertFalse(is_open_at(overnight, 12 * 60))
+        self.assertTrue(is_open_at(parse_working_hours('', is_24_hours=True), 12 * 60))
+        self.assertIsNone(is_open_at(None, 0))
+
+    def test_only_branch_writes_rebuild_the_directory(self):
+        from .branch_directory import get_branch_directory
+        from .catalog_cache import get_catalog_version
+
+        version = get_catalog_version('branches')
+        self.address('Second warehouse', branch_type='warehouse')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.warehouse.phone = '+998900000000'
+            self.warehouse.save()
+        self.assertEqual(get_catalog_version('branches'), version)
+
+        # A branch turned into a warehouse leaves the directory
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pickup.branch_type = 'warehouse'
+            self.pickup.save()
+        self.assertGreater(get_catalog_version('branches'), version)
+        self.assertNotIn(self.pickup.id, get_branch_directory())
+
+        version = get_catalog_version('branches')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.store.delete()
+        self.assertGreater(get_catalog_version('branches'), version)
+        self.assertEqual(len(get_branch_directory()), 0)
+
+    def test_direct_purchase_rejects_a_branch_gone_since_validation(self):
+        from .branch_directory import BranchDirectory
+        from .models import Order, User
+
+        User.objects.create(username='buyer', telegram_id='6001')
+        variant = create_variant('Loafer', stock=3)
+        payload = {
+            'product_id': variant.product_id, 'variant_id': variant.id, 'quantity': 1,
+            'pickup_branch_id': self.store.id, 'payment_method': 'cash_on_pickup',
+            'customer_name': 'Buyer', 'phone_number': '+998900000001',
+        }
+
+        with mock.patch('unicflo_api.views.get_branch_directory', return_value=BranchDirectory(0, [])):
+            response = self.client.post('/direct-purchase/', payload, content_type='application/json',
+                                        HTTP_X_TELEGRAM_ID='6001')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pickup_branch_id', response.json())
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.post('/direct-purchase/', payload, content_type='application/json',
+                                    HTTP_X_TELEGRAM_ID='6001')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get().pickup_branch, self.store)
+
+
+class InventoryTests(TestCase):
+    def setUp(self):
+        self.variant = create_variant('Hoodie', stock=10)
+        self.product = self.variant.product
+
+    def set_stock(self, stock, variant=None):
+        variant = variant or self.variant
+        variant.stock = stock
+        variant.save()
+
+    def test_variant_writes_keep_product_totals_and_levels(self):
+        from .models import ProductVariant, Size
+
+        other = ProductVariant.objects.create(
+            product=self.product, color=self.variant.color, size=Size.objects.create(name='44'), stock=3
+        )
+        self.product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.product.total_stock, self.product.in_stock), (13, True))
+        self.assertEqual(other.stock_level, 'low')
+
+        self.set_stock(0)
+        self.set_stock(0, other)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.total_stock, self.product.in_stock), (0, False))
+
+        other.delete()
+        self.set_stock(7)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_stock, 7)
+
+    def test_one_alert_per_drop_to_a_worse_level(self):
+        from .models import ProductVariant, Size, StockAlert
+
+        for stock in (4, 3, 0, 0, 8, 2):
+            self.set_stock(stock)
+        self.assertEqual(list(StockAlert.objects.order_by('id').values_list('level', 'stock')),
+                         [('low', 4), ('out', 0), ('low', 2)])
+
+        # A new variant starting out of stock is not a drop
+        ProductVariant.objects.create(
+            product=self.product, color=self.variant.color, size=Size.objects.create(name='46'), stock=0
+        )
+        self.assertEqual(StockAlert.objects.count(), 3)
+
+    def test_resync_repairs_queryset_updates(self):
+        from .inventory import resync_inventory
+        from .models import Product, ProductVariant, StockAlert
+
+        ProductVariant.objects.filter(pk=self.variant.pk).update(stock=1)
+        empty = create_variant('Scarf', stock=4).product
+        ProductVariant.objects.filter(product=empty).delete()
+        Product.objects.filter(pk=empty.pk).update(total_stock=4, in_stock=True)
+
+        self.assertEqual(resync_inventory(batch_size=1), (1, 1))
+        self.product.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual(self.product.total_stock, 1)
+        self.assertEqual((empty.total_stock, empty.in_stock), (0, False))
+        self.assertEqual(StockAlert.objects.get().level, 'low')
+        self.assertEqual(resync_inventory(), (1, 0))
+
+    def test_alerts_are_batched_per_admin_and_kept_without_admins(self):
+        from .inventory import enqueue_stock_alerts
+        from .models import StockAlert, StockAlertNotification, User
+
+        for stock in (3, 0):
+            self.set_stock(stock)
+        self.set_stock(1, create_variant('Beanie', stock=9))
+        self.assertEqual(enqueue_stock_alerts(batch_size=2), (0, 0))
+        self.assertEqual(StockAlert.objects.filter(notified_at__isnull=True).count(), 3)
+
+        for i in range(2):
+            User.objects.create(username=f'stock-admin-{i}', telegram_id=f'700{i}', is_telegram_admin=True)
+        self.assertEqual(enqueue_stock_alerts(batch_size=2), (3, 4))
+        self.assertFalse(StockAlert.objects.filter(notified_at__isnull=True).exists())
+        self.assertEqual(enqueue_stock_alerts(batch_size=2), (0, 0))
+
+        first = StockAlertNotification.objects.order_by('id').first().message
+        # Both alerts of the Hoodie variant are in the first batch; it is listed once, as out of stock
+        self.assertEqual(first.count('Hoodie'), 1)
+        self.assertIn('Нет в наличии', first)
+        self.assertNotIn('Заканчиваются', first)
+
+    @override_settings(INVENTORY={'LOW_STOCK_THRESHOLD': 8})
+    def test_dashboard_follows_the_configured_threshold(self):
+        from .admin_dashboard import compute_dashboard
+
+        self.set_stock(7)
+        self.set_stock(0, create_variant('Beanie', stock=9))
+        create_variant('Scarf', stock=9)
+
+        dashboard = compute_dashboard()
+        self.assertEqual([alert['stock'] for alert in dashboard['low_stock']], [0, 7])
+        self.assertEqual(dashboard['low_stock_threshold'], 8)
+
+
+class CatalogImportExportTests(TestCase):
+    def setUp(self):
+        from decimal import Decimal
+
+        from .models import Brand, Material, ProductImage, Season, ShippingMethod
+
+        self.boots = create_variant('Chelsea Boots', stock=4, discount_price=Decimal('80.00'), is_featured=True)
+        self.jacket = create_variant('Rain Jacket', stock=0, price='250.50')
+        boots = self.boots.product
+        boots.brand = Brand.objects.create(name='Nordic', slug='nordic')
+        boots.season = Season.objects.create(name='Winter')
+        boots.save()
+        boots.materials.add(Material.objects.create(name='Leather'), Material.objects.create(name='Wool'))
+        boots.shipping_methods.add(ShippingMethod.objects.create(name='Pickup', min_days=1, max_days=2, price=0))
+        ProductImage.objects.create(
+            product=boots, color=self.boots.color, image='product_images/boots.jpg', is_primary=True, alt_text='Side'
+        )
+
+    def export(self, fmt):
+        from io import StringIO
+
+        from .catalog_io import export_records, write_records
+
+        stream = StringIO()
+        self.assertEqual(write_records(stream, export_records(chunk_size=1), fmt), 2)
+        return stream.getvalue()
+
+    def load(self, text, fmt, batch_size=1):
+        from io import StringIO
+
+        from .catalog_io import import_catalog, read_records
+
+        return import_catalog(read_records(StringIO(text), fmt), batch_size=batch_size)
+
+    def test_round_trip(self):
+        import json
+
+        from .models import Product
+
+        for fmt in ('jsonl', 'csv'):
+            with self.subTest(fmt=fmt):
+                exported = self.export(fmt)
+                Product.objects.all().delete()
+
+                importer = self.load(exported, fmt)
+                self.assertEqual((importer.created, importer.rejected, importer.variants), (2, 0, 2))
+                self.assertEqual(self.export(fmt), exported)
+                self.assertEqual(Product.objects.get(slug='chelsea-boots').total_stock, 4)
+
+                importer = self.load(exported, fmt, batch_size=10)
+                self.assertEqual((importer.created, importer.updated, importer.unchanged), (0, 0, 2))
+
+        records = [json.loads(line) for line in self.export('jsonl').splitlines()]
+        self.assertEqual(records[0]['materials'], ['Leather', 'Wool'])
+        self.assertEqual(records[0]['images'][0]['image'], 'product_images/boots.jpg')
+        self.assertEqual(records[1]['price'], '250.50')
+
+    def test_upsert_and_rejections(self):
+        import json
+
+        from .models import Material, Product, ProductVariant
+
+        boots, jacket = [json.loads(line) for line in self.export('jsonl').splitlines()]
+        boots['price'] = '120.00'
+        boots['variants'][0]['stock'] = 9
+        boots['materials'].append('Suede')
+        jacket['subcategory'] = 'missing'
+        lines = [json.dumps(boots), '{"slug": broken', '', json.dumps(jacket), '["not", "an object"]']
+
+        importer = self.load('\n'.join(lines) + '\n', 'jsonl')
+
+        self.assertEqual((importer.updated, importer.rejected), (1, 3))
+        self.assertEqual(importer.errors[0][:7], 'line 2:')
+        self.assertIn("rain-jacket: unknown subcategory 'missing'", importer.errors)
+        self.assertEqual(importer.errors[2], 'line 5: expected a JSON object')
+        product = Product.objects.get(slug='chelsea-boots')
+        self.assertEqual(str(product.price), '120.00')
+        self.assertEqual(ProductVariant.objects.get(product=product).stock, 9)
+        self.assertEqual(product.total_stock, 9)
+        self.assertTrue(Material.objects.filter(name='Suede').exists())
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        from datetime import datetime, time
+
+        from .models import Order, User
+
+        self.staff = User.objects.create(username='exporter', telegram_id='8001', is_staff=True)
+        self.customer = User.objects.create(username='buyer', telegram_id='8002')
+        self.day = timezone.localdate() - timedelta(days=3)
+        start = timezone.make_aware(datetime.combine(self.day, time.min))
+        variant = create_variant('Loafer', stock=50, price='99.90')
+        self.first = create_order(self.customer, variant, quantity=2)
+        self.last = create_order(self.customer, status='delivered')
+        self.next_day = create_order(self.customer, variant, status='canceled')
+        for order, created_at in ((self.first, start), (self.last, start + timedelta(days=1, microseconds=-1)),
+                                  (self.next_day, start + timedelta(days=1))):
+            Order.objects.filter(pk=order.pk).update(created_at=created_at)
+
+    def export(self, fmt, *args, **kwargs):
+        from .order_export import export_orders
+
+        return b''.join(export_orders(fmt, *args, **kwargs))
+
+    def test_filters(self):
+        from .order_export import ExportError, export_queryset
+
+        day = self.day.isoformat()
+        self.assertEqual(set(export_queryset(day, day)), {self.first, self.last})
+        self.assertEqual(set(export_queryset(date_from=self.day + timedelta(days=1))), {self.next_day})
+        self.assertEqual(set(export_queryset(statuses=['delivered', 'canceled'])), {self.last, self.next_day})
+        for kwargs in ({'date_from': '2024-13-45'}, {'date_to': 'yesterday'}, {'statuses': ['lost']}):
+            with self.subTest(**kwargs), self.assertRaises(ExportError):
+                export_queryset(**kwargs)
+
+    def test_csv_has_a_row_per_item_and_jsonl_an_object_per_order(self):
+        import csv
+        import json
+
+        rows = list(csv.DictReader(self.export('csv', statuses=['pending', 'delivered']).decode().splitlines()))
+        self.assertEqual([row['order_id'] for row in rows], [str(self.first.pk), str(self.last.pk)])
+        self.assertEqual((rows[0]['quantity'], rows[0]['line_total'], rows[0]['product_name']), ('2', '199.80', 'Loafer'))
+        self.assertEqual(rows[1]['item_id'], '')
+
+        orders = [json.loads(line) for line in self.export('jsonl').decode().splitlines()]
+        self.assertEqual([order['order_id'] for order in orders], [self.first.pk, self.last.pk, self.next_day.pk])
+        self.assertEqual([len(order['items']) for order in orders], [1, 0, 1])
+        self.assertEqual(orders[0]['items'][0]['line_total'], '199.80')
+        self.assertEqual(orders[0]['telegram_id'], '8002')
+
+    @skipUnless(pyarrow, 'pyarrow is not installed')
+    def test_parquet(self):
+        from io import BytesIO
+
+        table = pyarrow.parquet.read_table(BytesIO(self.export('parquet', statuses=['pending', 'canceled'])))
+        self.assertEqual(table.column('order_id').to_pylist(), [self.first.pk, self.next_day.pk])
+
+    def test_endpoint(self):
+        response = self.client.get(
+            '/orders/export/', {'file_format': 'jsonl', 'status': 'delivered'}, HTTP_X_TELEGRAM_ID='8001'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(b''.join(response.streaming_content).count(b'\n'), 1)
+
+        response = self.client.get('/orders/export/', {'from': '2024-02-30'}, HTTP_X_TELEGRAM_ID='8001')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/orders/export/', {'file_format': 'xlsx'}, HTTP_X_TELEGRAM_ID='8001')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/orders/export/', HTTP_X_TELEGRAM_ID='8002')
+        self.assertEqual(response.status_code, 403)
+
+
+class FakeDataTests(TestCase):
+    def setUp(self):
+        from datetime import date
+
+        self.end = date(2024, 11, 30)
+
+    def generate(self, workers):
+        """Rows of a small run by natural keys, rolled back afterwards so runs can be compared"""
+        from django.db import transaction
+
+        from .fake_data import FakeDataGenerator
+        from .models import CartItem, OrderItem, ProductVariant, User
+
+        generator = FakeDataGenerator(end=self.end, seed=7, workers=workers, days=60)
+        # Small chunks, so every kind is split across several of them
+        with transaction.atomic(), mock.patch('unicflo_api.fake_data.CHUNK_SIZE', 9):
+            for kind, total in (('users', 30), ('products', 20), ('orders', 40), ('carts', 10)):
+                getattr(generator, f'generate_{kind}')(total)
+            rows = {
+                'users': sorted(User.objects.values_list('username', 'telegram_id', 'date_joined')),
+                'variants': sorted(ProductVariant.objects.values_list(
+                    'product__slug', 'product__price', 'color__name', 'size__name', 'stock'
+                )),
+                'orders': sorted(OrderItem.objects.values_list(
+                    'order__user__username', 'order__created_at', 'order__status', 'product__slug', 'quantity', 'price'
+                )),
+                'carts': sorted(CartItem.objects.values_list(
+                    'cart__user__username', 'cart__updated_at', 'product__slug', 'quantity'
+                )),
+            }
+            transaction.set_rollback(True)
+        return rows
+
+    def test_same_seed_gives_the_same_rows_for_any_worker_count(self):
+        serial = self.generate(workers=1)
+        self.assertEqual([len(serial[kind]) > 0 for kind in serial], [True] * 4)
+        self.assertEqual(self.generate(workers=3), serial)
+
+    def test_window_ignores_the_wall_clock(self):
+        from datetime import datetime
+
+        from .fake_data import NamePools, SeasonalClock, _init_worker, user_chunk
+
+        pools = NamePools(3, size=20)
+
+        def users(now):
+            with mock.patch('django.utils.timezone.now', return_value=now):
+                clock = SeasonalClock(self.end, days=30)
+                _init_worker({'seed': 3, 'clock': clock, 'pools': pools})
+                return clock, user_chunk((0, 0, 50))
+
+        clock, rows = users(timezone.make_aware(datetime(2024, 11, 30, 8)))
+        self.assertEqual(users(timezone.make_aware(datetime(2026, 1, 1)))[1], rows)
+        self.assertEqual(timezone.localtime(clock.latest).date(), self.end)
+        self.assertTrue(all(row['date_joined'] <= clock.latest for row in rows))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BenchmarkSmokeTests(TransactionTestCase):
+    """One request per scenario on a small dataset; outside a test transaction, so query counts match real runs"""
+
+    def setUp(self):
+        from django.core.cache import caches
+
+        for cache in caches.all():
+            cache.clear()
+
+    def test_scenarios_run_within_their_query_budgets(self):
+        from .benchmarks import SCENARIOS, run_benchmarks
+
+        with mock.patch('unicflo_api.benchmarks.DATASET', {'users': 40, 'products': 30, 'orders': 40, 'carts': 5}):
+            report = run_benchmarks(iterations=1, warmup=1, memory_iterations=1)
+
+        self.assertEqual(set(report.results), set(SCENARIOS))
+        for name, result in report.results.items():
+            self.assertLessEqual(result['queries'], report.budgets[name]['queries'], name)
+            self.assertIsNotNone(result['memory_kb'])
+        self.assertIn('results', report.as_dict())
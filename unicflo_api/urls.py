@@ -4,19 +4,20 @@ from .views import (
     # User views
     UserListCreateView, UserRetrieveUpdateDestroyView, UserMeView,
     # Category views
-    CategoryListCreateView, CategoryRetrieveUpdateDestroyView,
+    CategoryListCreateView, CategoryRetrieveUpdateDestroyView, CategoryTreeView,
     # Subcategory views
     SubcategoryListCreateView, SubcategoryRetrieveUpdateDestroyView,
     # Product views
-    ProductListCreateView, ProductRetrieveUpdateDestroyView, SimilarProductsView,
+    ProductListCreateView, ProductRetrieveUpdateDestroyView, SimilarProductsView, TrendingProductsView,
     # Wishlist views
     WishlistListCreateView, AddToWishlistView,
     # Cart views
     CartListCreateView, MyCartView,
     # CartItem views
-    CartItemListCreateView, CartItemRetrieveUpdateDestroyView, AddToCartView,
+    CartItemListCreateView, CartItemRetrieveUpdateDestroyView, AddToCartView, CartBatchView,
     # Order views
     OrderListCreateView, OrderRetrieveUpdateDestroyView, CancelOrderView,
+    UpdateOrderStatusView, BulkOrderStatusView, OrderExportView,
     # Address views
     AddressListCreateView, AddressRetrieveUpdateDestroyView,
     # Brand views
@@ -42,6 +43,9 @@ from .views import (
     CartClearView,
     DirectPurchaseView,
     ActiveBranchesView,
+    BranchQueuesView,
+    BranchQueueView,
+    NearestBranchesView,
 )
 
 app_name = 'unicflo_api'
@@ -64,6 +68,7 @@ urlpatterns = [
     
     # Category URLs
     path('categories/', CategoryListCreateView.as_view(), name='category-list'),
+    path('categories/tree/', CategoryTreeView.as_view(), name='category-tree'),
     path('categories/<slug:slug>/', CategoryRetrieveUpdateDestroyView.as_view(), name='category-detail'),
     
     # Subcategory URLs
@@ -96,6 +101,7 @@ urlpatterns = [
     
     # Product URLs
     path('products/', ProductListCreateView.as_view(), name='product-list'),
+    path('products/trending/', TrendingProductsView.as_view(), name='trending-products'),
     path('products/<slug:slug>/', ProductRetrieveUpdateDestroyView.as_view(), name='product-detail'),
     path('products/<int:pk>/similar/', SimilarProductsView.as_view(), name='similar-products'),
     
@@ -107,6 +113,7 @@ urlpatterns = [
     path('cart/items/', CartItemListCreateView.as_view(), name='cart-item-list'),
     path('cart/items/<int:pk>/', CartItemRetrieveUpdateDestroyView.as_view(), name='cart-item-detail'),
     path('cart/add/', AddToCartView.as_view(), name='add-to-cart'),
+    path('cart/batch/', CartBatchView.as_view(), name='cart-batch'),
     path('cart/', MyCartView.as_view(), name='my-cart'),
     path('carts/', CartListCreateView.as_view(), name='cart-list'),
     path('carts/<int:pk>/', CartViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='cart-detail'),
@@ -120,7 +127,10 @@ urlpatterns = [
     # Order URLs
     path('orders/', OrderListCreateView.as_view(), name='order-list'),
     path('orders/<int:id>/', OrderRetrieveUpdateDestroyView.as_view(), name='order-detail'),
-    path('orders/<int:id>/cancel/', CancelOrderView.as_view(), name='cancel-order'),
+    path('orders/<int:pk>/cancel/', CancelOrderView.as_view(), name='cancel-order'),
+    path('orders/<int:pk>/status/', UpdateOrderStatusView.as_view(), name='order-status'),
+    path('orders/bulk-status/', BulkOrderStatusView.as_view(), name='order-bulk-status'),
+    path('orders/export/', OrderExportView.as_view(), name='order-export'),
     
     # Address URLs
     path('addresses/', AddressListCreateView.as_view(), name='address-list'),
@@ -128,6 +138,9 @@ urlpatterns = [
     
     # Branch URLs
     path('branches/', ActiveBranchesView.as_view(), name='active-branches'),
+    path('branches/nearest/', NearestBranchesView.as_view(), name='nearest-branches'),
+    path('branches/queues/', BranchQueuesView.as_view(), name='branch-queues'),
+    path('branches/<int:pk>/queue/', BranchQueueView.as_view(), name='branch-queue'),
     
     # Promo Code URLs
     path('promo-codes/', PromoCodeListCreateView.as_view(), name='promo-code-list'),
@@ -24,26 +24,26 @@ EMOJIS = {
 
 class TelegramService:
     @staticmethod
-    async def send_message(chat_id, message):
+    async def send_message(chat_id, message, bot=None):
+        """Send a Markdown message; returns True when Telegram accepted it"""
         if not settings.TELEGRAM_BOT_TOKEN:
             logger.warning("TELEGRAM_BOT_TOKEN not set. Skipping notification.")
-            return
+            return False
             
         try:
-            bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+            bot = bot or Bot(token=settings.TELEGRAM_BOT_TOKEN)
             await bot.send_message(chat_id=chat_id, text=message, parse_mode='Markdown')
             logger.info(f"Telegram message sent to {chat_id}")
+            return True
         except TelegramError as e:
             logger.error(f"Failed to send Telegram message: {str(e)}")
         except Exception as e:
             logger.error(f"Unexpected error while sending Telegram message: {str(e)}")
+        return False
 
     @staticmethod
-    def notify_order_status(order):
-        if not order.user.telegram_id:
-            logger.info(f"User {order.user.username} has no Telegram chat ID. Skipping notification.")
-            return
-            
+    def render_order_status(order):
+        """Order status message; uses prefetched items when available"""
         status_emoji = EMOJIS.get(order.status, EMOJIS['notification'])
         
         # Create a detailed message
@@ -91,9 +91,29 @@ class TelegramService:
         
         # Add order items
         message += "\nТовары в заказе:\n"
-        for item in order.items.select_related('product').all():
+        items = order.items.all()
+        if 'items' not in getattr(order, '_prefetched_objects_cache', {}):
+            items = items.select_related('product')
+        for item in items:
             message += f"• {item.quantity}x {item.product.name} ({item.price:,} сум)\n"
-        
+        return message
+
+    @staticmethod
+    def render_second_payment_overdue(order):
+        return (
+            f"{EMOJIS['notification']} *Заказ #{order.id}*\n\n"
+            f"{EMOJIS['price']} Срок второго платежа ({order.second_payment_amount:,} сум) "
+            f"истёк {order.second_payment_due_date:%d.%m.%Y}.\n"
+            "Пожалуйста, свяжитесь с нами для оплаты.\n"
+        )
+
+    @staticmethod
+    def notify_order_status(order):
+        if not order.user.telegram_id:
+            logger.info(f"User {order.user.username} has no Telegram chat ID. Skipping notification.")
+            return
+
+        message = TelegramService.render_order_status(order)
         try:
             asyncio.run(TelegramService.send_message(order.user.telegram_id, message))
         except Exception as e:
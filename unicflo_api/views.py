@@ -6,7 +6,7 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, Q, Sum, Prefetch
+from django.db.models import Count, Q, Prefetch
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from django.utils.decorators import method_decorator
@@ -18,14 +18,24 @@ import logging
 from rest_framework import exceptions
 from .models import *
 from .serializers import *
-from .permissions import IsOwnerOrAdmin, IsCartOwner
+from .permissions import IsOwnerOrAdmin, IsCartOwner, IsStaffOrTelegramAdmin
 from .pagination import DynamicPageSizePagination
 from .filters import CategoryFilter, SubcategoryFilter, ProductFilter, UserFilter
-from .utils.telegram import TelegramService
+from .catalog_cache import CatalogCacheMixin, catalog_setting
+from .category_tree import get_category_tree
+from .projection import ProjectionMixin, optimize_queryset
+from .events import record_event
+from .popularity import GLOBAL_SCOPE, add_events, get_trending_ids, popularity_setting
+from .order_workflow import TransitionError, transition, transition_order
+from .branch_queue import QUEUE_STATUSES, queue_counts, queue_orders
+from .branch_directory import get_branch_directory
+from .order_export import CONTENT_TYPES, ExportError, export_orders
 from rest_framework import viewsets
 from .authentication import TelegramAuthentication
-from django.http import Http404
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 
 logger = logging.getLogger(__name__)
 
@@ -68,13 +78,15 @@ class ProductFilter(django_filters.FilterSet):
     price_max = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
     is_featured = django_filters.BooleanFilter(field_name='is_featured')
     is_active = django_filters.BooleanFilter(field_name='is_active')
+    # Materialized from variant stock (see inventory.py)
+    in_stock = django_filters.BooleanFilter(field_name='in_stock')
     slug = django_filters.CharFilter(field_name='slug', lookup_expr='exact')
     search = django_filters.CharFilter(method='filter_search')
     has_discount = django_filters.BooleanFilter(method='filter_has_discount')
 
     class Meta:
         model = Product
-        fields = ['gender', 'category', 'subcategory', 'brand', 'is_featured', 'is_active', 'slug']
+        fields = ['gender', 'category', 'subcategory', 'brand', 'is_featured', 'is_active', 'in_stock', 'slug']
 
     def filter_search(self, queryset, name, value):
         return queryset.filter(
@@ -252,7 +264,8 @@ class UserMeView(generics.RetrieveUpdateAPIView):
         tags=["Category Management"]
     )
 )
-class CategoryListCreateView(generics.ListCreateAPIView):
+class CategoryListCreateView(CatalogCacheMixin, generics.ListCreateAPIView):
+    catalog_scope = 'categories'
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     filter_backends = [DjangoFilterBackend, OrderingFilter]
@@ -301,7 +314,8 @@ class CategoryListCreateView(generics.ListCreateAPIView):
         tags=["Category Management"]
     )
 )
-class CategoryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class CategoryRetrieveUpdateDestroyView(CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    catalog_scope = 'categories'
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     lookup_field = 'slug'
@@ -326,6 +340,28 @@ class CategoryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return [AllowAny()]
         return [IsAdminUser()]
 
+@extend_schema(
+    summary="Get category tree",
+    description="Genders -> categories -> active subcategories with active product counts. "
+                "Served from a materialized in-memory tree; supports If-None-Match.",
+    tags=["Category Management"],
+    responses={200: OpenApiTypes.OBJECT, 304: None}
+)
+class CategoryTreeView(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        version, content = get_category_tree()
+        etag = quote_etag(f'category-tree-{version}')
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, **catalog_setting('CACHE_CONTROL'))
+        return response
+
 @extend_schema_view(
     get=extend_schema(
         summary="List subcategories",
@@ -558,7 +594,7 @@ class SubcategoryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView
         tags=["Product Management"]
     )
 )
-class ProductListCreateView(generics.ListCreateAPIView):
+class ProductListCreateView(ProjectionMixin, generics.ListCreateAPIView):
     serializer_class = ProductSerializer
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = ProductFilter
@@ -566,29 +602,12 @@ class ProductListCreateView(generics.ListCreateAPIView):
     ordering = ['-created_at']
 
     def get_queryset(self):
+        # Related rows are derived from the requested fields by ProjectionMixin
         queryset = Product.objects.all()
         if not self.request.user.is_staff:
             queryset = queryset.filter(is_active=True)
-        
-        return queryset.select_related(
-            'subcategory',
-            'subcategory__category',
-            'subcategory__gender',
-            'brand',
-            'gender',
-            'season'
-        ).prefetch_related(
-            'materials',
-            'shipping_methods',
-            Prefetch(
-                'variants',
-                queryset=ProductVariant.objects.select_related('color', 'size')
-            ),
-            'images'
-        ).annotate(
-            variants_count=Count('variants', distinct=True),
-            in_stock=Sum('variants__stock')
-        )
+        # Stock totals are materialized on Product (see inventory.py)
+        return queryset
 
     def get_permissions(self):
         if self.request.method in SAFE_METHODS:
@@ -620,48 +639,82 @@ class ProductListCreateView(generics.ListCreateAPIView):
         tags=["Product Management"]
     )
 )
-class ProductRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class ProductRetrieveUpdateDestroyView(ProjectionMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
     lookup_field = 'slug'
     lookup_url_kwarg = 'slug'
+    queryset = Product.objects.all()
 
-    def get_queryset(self):
-        return Product.objects.select_related(
-            'subcategory', 
-            'subcategory__category', 
-            'subcategory__gender',
-            'brand', 
-            'gender', 
-            'season'
-        ).prefetch_related(
-            'materials',
-            'shipping_methods',
-            Prefetch(
-                'variants',
-                queryset=ProductVariant.objects.select_related('color', 'size')
-            ),
-            'images',
-            'likes'
-        )
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        record_event(request.user, instance, 'view')
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
 
     @action(detail=True, methods=['post'])
     def like(self, request, slug=None):
         product = self.get_object()
         user = request.user
         
-        if product.likes.filter(id=user.id).exists():
-            product.likes.remove(user)
+        deleted, _ = UserProductInteraction.objects.filter(kind='like', user=user, product=product).delete()
+        if deleted:
             return Response({'status': 'unliked'})
-        else:
-            product.likes.add(user)
-            return Response({'status': 'liked'})
+        UserProductInteraction.bulk_ingest([UserProductInteraction(user=user, product=product, kind='like')])
+        add_events([(product.id, 'like', 1, timezone.now())])
+        return Response({'status': 'liked'})
 
     def get_permissions(self):
         if self.request.method in ['PUT', 'PATCH', 'DELETE']:
             return [IsAdminUser()]
         return [AllowAny()]
 
+@extend_schema(
+    summary="Trending products",
+    description="Products ranked by time-decayed popularity (purchases, cart adds, likes, views), "
+                "globally or within a gender or category. Served from precomputed rankings.",
+    parameters=[
+        OpenApiParameter(name="gender", description="Gender category ID or slug", required=False, type=str),
+        OpenApiParameter(name="category", description="Category ID or slug", required=False, type=str),
+        OpenApiParameter(name="limit", description="Number of products (default 20)", required=False, type=int),
+    ],
+    tags=["Product Management"]
+)
+class TrendingProductsView(ProjectionMixin, generics.ListAPIView):
+    serializer_class = ProductSerializer
+    permission_classes = [AllowAny]
+    pagination_class = None
+    queryset = Product.objects.filter(is_active=True)
+
+    def get_serializer(self, *args, **kwargs):
+        if not self.request.query_params.get('profile'):
+            kwargs['profile'] = 'card'
+        return super().get_serializer(*args, **kwargs)
+
+    def get_scope(self):
+        params = self.request.query_params
+        for param, model in (('category', Category), ('gender', GenderCategory)):
+            value = params.get(param)
+            if not value:
+                continue
+            if not value.isdigit():
+                value = model.objects.filter(slug=value).values_list('id', flat=True).first()
+                if value is None:
+                    raise Http404(f"{model._meta.verbose_name} not found")
+            return f'{param}:{value}'
+        return GLOBAL_SCOPE
+
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), popularity_setting('RANKING_SIZE'))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = get_trending_ids(self.get_scope())[:max(limit, 0)]
+        products = self.filter_queryset(self.get_queryset().filter(id__in=ids)).in_bulk()
+        serializer = self.get_serializer([products[pk] for pk in ids if pk in products], many=True)
+        return Response(serializer.data)
+
 @extend_schema(
     summary="Get similar products",
     description="Get a list of similar products based on category and subcategory.",
@@ -705,9 +758,10 @@ class WishlistListCreateView(TelegramAuthMixin, generics.ListCreateAPIView):
 
     def get_queryset(self):
         user = self.get_user_from_telegram_id()
-        return Wishlist.objects.filter(user=user).prefetch_related(
-            'products'
-        ).order_by('-created_at')
+        return optimize_queryset(
+            Wishlist.objects.filter(user=user).order_by('-created_at'),
+            WishlistSerializer()
+        )
 
     def perform_create(self, serializer):
         user = self.get_user_from_telegram_id()
@@ -774,29 +828,32 @@ class AddToWishlistView(TelegramAuthMixin, generics.GenericAPIView):
             serializer = AddToWishlistRequestSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
 
-            wishlist, created = Wishlist.objects.get_or_create(user=user)
+            wishlist_id = serializer.validated_data.get('wishlist_id')
+            if wishlist_id:
+                wishlist = Wishlist.objects.filter(user=user, id=wishlist_id).first()
+                if wishlist is None:
+                    return Response({
+                        'error': 'Wishlist not found',
+                        'message': f"Wishlist with ID {wishlist_id} does not exist"
+                    }, status=status.HTTP_404_NOT_FOUND)
+            else:
+                wishlist = Wishlist.objects.filter(user=user).order_by('created_at').first()
+                if wishlist is None:
+                    wishlist = Wishlist.objects.create(user=user)
             try:
-                product = Product.objects.get(id=serializer.validated_data['product_id'])
+                product = Product.objects.only('id').get(id=serializer.validated_data['product_id'])
             except Product.DoesNotExist:
                 return Response({
                     'error': 'Product not found',
                     'message': f"Product with ID {serializer.validated_data['product_id']} does not exist"
                 }, status=status.HTTP_404_NOT_FOUND)
-            
-            if product in wishlist.products.all():
-                wishlist.remove_product(product)
-                message = "Product removed from wishlist"
-                is_liked = False
-            else:
-                wishlist.add_product(product)
-                message = "Product added to wishlist"
-                is_liked = True
 
-            # Ensure all products in wishlist are liked
-            for wishlist_product in wishlist.products.all():
-                if not wishlist_product.likes.filter(id=user.id).exists():
-                    wishlist_product.likes.add(user)
+            is_liked = wishlist.toggle_product(product)
+            record_event(user, product, 'wishlist_add' if is_liked else 'wishlist_remove')
+            message = "Product added to wishlist" if is_liked else "Product removed from wishlist"
 
+            response_serializer = WishlistSerializer()
+            wishlist = optimize_queryset(Wishlist.objects.filter(pk=wishlist.pk), response_serializer).get()
             return Response({
                 'message': message,
                 'wishlist': WishlistSerializer(wishlist).data,
@@ -835,7 +892,8 @@ class RemoveFromWishlistView(generics.GenericAPIView):
         try:
             product = Product.objects.get(id=serializer.validated_data['product_id'])
             wishlist = Wishlist.objects.get(user=request.user)
-            wishlist.products.remove(product)
+            wishlist.remove_product(product)
+            record_event(request.user, product, 'wishlist_remove')
             
             response_serializer = WishlistResponseSerializer({
                 'message': 'Product removed from wishlist',
@@ -949,12 +1007,7 @@ class MyCartView(TelegramAuthMixin, APIView):
 
     def get(self, request):
         user = self.get_user_from_telegram_id()
-        cart = Cart.objects.filter(user=user, is_active=True).prefetch_related(
-            Prefetch(
-                'items',
-                queryset=CartItem.objects.select_related('product', 'variant')
-            )
-        ).first()
+        cart = Cart.objects.filter(user=user, is_active=True).prefetch_related(Cart.active_items_prefetch()).first()
         
         if not cart:
             # Create a new cart if none exists
@@ -1037,6 +1090,42 @@ class CartItemListCreateView(TelegramAuthMixin, generics.ListCreateAPIView):
         cart, _ = Cart.objects.get_or_create(user=user)
         serializer.save(cart=cart)
 
+@extend_schema(
+    summary="Batch cart changes",
+    description="Apply a list of add/update/remove operations to the user's active cart (X-Telegram-ID) "
+                "in one transaction and return the resulting cart.",
+    request=CartBatchRequestSerializer,
+    responses={
+        200: CartSerializer,
+        400: OpenApiResponse(description="Invalid operations or insufficient stock"),
+        401: OpenApiResponse(description="Authentication failed")
+    },
+    tags=["Cart Management"]
+)
+class CartBatchView(TelegramAuthMixin, APIView):
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        user = self.get_user_from_telegram_id()
+        serializer = CartBatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            with transaction.atomic():
+                # Row lock serializes concurrent batches on the same cart
+                cart = Cart.objects.select_for_update().filter(user=user, is_active=True).first()
+                if cart is None:
+                    cart = Cart.objects.create(user=user, is_active=True)
+                added = cart.apply_operations(serializer.validated_data['operations'])
+        except ValueError as e:
+            return Response({'error': 'Insufficient stock', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        for (product_id, _), quantity in added.items():
+            record_event(user, product_id, 'cart_add', quantity)
+        # Reload with the items the serializer reads, so the response costs the same for any cart size
+        cart = Cart.objects.prefetch_related(Cart.active_items_prefetch()).get(pk=cart.pk)
+        return Response(CartSerializer(cart, context={'request': request}).data)
+
 @extend_schema(
     summary="Add to cart",
     description="Add a product variant to user's cart (X-Telegram-ID).",
@@ -1102,6 +1191,7 @@ class AddToCartView(TelegramAuthMixin, APIView):
                 cart=cart,
                 product=product,
                 variant=variant,
+                is_deleted=False,
                 defaults={'quantity': serializer.validated_data.get('quantity', 1)}
             )
             
@@ -1115,6 +1205,8 @@ class AddToCartView(TelegramAuthMixin, APIView):
                 cart_item.quantity = new_quantity
                 cart_item.save()
 
+            record_event(user, product, 'cart_add', serializer.validated_data.get('quantity', 1))
+
             serializer = CartItemSerializer(cart_item, context={'request': request})
             return Response({
                 'message': 'Product added to cart successfully',
@@ -1223,7 +1315,7 @@ class RemoveFromCartView(generics.GenericAPIView):
         tags=["Order Management"]
     )
 )
-class OrderListCreateView(generics.ListCreateAPIView):
+class OrderListCreateView(ProjectionMixin, generics.ListCreateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -1239,7 +1331,9 @@ class OrderListCreateView(generics.ListCreateAPIView):
         return Order.objects.filter(user=user)
 
     def perform_create(self, serializer):
-        serializer.save()
+        order = serializer.save()
+        # The response embeds every item's product; load them the way reads do instead of per item
+        serializer.instance = optimize_queryset(Order.objects.filter(pk=order.pk), serializer).get()
 
 @extend_schema_view(
     get=extend_schema(
@@ -1298,7 +1392,7 @@ class OrderListCreateView(generics.ListCreateAPIView):
         tags=["Order Management"]
     )
 )
-class OrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class OrderRetrieveUpdateDestroyView(ProjectionMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'id'
@@ -1332,8 +1426,13 @@ class OrderRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        instance.status = 'canceled'
-        instance.save()
+        try:
+            transition_order(instance, 'canceled', actor=request.user)
+        except TransitionError as e:
+            return Response(
+                {'error': 'Cannot cancel order', 'message': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -1383,16 +1482,11 @@ class CancelOrderView(generics.GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Update order status
-        order.status = 'canceled'
-        order.order_note = request.data.get('reason', '')
-        order.save()
-
-        # Send notification
+        reason = request.data.get('reason', '')
         try:
-            TelegramService.notify_order_status(order)
-        except Exception as e:
-            logger.error(f"Failed to send order cancellation notification: {str(e)}")
+            transition_order(order, 'canceled', actor=request.user, note=reason, changes={'order_note': reason})
+        except TransitionError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = self.get_serializer(order)
         return Response(serializer.data)
@@ -1528,7 +1622,8 @@ class DefaultAddressView(generics.RetrieveAPIView):
         tags=["Brand Management"]
     )
 )
-class BrandListCreateView(generics.ListCreateAPIView):
+class BrandListCreateView(CatalogCacheMixin, generics.ListCreateAPIView):
+    catalog_scope = 'brands'
     serializer_class = BrandSerializer
     pagination_class = DynamicPageSizePagination
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -1617,7 +1712,8 @@ class BrandListCreateView(generics.ListCreateAPIView):
         tags=["Brand Management"]
     )
 )
-class BrandRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class BrandRetrieveUpdateDestroyView(CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    catalog_scope = 'brands'
     serializer_class = BrandSerializer
     lookup_field = 'slug'
     
@@ -1643,7 +1739,8 @@ class BrandRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         tags=["Color Management"]
     )
 )
-class ColorListCreateView(generics.ListCreateAPIView):
+class ColorListCreateView(CatalogCacheMixin, generics.ListCreateAPIView):
+    catalog_scope = 'colors'
     queryset = Color.objects.all()
     serializer_class = ColorSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -1678,7 +1775,8 @@ class ColorListCreateView(generics.ListCreateAPIView):
         tags=["Color Management"]
     )
 )
-class ColorRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class ColorRetrieveUpdateDestroyView(CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    catalog_scope = 'colors'
     queryset = Color.objects.all()
     serializer_class = ColorSerializer
 
@@ -1699,7 +1797,8 @@ class ColorRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         tags=["Size Management"]
     )
 )
-class SizeListCreateView(generics.ListCreateAPIView):
+class SizeListCreateView(CatalogCacheMixin, generics.ListCreateAPIView):
+    catalog_scope = 'sizes'
     queryset = Size.objects.all()
     serializer_class = SizeSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -1734,7 +1833,8 @@ class SizeListCreateView(generics.ListCreateAPIView):
         tags=["Size Management"]
     )
 )
-class SizeRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class SizeRetrieveUpdateDestroyView(CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    catalog_scope = 'sizes'
     queryset = Size.objects.all()
     serializer_class = SizeSerializer
 
@@ -1755,7 +1855,8 @@ class SizeRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         tags=["Material Management"]
     )
 )
-class MaterialListCreateView(generics.ListCreateAPIView):
+class MaterialListCreateView(CatalogCacheMixin, generics.ListCreateAPIView):
+    catalog_scope = 'materials'
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -1790,7 +1891,8 @@ class MaterialListCreateView(generics.ListCreateAPIView):
         tags=["Material Management"]
     )
 )
-class MaterialRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class MaterialRetrieveUpdateDestroyView(CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    catalog_scope = 'materials'
     queryset = Material.objects.all()
     serializer_class = MaterialSerializer
 
@@ -1811,7 +1913,8 @@ class MaterialRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         tags=["Season Management"]
     )
 )
-class SeasonListCreateView(generics.ListCreateAPIView):
+class SeasonListCreateView(CatalogCacheMixin, generics.ListCreateAPIView):
+    catalog_scope = 'seasons'
     queryset = Season.objects.all()
     serializer_class = SeasonSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -1846,7 +1949,8 @@ class SeasonListCreateView(generics.ListCreateAPIView):
         tags=["Season Management"]
     )
 )
-class SeasonRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class SeasonRetrieveUpdateDestroyView(CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    catalog_scope = 'seasons'
     queryset = Season.objects.all()
     serializer_class = SeasonSerializer
 
@@ -1867,7 +1971,8 @@ class SeasonRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         tags=["Shipping Management"]
     )
 )
-class ShippingMethodListCreateView(generics.ListCreateAPIView):
+class ShippingMethodListCreateView(CatalogCacheMixin, generics.ListCreateAPIView):
+    catalog_scope = 'shipping_methods'
     queryset = ShippingMethod.objects.all()
     serializer_class = ShippingMethodSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -1902,7 +2007,8 @@ class ShippingMethodListCreateView(generics.ListCreateAPIView):
         tags=["Shipping Management"]
     )
 )
-class ShippingMethodRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class ShippingMethodRetrieveUpdateDestroyView(CatalogCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    catalog_scope = 'shipping_methods'
     queryset = ShippingMethod.objects.all()
     serializer_class = ShippingMethodSerializer
 
@@ -1943,15 +2049,10 @@ class UpdateOrderStatusView(generics.GenericAPIView):
             if status not in dict(Order.STATUS_CHOICES):
                 return Response({'error': 'Invalid status'}, status=400)
             
-            order.status = status
-            order.save()
-            
-            # Send notification
-            if order.user.telegram_id:
-                try:
-                    TelegramService.notify_order_status(order)
-                except Exception as e:
-                    logger.error(f"Failed to send order status update notification: {e}")
+            try:
+                transition_order(order, status, actor=request.user)
+            except TransitionError as e:
+                return Response({'error': str(e)}, status=400)
             
             response_serializer = OrderResponseSerializer({
                 'message': 'Order status updated successfully',
@@ -1961,6 +2062,104 @@ class UpdateOrderStatusView(generics.GenericAPIView):
         except Order.DoesNotExist:
             return Response({'error': 'Order not found'}, status=404)
 
+@extend_schema(
+    summary="Export orders",
+    description=(
+        "Stream orders with their items for accounting as CSV or Parquet (one row per item) or JSONL "
+        "(one order per line). Admin only."
+    ),
+    parameters=[
+        OpenApiParameter(name="file_format", description="csv (default), jsonl or parquet", required=False, type=str),
+        OpenApiParameter(name="from", description="First order date, YYYY-MM-DD", required=False, type=str),
+        OpenApiParameter(name="to", description="Last order date (inclusive), YYYY-MM-DD", required=False, type=str),
+        OpenApiParameter(name="status", description="Comma-separated order statuses", required=False, type=str),
+    ],
+    responses={200: OpenApiTypes.BINARY},
+    tags=["Order Management"]
+)
+class OrderExportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        # Not 'format': DRF reserves it for renderer negotiation
+        fmt = params.get('file_format', 'csv')
+        statuses = [value for value in params.get('status', '').split(',') if value]
+        try:
+            chunks = export_orders(fmt, params.get('from'), params.get('to'), statuses)
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="orders-{timezone.localdate():%Y%m%d}.{fmt}"'
+        return response
+
+@extend_schema(
+    summary="Bulk update order status",
+    description=(
+        "Move many orders to a new status at once, e.g. every processing order of a branch "
+        "to ready_for_pickup. Orders are selected by id and/or pickup branch, optionally "
+        "narrowed to one current status. Orders whose status does not allow the transition "
+        "are left unchanged and reported. Admin only."
+    ),
+    request=inline_serializer(
+        name='BulkOrderStatusUpdate',
+        fields={
+            'status': serializers.ChoiceField(choices=Order.STATUS_CHOICES),
+            'order_ids': serializers.ListField(child=serializers.IntegerField(), required=False),
+            'pickup_branch_id': serializers.IntegerField(required=False),
+            'from_status': serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False),
+            'note': serializers.CharField(required=False, allow_blank=True),
+        }
+    ),
+    responses={
+        200: inline_serializer(
+            name='BulkOrderStatusResult',
+            fields={
+                'changed': serializers.ListField(child=serializers.IntegerField()),
+                'rejected': serializers.DictField(child=serializers.CharField()),
+            }
+        ),
+        400: OpenApiResponse(description="Invalid status or no orders selected")
+    },
+    tags=["Order Management"]
+)
+class BulkOrderStatusView(APIView):
+    permission_classes = [IsAdminUser]
+    MAX_ORDERS = 5000
+
+    def post(self, request):
+        new_status = request.data.get('status')
+        if new_status not in dict(Order.STATUS_CHOICES):
+            return Response({'error': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
+
+        order_ids = request.data.get('order_ids')
+        branch_id = request.data.get('pickup_branch_id')
+        if not order_ids and not branch_id:
+            return Response(
+                {'error': 'order_ids or pickup_branch_id is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        orders = Order.objects.all()
+        if order_ids:
+            orders = orders.filter(id__in=order_ids)
+        if branch_id:
+            orders = orders.filter(pickup_branch_id=branch_id)
+        from_status = request.data.get('from_status')
+        if from_status:
+            orders = orders.filter(status=from_status)
+        if orders.count() > self.MAX_ORDERS:
+            return Response(
+                {'error': f'At most {self.MAX_ORDERS} orders can be updated at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        changed, rejected = transition(
+            orders, new_status, actor=request.user, note=request.data.get('note', '')
+        )
+        return Response({'changed': sorted(changed), 'rejected': rejected})
+
 @extend_schema_view(
     get=extend_schema(
         summary="List promo codes",
@@ -2236,13 +2435,114 @@ class ActiveBranchesView(TelegramAuthMixin, APIView):
     permission_classes = [AllowAny]
     
     def get(self, request):
-        branches = Address.objects.filter(
+        # Pre-encoded by the branch directory; the ETag changes with the branches catalog version
+        directory = get_branch_directory()
+        etag = quote_etag(f'branches-{directory.version}')
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(directory.json, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+@extend_schema(
+    summary="Branch pickup queues",
+    description=(
+        "Number of pending, processing and ready_for_pickup orders per active branch. "
+        "Served from cached counters, so it can be polled. Staff and Telegram admins only."
+    ),
+    tags=["Branch Operations"]
+)
+class BranchQueuesView(APIView):
+    permission_classes = [IsStaffOrTelegramAdmin]
+
+    def get(self, request):
+        branches = list(Address.objects.filter(
             branch_type__in=['store', 'pickup'],
             is_active=True
-        ).order_by('name')
-        
-        serializer = AddressSerializer(branches, many=True)
-        return Response(serializer.data)
+        ).order_by('name').values('id', 'name', 'city'))
+        counts = queue_counts(branch['id'] for branch in branches)
+        for branch in branches:
+            branch['queues'] = counts[branch['id']]
+            branch['total'] = sum(branch['queues'].values())
+        return Response(branches)
+
+@extend_schema(
+    summary="Branch queue orders",
+    description=(
+        "Orders waiting in one branch queue, oldest first, with the branch's queue counts. "
+        "Staff and Telegram admins only."
+    ),
+    parameters=[
+        OpenApiParameter(
+            name='status', type=str, enum=QUEUE_STATUSES, default='ready_for_pickup',
+            description="Queue to list"
+        ),
+    ],
+    tags=["Branch Operations"]
+)
+class BranchQueueView(ProjectionMixin, generics.ListAPIView):
+    serializer_class = OrderSerializer
+    permission_classes = [IsStaffOrTelegramAdmin]
+    pagination_class = DynamicPageSizePagination
+
+    def get_serializer(self, *args, **kwargs):
+        if not self.request.query_params.get('profile'):
+            kwargs['profile'] = 'queue'
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Order.objects.none()
+        queue = self.request.query_params.get('status', 'ready_for_pickup')
+        if queue not in QUEUE_STATUSES:
+            raise exceptions.ValidationError({'status': f"Must be one of: {', '.join(QUEUE_STATUSES)}"})
+        return queue_orders(self.kwargs['pk'], queue)
+
+    def list(self, request, *args, **kwargs):
+        branch = get_object_or_404(Address, pk=self.kwargs['pk'])
+        response = super().list(request, *args, **kwargs)
+        response.data['branch'] = {'id': branch.id, 'name': branch.name}
+        response.data['queues'] = queue_counts([branch.id])[branch.id]
+        return response
+
+@extend_schema(
+    summary="Nearest branches",
+    description=(
+        "Active pickup branches closest to a point, sorted by great-circle distance. "
+        "Branches without coordinates are not included. With open_now=true only "
+        "branches whose working hours include the current local time are returned."
+    ),
+    parameters=[
+        OpenApiParameter(name='lat', type=float, required=True, description="Latitude"),
+        OpenApiParameter(name='lon', type=float, required=True, description="Longitude"),
+        OpenApiParameter(name='limit', type=int, default=5, description="Number of branches (max 50)"),
+        OpenApiParameter(name='open_now', type=bool, default=False, description="Only branches open now"),
+    ],
+    tags=["Branch Operations"]
+)
+class NearestBranchesView(APIView):
+    permission_classes = [AllowAny]
+    MAX_LIMIT = 50
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            lat, lon = float(params['lat']), float(params['lon'])
+            limit = int(params.get('limit', 5))
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'lat and lon must be numbers and limit an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return Response({'error': 'Coordinates out of range'}, status=status.HTTP_400_BAD_REQUEST)
+
+        open_now = params.get('open_now', '').lower() in ('1', 'true', 'yes')
+        branches = get_branch_directory().nearest(
+            lat, lon, limit=max(0, min(limit, self.MAX_LIMIT)), open_now=open_now
+        )
+        return Response(branches)
 
 class DirectPurchaseView(TelegramAuthMixin, APIView):
     permission_classes = [AllowAny]
@@ -2263,7 +2563,10 @@ class DirectPurchaseView(TelegramAuthMixin, APIView):
                     # Get validated data
                     data = serializer.validated_data
                     product = Product.objects.get(id=data['product_id'])
-                    pickup_branch = Address.objects.get(id=data['pickup_branch_id'])
+                    pickup_branch = get_branch_directory().get(data['pickup_branch_id'])
+                    if pickup_branch is None:
+                        # Deactivated since the serializer checked it
+                        return Response({'pickup_branch_id': ["Filial topilmadi yoki faol emas"]}, status=400)
                     
                     # Create order
                     order = Order.objects.create(
@@ -2274,7 +2577,8 @@ class DirectPurchaseView(TelegramAuthMixin, APIView):
                         payment_method=data['payment_method'],
                         order_note=data.get('order_note', ''),
                         is_split_payment=data.get('is_split_payment', False),
-                        status='pending'
+                        status='pending',
+                        stock_reserved=True
                     )
                     
                     # Add order item
@@ -2298,6 +2602,8 @@ class DirectPurchaseView(TelegramAuthMixin, APIView):
                         variant.stock -= data['quantity']
                         variant.save()
                     
+                    response_serializer = OrderSerializer(context={'request': request})
+                    order = optimize_queryset(Order.objects.filter(pk=order.pk), response_serializer).get()
                     return Response({
                         'message': 'Buyurtma muvaffaqiyatli yaratildi',
                         'order': OrderSerializer(order, context={'request': request}).data